@@ -0,0 +1,63 @@
+"""
+Measure the per-request cost of building the LLM client and summary chain, with and without the registry.
+
+Usage:
+    OPENAI_API_KEY=sk-... poetry run python benchmarks/chain_setup.py [--requests 200]
+
+No API calls are made; only object construction is timed (any non-empty key works).
+"""
+
+import argparse
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+from ossai.utils.llm import get_chain
+
+SYSTEM_MSG = "You're a highly capable summarization expert. The user understands {language} only."
+HUMAN_MSG = "Please summarize the following chat log.\n{custom_instructions}\n\n{text}"
+CHUNKS_PER_REQUEST = 4
+
+
+def per_request_setup(model: str, temperature: float):
+    """What each request used to do: a new client per Summarizer, a new chain per chunk."""
+    client = ChatOpenAI(model=model, temperature=temperature)
+    parser = StrOutputParser()
+    for _ in range(CHUNKS_PER_REQUEST):
+        prompt_template = ChatPromptTemplate.from_messages(
+            [("system", SYSTEM_MSG), ("user", HUMAN_MSG)]
+        )
+        prompt_template | client | parser
+
+
+def registry_setup(model: str, temperature: float):
+    for _ in range(CHUNKS_PER_REQUEST):
+        get_chain(SYSTEM_MSG, HUMAN_MSG, model, temperature)
+
+
+def measure(setup, requests: int, model: str, temperature: float) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        setup(model, temperature)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--model", default="gpt-4.1")
+    parser.add_argument("--temperature", type=float, default=0.2)
+    args = parser.parse_args()
+
+    before = measure(per_request_setup, args.requests, args.model, args.temperature)
+    after = measure(registry_setup, args.requests, args.model, args.temperature)
+    print(f"{'setup':<22}{'ms/request':>12}")
+    print(f"{'per-request':<22}{before * 1000:>12.3f}")
+    print(f"{'registry':<22}{after * 1000:>12.3f}")
+    print(f"speedup: {before / after:,.0f}x ({CHUNKS_PER_REQUEST} chunks per request)")
+
+
+if __name__ == "__main__":
+    main()
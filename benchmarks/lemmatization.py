@@ -0,0 +1,77 @@
+"""
+Compare per-message spaCy lemmatization with the full pipeline against batched `nlp.pipe` on a trimmed pipeline.
+
+Usage:
+    poetry run python benchmarks/lemmatization.py [--messages 10000] [--batch-sizes 64,256,1024] [--n-process 1,2]
+
+Needs the spaCy model used by topic analysis (`python -m spacy download en_core_web_md`).
+"""
+
+import argparse
+import random
+import time
+
+import spacy
+
+from ossai.topic_analysis import SPACY_EXCLUDE, SPACY_MODEL
+
+PHRASES = [
+    "we're rolling out the new onboarding flow to everyone on monday",
+    "can someone review the migration before it runs tonight?",
+    "the dashboards were showing stale numbers again this morning",
+    "I'm running the load tests against staging now",
+    "thanks for jumping on the incident so quickly",
+    "let's move the retro to thursday, half the team is out",
+    "customers keep asking about exporting their invoices as CSV",
+    "the flaky test in the payments suite failed twice today",
+]
+
+
+def build_channel(n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(PHRASES, rng.randint(1, 3))) for _ in range(n)]
+
+
+def lemmatize_loop(nlp, messages):
+    return [" ".join([token.lemma_ for token in nlp(message)]) for message in messages]
+
+
+def lemmatize_pipe(nlp, messages, batch_size, n_process):
+    return [
+        " ".join(token.lemma_ for token in doc)
+        for doc in nlp.pipe(messages, batch_size=batch_size, n_process=n_process)
+    ]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--batch-sizes", default="64,256,1024")
+    parser.add_argument("--n-process", default="1,2")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    messages = build_channel(args.messages, args.seed)
+    full = spacy.load(SPACY_MODEL)
+    trimmed = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+
+    baseline, expected = timed(lemmatize_loop, full, messages)
+    print(f"{'method':<36}{'seconds':>10}{'msgs/sec':>12}{'speedup':>10}")
+    print(f"{'nlp(message) loop, full pipeline':<36}{baseline:>10.2f}{len(messages) / baseline:>12,.0f}{'1.0x':>10}")
+
+    for n_process in map(int, args.n_process.split(",")):
+        for batch_size in map(int, args.batch_sizes.split(",")):
+            elapsed, result = timed(lemmatize_pipe, trimmed, messages, batch_size, n_process)
+            assert result == expected, "trimmed pipeline produced different lemmas"
+            label = f"pipe batch={batch_size} n_process={n_process}"
+            print(f"{label:<36}{elapsed:>10.2f}{len(messages) / elapsed:>12,.0f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
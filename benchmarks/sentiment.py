@@ -0,0 +1,81 @@
+"""
+Compare per-message VADER scoring against the batch API, cold and warm, with and without worker processes.
+
+Usage:
+    poetry run python benchmarks/sentiment.py [--messages 50000] [--duplicates 0.3] [--workers 1,4]
+
+Needs the VADER lexicon (`python -m nltk.downloader vader_lexicon`).
+"""
+
+import argparse
+import random
+import time
+
+from ossai import sentiment
+from ossai.utils.cache import TTLCache
+
+PHRASES = [
+    "thanks for jumping on the incident so quickly",
+    "the dashboards were showing stale numbers again, really frustrating",
+    "love the new onboarding flow!",
+    "can someone review the migration before it runs tonight?",
+    "the flaky test in the payments suite failed twice today :(",
+    "great demo, the team did amazing work",
+    "I'm worried the deadline is too tight",
+]
+# the kind of text that repeats a lot in real channels
+REPEATED = ["+1", ":tada:", "thanks!", "lgtm", "Deploy finished: production is up to date", ":eyes:"]
+
+
+def build_channel(n: int, duplicates: float, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        rng.choice(REPEATED)
+        if rng.random() < duplicates
+        else f"{' '.join(rng.sample(PHRASES, rng.randint(1, 3)))} #{i}"
+        for i in range(n)
+    ]
+
+
+def reset_memo():
+    sentiment._memo = TTLCache(maxsize=sentiment.SENTIMENT_MEMO_SIZE, ttl=float("inf"))
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of messages that repeat")
+    parser.add_argument("--workers", default="1,4")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = build_channel(args.messages, args.duplicates, args.seed)
+    sentiment._get_analyzer()  # load the lexicon outside the timings
+
+    baseline, expected = timed(lambda: [sentiment.get_traditional_sentiment(text) for text in texts])
+    print(f"{'method':<32}{'seconds':>10}{'msgs/sec':>12}{'speedup':>10}")
+    print(f"{'per-message loop':<32}{baseline:>10.2f}{len(texts) / baseline:>12,.0f}{'1.0x':>10}")
+
+    for workers in map(int, args.workers.split(",")):
+        reset_memo()
+        if workers > 1:
+            # start the workers (and load their lexicons) outside the timings
+            sentiment.SENTIMENT_CHUNK_SIZE = max(1, len(texts) // (workers * 4))
+            sentiment.get_traditional_sentiments(build_channel(len(texts), 0.0, args.seed + 1), workers=workers)
+            reset_memo()
+        for label in ("cold", "warm"):
+            elapsed, result = timed(sentiment.get_traditional_sentiments, texts, workers=workers)
+            assert result == expected, "batch scores differ from per-message scores"
+            name = f"batch workers={workers} ({label})"
+            print(f"{name:<32}{elapsed:>10.2f}{len(texts) / elapsed:>12,.0f}{baseline / elapsed:>9.1f}x")
+    sentiment.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
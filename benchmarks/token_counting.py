@@ -0,0 +1,101 @@
+"""
+Compare token counter throughput and accuracy on a synthetic Slack-like corpus.
+
+Usage:
+    poetry run python benchmarks/token_counting.py [--messages 20000] [--seed 0]
+
+The exact (tiktoken) rows need the tokenizer vocabulary, either downloaded once or pre-populated in
+`TIKTOKEN_CACHE_DIR`; without it only the heuristic is measured.
+"""
+
+import argparse
+import random
+import time
+
+from ossai.utils.tokens import (
+    CachedTokenCounter,
+    HeuristicTokenCounter,
+    TiktokenTokenCounter,
+    get_encoding_name_for_model,
+)
+
+CHAT = [
+    "sounds good, let's ship it after standup",
+    "can someone take a look at the failing build? :eyes:",
+    "I think we should revisit the pricing page copy before the launch next week",
+    "+1",
+    "thanks!! :tada: :tada:",
+    "Rolling back now, the p95 latency doubled after the deploy",
+]
+CODE = [
+    "```\ndef handler(event, context):\n    return {'statusCode': 200, 'body': json.dumps(event)}\n```",
+    "`SELECT id, created_at FROM orders WHERE status = 'pending' ORDER BY created_at DESC LIMIT 50;`",
+    "```\nTraceback (most recent call last):\n  File \"app.py\", line 42, in <module>\nKeyError: 'user_id'\n```",
+]
+URLS = [
+    "<https://github.com/acme/platform/pull/4821|PR #4821> is ready for review",
+    "dashboard: https://grafana.internal.acme.io/d/abc123/api-latency?orgId=1&from=now-6h&to=now",
+]
+NON_ENGLISH = [
+    "¿Alguien puede revisar el despliegue de mañana?",
+    "明日のリリースは午後3時に延期します",
+    "Das Meeting wurde auf Donnerstag verschoben, bitte Kalender prüfen",
+]
+
+
+def build_corpus(n: int, seed: int, repeat_ratio: float = 0.3) -> list[str]:
+    """Mix chat, code, links and non-English text; some messages repeat, as they do across re-runs."""
+    rng = random.Random(seed)
+    pools = [(CHAT, 0.6), (CODE, 0.15), (URLS, 0.15), (NON_ENGLISH, 0.1)]
+    corpus = []
+    for i in range(n):
+        if corpus and rng.random() < repeat_ratio:
+            corpus.append(rng.choice(corpus))
+            continue
+        pool = rng.choices([p for p, _ in pools], weights=[w for _, w in pools])[0]
+        speaker = f"user{rng.randint(1, 40)}"
+        corpus.append(f"{speaker}: {rng.choice(pool)} ({i})")
+    return corpus
+
+
+def measure(counter, corpus: list[str], rounds: int) -> tuple[float, list[int]]:
+    counts = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        counts = [counter.count(text) for text in corpus]
+    elapsed = time.perf_counter() - start
+    return len(corpus) * rounds / elapsed, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the corpus, as with repeated summaries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default="gpt-4.1")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    counters = [HeuristicTokenCounter(), CachedTokenCounter(HeuristicTokenCounter())]
+    try:
+        exact = TiktokenTokenCounter(get_encoding_name_for_model(args.model))
+        counters += [exact, CachedTokenCounter(exact)]
+    except Exception as e:
+        print(f"tiktoken unavailable ({e}); measuring the heuristic only\n")
+        exact = None
+
+    results = {counter.name: measure(counter, corpus, args.rounds) for counter in counters}
+    reference = results["tiktoken"][1] if exact else None
+
+    print(f"{'counter':<20}{'msgs/sec':>14}{'total tokens':>16}{'mean abs err':>16}")
+    for name, (throughput, counts) in results.items():
+        error = (
+            f"{sum(abs(a - b) for a, b in zip(counts, reference)) / len(counts):.2f}"
+            if reference
+            else "n/a"
+        )
+        print(f"{name:<20}{throughput:>14,.0f}{sum(counts):>16,}{error:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the exact and scalable topic modeling backends across corpus sizes, reporting time and peak memory.
+
+Usage:
+    OPENAI_API_KEY=sk-... poetry run python benchmarks/topic_backends.py [--sizes 1000,5000,20000,50000]
+
+Runs each algorithm in-process (not through the worker pool) on a synthetic corpus; no API calls are made.
+Peak memory is measured with tracemalloc, which sees numpy/scipy allocations as well as Python objects.
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from ossai.topic_analysis import (
+    _compute_kmeans_topics,
+    _compute_lda_topics,
+    _compute_lsa_topics,
+)
+
+TOPICS = {
+    "deploy": "deploy rollback release pipeline staging production canary build",
+    "billing": "invoice billing payment refund customer subscription pricing plan",
+    "hiring": "interview candidate offer recruiter onboarding hiring loop feedback",
+    "incident": "outage latency alert pager incident postmortem database timeout",
+    "design": "mockup figma design review feedback layout spacing typography",
+    "social": "lunch coffee birthday weekend offsite party games celebrate",
+}
+FILLER = "the a we are is to for on it this that with can just about some".split()
+
+
+def build_corpus(n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    vocab = {name: words.split() for name, words in TOPICS.items()}
+    corpus = []
+    for _ in range(n):
+        words = rng.choices(vocab[rng.choice(list(vocab))], k=rng.randint(4, 12))
+        words += rng.choices(FILLER, k=rng.randint(2, 6))
+        rng.shuffle(words)
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def measure(fn, *args, memory: bool = True, **kwargs) -> tuple[float, float]:
+    # timed and traced in separate runs: tracemalloc slows pure-Python code such as gensim's LDA several times over
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    if not memory:
+        return elapsed, float("nan")
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,5000,20000,50000")
+    parser.add_argument("--num-topics", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slow) peak memory measurement")
+    args = parser.parse_args()
+
+    print(f"{'messages':>9}  {'algorithm':<11}{'backend':<10}{'seconds':>10}{'peak MiB':>10}")
+    for size in map(int, args.sizes.split(",")):
+        corpus = build_corpus(size, args.seed)
+        vectorizer = TfidfVectorizer(max_df=0.85, max_features=5000)
+        tfidf_matrix = vectorizer.fit_transform(corpus)
+        terms = vectorizer.get_feature_names_out()
+        for backend in ("exact", "scalable"):
+            for name, fn, inputs in [
+                ("kmeans", _compute_kmeans_topics, (tfidf_matrix, args.num_topics, terms)),
+                ("lsa", _compute_lsa_topics, (tfidf_matrix, args.num_topics, terms)),
+                ("lda", _compute_lda_topics, (corpus, args.num_topics, set(FILLER))),
+            ]:
+                elapsed, peak = measure(fn, *inputs, memory=not args.no_memory, backend=backend)
+                print(f"{size:>9}  {name:<11}{backend:<10}{elapsed:>10.2f}{peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
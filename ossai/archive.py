@@ -0,0 +1,833 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Optional, Union
+
+from ossai.logging_config import logger
+from ossai.utils.files import atomic_write_json, fsync_directory
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/history")
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT", "jsonl").strip().lower()  # "jsonl" or "columnar"
+ARCHIVE_INDEX_INTERVAL = 1000  # record the byte offset of every this-many-th message in the manifest
+ARCHIVE_SEGMENT_SIZE = 10_000  # most messages (plus their replies) per columnar segment
+# appends are journaled and fsynced in transactions of up to this many messages
+ARCHIVE_JOURNAL_BATCH_SIZE = int(os.getenv("ARCHIVE_JOURNAL_BATCH_SIZE", 5000))
+ARCHIVE_FSYNC = os.getenv("ARCHIVE_FSYNC", "true").strip().lower() == "true"
+# how far back /tldr_archive looks for threads with new replies; older threads are assumed to be settled
+ARCHIVE_THREAD_LOOKBACK_DAYS = float(os.getenv("ARCHIVE_THREAD_LOOKBACK_DAYS", 14))
+_TAIL_BLOCK_SIZE = 8192
+_sync_locks: dict = {}  # archive path -> asyncio.Lock, so /tldr_archive and the scheduler never sync a channel at once
+
+# columnar archive columns and their types; every other field of a message is kept as JSON in "extra"
+STRING_COLUMNS = ["ts", "author", "text", "thread_ts", "parent_ts", "extra"]
+BOOL_COLUMNS = ["is_internal"]
+SENTIMENT_KEYS = ["neg", "neu", "pos", "compound"]
+SENTIMENT_COLUMNS = [f"sentiment_{key}" for key in SENTIMENT_KEYS]
+COLUMNS = STRING_COLUMNS + BOOL_COLUMNS + SENTIMENT_COLUMNS
+# fields that are columns of their own, in the order of the bits of the "present" mask
+_FIELDS = ["author", "text", "thread_ts", "is_internal", "trad_sentiment"]
+
+
+def _fsync(f) -> None:
+    if ARCHIVE_FSYNC:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _fsync_directory(path: Path) -> None:
+    if ARCHIVE_FSYNC:
+        fsync_directory(path)
+
+
+def _truncate_partial_line(path: Path) -> int:
+    """Cut a JSONL file back to its last complete line, returning how many bytes were dropped."""
+    if not path.exists():
+        return 0
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+        end = size
+        while end > 0:
+            start = max(0, end - _TAIL_BLOCK_SIZE)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        f.truncate(end)
+        _fsync(f)
+    logger.warning(f"Truncated a partial last line ({size - end} bytes) from {path}")
+    return size - end
+
+
+class JsonlArchive:
+    """
+    A channel's archived messages, one JSON object per line in `<directory>/<channel>.jsonl`.
+
+    A sidecar manifest (`<channel>.jsonl.manifest.json`) records the newest `ts`, the message count, the file size
+    it covers, the byte offset of every `ARCHIVE_INDEX_INTERVAL`-th message and a checksum of the last line. It's
+    rewritten atomically after each append, so reading the archive's state doesn't depend on its size. If the
+    file has grown past the manifest (e.g. the process died between the append and the manifest update), only
+    the new tail is read; a missing or mismatched manifest is rebuilt with one full scan.
+
+    Appends go through a write-ahead journal (`<channel>.jsonl.journal`): each batch of lines is written and
+    fsynced to the journal together with the manifest it leads to, then applied to the archive, fsynced, and
+    committed by replacing the manifest and deleting the journal. `recover` (run before the manifest is first
+    read) replays a complete journal, discards a torn one and cuts off a partial last line, so a crash at any
+    point leaves either the old or the new state.
+    """
+
+    def __init__(self, channel_name: str, directory: str = ARCHIVE_DIR):
+        self.directory = Path(directory)
+        self.channel_name = channel_name
+        self.path = self.directory / f"{channel_name}.jsonl"
+        self.manifest_path = self.path.with_name(f"{self.path.name}.manifest.json")
+        self.journal_path = self.path.with_name(f"{self.path.name}.journal")
+        self._manifest = None
+
+    @staticmethod
+    def _empty_manifest() -> dict:
+        return {"latest_ts": 0.0, "count": 0, "size": 0, "offsets": [], "tail_checksum": None}
+
+    @staticmethod
+    def _checksum(line: bytes) -> str:
+        return hashlib.sha256(line).hexdigest()
+
+    def _read_last_line(self, f, end: int) -> bytes:
+        """Read the complete line ending at byte `end`, reading backwards from there in blocks."""
+        if end == 0:
+            return b""
+        position = end - 1  # skip the line's own trailing newline
+        chunk = b""
+        while position > 0:
+            start = max(0, position - _TAIL_BLOCK_SIZE)
+            f.seek(start)
+            chunk = f.read(position - start) + chunk
+            position = start
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                return chunk[newline + 1 :] + b"\n"
+        f.seek(0)
+        return f.read(end)
+
+    def _scan(self, manifest: dict, f, start: int) -> dict:
+        """Fold the complete lines from byte `start` onwards into `manifest`, ignoring a partial last line."""
+        f.seek(start)
+        offset, last_line = start, None
+        for line in f:
+            if not line.endswith(b"\n"):
+                logger.warning(f"Ignoring a partial last line in {self.path}")
+                break
+            if manifest["count"] % ARCHIVE_INDEX_INTERVAL == 0:
+                manifest["offsets"].append(offset)
+            manifest["latest_ts"] = max(manifest["latest_ts"], float(json.loads(line)["ts"]))
+            manifest["count"] += 1
+            offset += len(line)
+            last_line = line
+        manifest["size"] = offset
+        if last_line is not None:
+            manifest["tail_checksum"] = self._checksum(last_line)
+        return manifest
+
+    def _apply(self, base_size: int, payload: bytes) -> None:
+        with open(self.path, "ab") as f:
+            f.truncate(base_size)  # drop anything past the last commit, e.g. a partial line
+            f.write(payload)
+            _fsync(f)
+
+    def recover(self) -> bool:
+        """
+        Finish or roll back an append interrupted by a crash, returning whether anything had to be done.
+        """
+        recovered = False
+        if self.journal_path.exists():
+            recovered = True
+            with open(self.journal_path, "rb") as f:
+                header_line, payload = f.readline(), f.read()
+            try:
+                header = json.loads(header_line)
+                complete = len(payload) == header["length"] and self._checksum(payload) == header["checksum"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                complete = False
+            if complete:
+                logger.warning(f"Replaying the journal of {self.path} left by an interrupted append")
+                self._apply(header["base_size"], payload)
+                atomic_write_json(self.manifest_path, header["manifest"], fsync=ARCHIVE_FSYNC)
+            else:
+                # the crash happened before the journal was durable, so the archive wasn't touched yet
+                logger.warning(f"Discarding the incomplete journal of {self.path}")
+            self.journal_path.unlink()
+            _fsync_directory(self.directory)
+        return _truncate_partial_line(self.path) > 0 or recovered
+
+    def _load_manifest(self) -> dict:
+        self.recover()
+        if not self.path.exists():
+            return self._empty_manifest()
+
+        manifest = None
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, "r") as f:
+                    manifest = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable archive manifest {self.manifest_path}: {e}")
+
+        size = self.path.stat().st_size
+        with open(self.path, "rb") as f:
+            if manifest is not None and manifest["size"] <= size:
+                tail = self._read_last_line(f, manifest["size"])
+                if (self._checksum(tail) if tail else None) == manifest["tail_checksum"]:
+                    if manifest["size"] == size:
+                        return manifest
+                    logger.info(f"Archive {self.path} grew past its manifest, reading the new tail")
+                    manifest = self._scan(manifest, f, manifest["size"])
+                    atomic_write_json(self.manifest_path, manifest)
+                    return manifest
+
+            logger.info(f"Rebuilding the manifest of {self.path}")
+            manifest = self._scan(self._empty_manifest(), f, 0)
+        atomic_write_json(self.manifest_path, manifest)
+        return manifest
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
+
+    def refresh(self) -> None:
+        """Forget the cached manifest, e.g. after another writer may have appended."""
+        self._manifest = None
+
+    @property
+    def latest_ts(self) -> float:
+        return self.manifest["latest_ts"]
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    def append(self, messages: list[dict]) -> int:
+        """
+        Append the messages newer than the archive's latest `ts` and update the manifest, returning how many
+        were written. Each batch of `ARCHIVE_JOURNAL_BATCH_SIZE` messages is committed atomically.
+        """
+        new_messages = [message for message in messages if float(message["ts"]) > self.latest_ts]
+        if not new_messages:
+            return 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for start in range(0, len(new_messages), ARCHIVE_JOURNAL_BATCH_SIZE):
+            self._commit(new_messages[start : start + ARCHIVE_JOURNAL_BATCH_SIZE])
+        return len(new_messages)
+
+    def _commit(self, messages: list[dict]) -> None:
+        manifest = dict(self.manifest, offsets=list(self.manifest["offsets"]))
+        base_size = offset = manifest["size"]
+        lines = []
+        for message in messages:
+            line = (json.dumps(message) + "\n").encode("utf-8")
+            lines.append(line)
+            if manifest["count"] % ARCHIVE_INDEX_INTERVAL == 0:
+                manifest["offsets"].append(offset)
+            manifest["count"] += 1
+            manifest["latest_ts"] = max(manifest["latest_ts"], float(message["ts"]))
+            offset += len(line)
+        manifest["size"] = offset
+        manifest["tail_checksum"] = self._checksum(lines[-1])
+        payload = b"".join(lines)
+
+        # 1. make the batch durable in the journal, 2. apply it, 3. commit by replacing the manifest
+        header = {
+            "base_size": base_size,
+            "length": len(payload),
+            "checksum": self._checksum(payload),
+            "manifest": manifest,
+        }
+        with open(self.journal_path, "wb") as f:
+            f.write((json.dumps(header) + "\n").encode("utf-8"))
+            f.write(payload)
+            _fsync(f)
+        _fsync_directory(self.directory)  # the journal only counts once its directory entry is on disk too
+        self._apply(base_size, payload)
+        atomic_write_json(self.manifest_path, manifest, fsync=ARCHIVE_FSYNC)
+        self.journal_path.unlink()
+        _fsync_directory(self.directory)
+        self._manifest = manifest
+
+    def get_upload_file(self) -> tuple[Path, str]:
+        if not self.path.exists():
+            # nothing has been appended to a channel with no messages yet, but there's still an (empty) history
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.path.touch()
+        return self.path, f"{self.path.stem}_history.jsonl"
+
+    def iter_messages(self, start: int = 0) -> Iterator[dict]:
+        """Yield the archived messages from the `start`-th on, seeking via the manifest's offsets."""
+        manifest = self.manifest
+        if start >= manifest["count"]:
+            return
+        block = start // ARCHIVE_INDEX_INTERVAL
+        with open(self.path, "rb") as f:
+            f.seek(manifest["offsets"][block])
+            index = block * ARCHIVE_INDEX_INTERVAL
+            for line in f:
+                if index >= manifest["count"]:
+                    break
+                if index >= start:
+                    yield json.loads(line)
+                index += 1
+
+
+def _encode_strings(values: list[str]) -> tuple:
+    """Pack strings into one UTF-8 byte array plus the offsets where each one ends."""
+    import numpy as np
+
+    encoded = [value.encode("utf-8") for value in values]
+    ends = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), ends
+
+
+def _fits_column(field: str, value) -> bool:
+    if field == "is_internal":
+        return isinstance(value, bool)
+    if field == "trad_sentiment":
+        return (
+            isinstance(value, dict)
+            and set(value) == set(SENTIMENT_KEYS)
+            and all(isinstance(score, (int, float)) for score in value.values())
+        )
+    return isinstance(value, str)
+
+
+def _decode_strings(data, ends) -> list[str]:
+    raw = data.tobytes()
+    starts = [0, *ends[:-1].tolist()]
+    return [raw[start:end].decode("utf-8") for start, end in zip(starts, ends.tolist())]
+
+
+class ColumnarArchive:
+    """
+    A channel's archived messages as compressed, column-oriented segments in `<directory>/<channel>.columnar/`.
+
+    Each append writes `numpy.savez_compressed` segments of typed arrays: strings as one UTF-8 buffer plus end
+    offsets, `is_internal` as booleans and the VADER scores as float32. Thread replies are stored as rows of their
+    own with `parent_ts` set. `read(columns=[...])` only decompresses the columns it's asked for, and
+    `iter_messages` rebuilds the same dicts `JsonlArchive` stores, so the two formats convert losslessly.
+    The manifest (`manifest.json`) lists the segments with their message counts and the newest `ts`; segments
+    are fsynced before the manifest is replaced, and any a crash left unlisted are removed by `recover`.
+    """
+
+    def __init__(self, channel_name: str, directory: str = ARCHIVE_DIR):
+        self.directory = Path(directory)
+        self.channel_name = channel_name
+        self.path = self.directory / f"{channel_name}.columnar"
+        self.manifest_path = self.path / "manifest.json"
+        self._manifest = None
+
+    def recover(self) -> bool:
+        """Remove segments and temporary files left by an append interrupted before its manifest was written."""
+        if not self.path.is_dir():
+            return False
+        listed = set()
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r") as f:
+                listed = {segment["name"] for segment in json.load(f)["segments"]}
+        orphans = [
+            path
+            for path in self.path.iterdir()
+            if path.suffix == ".tmp" or (path.name.startswith("segment-") and path.name not in listed)
+        ]
+        for path in orphans:
+            logger.warning(f"Removing {path} left by an interrupted append")
+            path.unlink()
+        if orphans:
+            _fsync_directory(self.path)
+        return bool(orphans)
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            self.recover()
+            if self.manifest_path.exists():
+                with open(self.manifest_path, "r") as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {"latest_ts": 0.0, "count": 0, "segments": []}
+        return self._manifest
+
+    def refresh(self) -> None:
+        """Forget the cached manifest, e.g. after another writer may have appended."""
+        self._manifest = None
+
+    @property
+    def latest_ts(self) -> float:
+        return self.manifest["latest_ts"]
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    @staticmethod
+    def _to_rows(messages: list[dict]) -> Iterator[dict]:
+        for message in messages:
+            yield message
+            for reply in message.get("reply_messages", []):
+                yield {**reply, "parent_ts": message["ts"]}
+
+    def _write_segment(self, name: str, messages: list[dict]) -> dict:
+        import numpy as np
+
+        rows = list(self._to_rows(messages))
+        strings = {column: [] for column in STRING_COLUMNS}
+        is_internal, present = [], []
+        sentiments = {key: [] for key in SENTIMENT_KEYS}
+        for row in rows:
+            # a field only goes in its column if it has the column's type, anything else is kept in "extra"
+            fields = [field for field in _FIELDS if _fits_column(field, row.get(field))]
+            present.append(sum(1 << _FIELDS.index(field) for field in fields))
+            strings["ts"].append(row["ts"])
+            for column in ("author", "text", "thread_ts"):
+                strings[column].append(row[column] if column in fields else "")
+            strings["parent_ts"].append(row.get("parent_ts", ""))
+            is_internal.append("is_internal" in fields and row["is_internal"])
+            sentiment = row["trad_sentiment"] if "trad_sentiment" in fields else {}
+            for key in SENTIMENT_KEYS:
+                sentiments[key].append(sentiment.get(key, np.nan))
+            # replies are rows of their own, but an empty `reply_messages` is kept so it round-trips
+            extra = {
+                key: value
+                for key, value in row.items()
+                if key not in ("ts", "parent_ts", *fields) and not (key == "reply_messages" and value)
+            }
+            strings["extra"].append(json.dumps(extra) if extra else "")
+
+        arrays = {"present": np.array(present, dtype=np.uint8), "is_internal": np.array(is_internal, dtype=bool)}
+        for column, values in strings.items():
+            arrays[f"{column}_data"], arrays[f"{column}_ends"] = _encode_strings(values)
+        for key in SENTIMENT_KEYS:
+            arrays[f"sentiment_{key}"] = np.array(sentiments[key], dtype=np.float32)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+                _fsync(f)
+            os.replace(tmp_path, self.path / name)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return {
+            "name": name,
+            "count": len(messages),
+            "rows": len(rows),
+            "latest_ts": max(float(message["ts"]) for message in messages),
+        }
+
+    def append(self, messages: list[dict]) -> int:
+        """Append the messages newer than the archive's latest `ts` as new segments, returning how many."""
+        new_messages = [message for message in messages if float(message["ts"]) > self.latest_ts]
+        if not new_messages:
+            return 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        manifest = dict(self.manifest, segments=list(self.manifest["segments"]))
+        for start in range(0, len(new_messages), ARCHIVE_SEGMENT_SIZE):
+            name = f"segment-{len(manifest['segments']):06d}.npz"
+            segment = self._write_segment(name, new_messages[start : start + ARCHIVE_SEGMENT_SIZE])
+            manifest["segments"].append(segment)
+            manifest["count"] += segment["count"]
+            manifest["latest_ts"] = max(manifest["latest_ts"], segment["latest_ts"])
+        # segments are only part of the archive once the manifest lists them, so their renames must land first
+        _fsync_directory(self.path)
+        atomic_write_json(self.manifest_path, manifest, fsync=ARCHIVE_FSYNC)
+        self._manifest = manifest
+        return len(new_messages)
+
+    def _read_segment(self, segment: dict, columns: Iterable[str]) -> dict:
+        import numpy as np
+
+        with np.load(self.path / segment["name"], allow_pickle=False) as arrays:
+            result = {}
+            for column in columns:
+                if column in STRING_COLUMNS:
+                    result[column] = _decode_strings(arrays[f"{column}_data"], arrays[f"{column}_ends"])
+                else:
+                    result[column] = arrays[column]
+            return result
+
+    def read(self, columns: Optional[list[str]] = None) -> dict:
+        """
+        Return `{column: values}` for every row (messages and their replies), reading only `columns` (default
+        all). String columns are lists, the rest numpy arrays; a missing string is "" and a missing score NaN.
+        """
+        import numpy as np
+
+        columns = columns or COLUMNS
+        unknown = set(columns) - set(COLUMNS) - {"present"}
+        if unknown:
+            raise ValueError(f"Unknown archive columns: {sorted(unknown)}")
+        result = {column: [] for column in columns}
+        for segment in self.manifest["segments"]:
+            for column, values in self._read_segment(segment, columns).items():
+                result[column].append(values)
+        return {
+            column: (
+                [value for values in parts for value in values]
+                if column in STRING_COLUMNS
+                else (np.concatenate(parts) if parts else np.array([]))
+            )
+            for column, parts in result.items()
+        }
+
+    def iter_messages(self, start: int = 0) -> Iterator[dict]:
+        """Yield the archived messages from the `start`-th on, rebuilt exactly as they were appended."""
+        index = 0
+        for segment in self.manifest["segments"]:
+            if index + segment["count"] <= start:
+                index += segment["count"]
+                continue
+            data = self._read_segment(segment, COLUMNS + ["present"])
+            message = None
+            for row in range(segment["rows"]):
+                rebuilt = self._rebuild(data, row)
+                if data["parent_ts"][row]:
+                    message.setdefault("reply_messages", []).append(rebuilt)
+                    continue
+                if message is not None and index >= start:
+                    yield message
+                index += message is not None
+                message = rebuilt
+            if message is not None:
+                if index >= start:
+                    yield message
+                index += 1
+
+    @staticmethod
+    def _rebuild(data: dict, row: int) -> dict:
+        mask = int(data["present"][row])
+        message = {"ts": data["ts"][row]}
+        if data["extra"][row]:
+            message.update(json.loads(data["extra"][row]))
+        for bit, field in enumerate(_FIELDS):
+            if not mask & (1 << bit):
+                continue
+            if field == "trad_sentiment":
+                # VADER rounds its scores to at most 4 decimals, which float32 holds exactly once rounded back
+                message[field] = {
+                    key: round(float(data[f"sentiment_{key}"][row]), 4) for key in SENTIMENT_KEYS
+                }
+            elif field == "is_internal":
+                message[field] = bool(data["is_internal"][row])
+            else:
+                message[field] = data[field][row]
+        return message
+
+    def get_upload_file(self) -> tuple[Path, str]:
+        """
+        Bundle the segments into one compressed `.npz` (all columns) to share the archive as a single file.
+
+        The bundle is only rebuilt when the archive has changed since it was last written, which `<bundle>.json`
+        records as the manifest's `latest_ts` and `count`.
+        """
+        import numpy as np
+
+        bundle = self.directory / f"{self.channel_name}.columnar.npz"
+        stamp_path = bundle.with_name(f"{bundle.name}.json")
+        stamp = {"latest_ts": self.latest_ts, "count": self.count}
+        if bundle.exists() and stamp_path.exists():
+            with open(stamp_path, "r") as f:
+                if json.load(f) == stamp:
+                    return bundle, f"{self.channel_name}_history.npz"
+
+        data = self.read(COLUMNS + ["present"])
+        arrays = {}
+        for column, values in data.items():
+            if column in STRING_COLUMNS:
+                arrays[f"{column}_data"], arrays[f"{column}_ends"] = _encode_strings(values)
+            else:
+                arrays[column] = values
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=bundle.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, bundle)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        atomic_write_json(stamp_path, stamp)
+        return bundle, f"{self.channel_name}_history.npz"
+
+
+Archive = Union[JsonlArchive, ColumnarArchive]
+
+
+def get_archive(channel_name: str, directory: Optional[str] = None, archive_format: Optional[str] = None) -> Archive:
+    archive_format = archive_format or ARCHIVE_FORMAT
+    if archive_format not in ("jsonl", "columnar"):
+        raise ValueError(f"Unknown ARCHIVE_FORMAT {archive_format!r}, expected 'jsonl' or 'columnar'")
+    archive_cls = ColumnarArchive if archive_format == "columnar" else JsonlArchive
+    return archive_cls(channel_name, directory=directory or ARCHIVE_DIR)
+
+
+def convert_archive(source: Archive, destination: Archive, batch_size: int = ARCHIVE_SEGMENT_SIZE) -> int:
+    """Copy every message from `source` into `destination` (e.g. JSONL to columnar), returning how many."""
+    copied, batch = 0, []
+    for message in source.iter_messages():
+        batch.append(message)
+        if len(batch) >= batch_size:
+            copied += destination.append(batch)
+            batch = []
+    if batch:
+        copied += destination.append(batch)
+    return copied
+
+
+class ThreadUpdates:
+    """
+    Append-only records of thread replies posted after their parent was archived, kept next to the archive in
+    `<channel>.thread_updates.jsonl` so the archive itself is never rewritten.
+
+    `<channel>.threads.json` maps each archived thread parent's `ts` to the `latest_reply` seen for it, so a sync
+    only fetches threads whose `latest_reply` has moved on. A thread whose replies couldn't be fetched maps to
+    `PENDING_REPLIES` until a later sync gets them; its archived parent keeps `replies_incomplete`, and the first
+    record for it holds all of its replies. The index is read once per instance, so use one per sync.
+    """
+
+    PENDING_REPLIES = ""
+
+    def __init__(self, channel_name: str, directory: str = ARCHIVE_DIR):
+        self.directory = Path(directory)
+        self.path = self.directory / f"{channel_name}.thread_updates.jsonl"
+        self.index_path = self.directory / f"{channel_name}.threads.json"
+        self._index = None
+
+    def load_index(self, archive: Archive) -> dict[str, str]:
+        """Return `{parent ts: latest reply ts}`, building it from the archive once if it doesn't exist yet."""
+        if self._index is not None:
+            return self._index
+        if self.index_path.exists():
+            with open(self.index_path, "r") as f:
+                self._index = json.load(f)
+            return self._index
+
+        logger.info(f"Building the thread index of {archive.path}")
+        index = {}
+        self._track(index, archive.iter_messages())
+        for record in self._iter_records():
+            index[record["parent_ts"]] = record["latest_reply"]
+        atomic_write_json(self.index_path, index)
+        self._index = index
+        return index
+
+    @classmethod
+    def _track(cls, index: dict, messages: Iterable[dict]) -> None:
+        for message in messages:
+            if message.get("replies_incomplete"):
+                index[message["ts"]] = cls.PENDING_REPLIES
+            elif message.get("latest_reply"):
+                index[message["ts"]] = message["latest_reply"]
+
+    @classmethod
+    def get_oldest_pending(cls, index: dict) -> Optional[float]:
+        """Return the `ts` of the oldest thread still waiting for its replies, if any."""
+        pending = [float(ts) for ts, latest_reply in index.items() if latest_reply == cls.PENDING_REPLIES]
+        return min(pending, default=None)
+
+    def track(self, archive: Archive, messages: list[dict]) -> None:
+        """Remember the `latest_reply` of newly archived thread parents, or that their replies are still missing."""
+        index = self.load_index(archive)
+        self._track(index, messages)
+        atomic_write_json(self.index_path, index)
+
+    def record(self, archive: Archive, threads: list[tuple[str, str, list[dict]]]) -> None:
+        """
+        Append a record for each `(parent ts, latest reply ts, new replies)` with new replies, then advance every
+        thread's `latest_reply` in the index. Only pass threads whose replies were actually fetched.
+        """
+        synced_at = time.time()
+        records = [
+            {"parent_ts": parent_ts, "latest_reply": latest_reply, "reply_messages": replies, "synced_at": synced_at}
+            for parent_ts, latest_reply, replies in threads
+            if replies
+        ]
+        if records:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            _truncate_partial_line(self.path)  # so a record torn by a crash isn't glued to the next one
+            with open(self.path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                _fsync(f)
+        index = self.load_index(archive)
+        for parent_ts, latest_reply, _ in threads:
+            index[parent_ts] = latest_reply
+        atomic_write_json(self.index_path, index)
+
+    def _iter_records(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                if line.endswith("\n"):  # skip a partial last line
+                    yield json.loads(line)
+
+    def has_records(self) -> bool:
+        return self.path.exists() and self.path.stat().st_size > 0
+
+
+def recover_archives(directory: str = ARCHIVE_DIR) -> list[str]:
+    """
+    Roll every archive in `directory` forward or back to its last committed state after a crash, returning the
+    names of the files that needed it. Safe to run at any time no append is in progress, e.g. on startup.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    recovered = []
+    for path in sorted(directory.iterdir()):
+        if path.name.endswith(".thread_updates.jsonl"):
+            needed = _truncate_partial_line(path) > 0
+        elif path.suffix == ".jsonl":
+            needed = JsonlArchive(path.stem, directory).recover()
+        elif path.suffix == ".columnar" and path.is_dir():
+            needed = ColumnarArchive(path.stem, directory).recover()
+        elif path.name.endswith(".jsonl.journal") and not path.with_suffix("").exists():
+            # the crash happened during a channel's very first append
+            needed = JsonlArchive(path.name[: -len(".jsonl.journal")], directory).recover()
+        else:
+            continue
+        if needed:
+            recovered.append(path.name)
+    return recovered
+
+
+async def sync_thread_replies(
+    slack_context,
+    archive: Archive,
+    channel_id: str,
+    history: list[dict],
+    thread_updates: Optional[ThreadUpdates] = None,
+) -> int:
+    """
+    Fetch the replies of archived threads whose `latest_reply` advanced and record the new ones.
+
+    `history` should be the channel's recent messages (e.g. the last `ARCHIVE_THREAD_LOOKBACK_DAYS`, and back to
+    the oldest thread still pending replies); only those already in the archive are considered, so the cost follows
+    recent thread activity, not the archive size. Threads whose replies can't be fetched are left as they were in
+    the index, so the next sync tries them again.
+
+    Returns:
+        int: The number of threads that got new replies.
+    """
+    thread_updates = thread_updates or ThreadUpdates(archive.channel_name, directory=str(archive.directory))
+    known = await asyncio.to_thread(thread_updates.load_index, archive)
+    advanced = [
+        message
+        for message in history
+        if message.get("latest_reply")
+        and float(message["ts"]) <= archive.latest_ts
+        and float(message["latest_reply"]) > float(known.get(message["ts"]) or 0)
+    ]
+    if not advanced:
+        return 0
+
+    logger.info(f"Fetching new replies of {len(advanced)} threads in #{archive.channel_name}")
+    parents = await slack_context.get_rich_parsed_messages(advanced, channel_id=channel_id, include_threads=True)
+    threads = []
+    for parent in parents:
+        if parent.get("replies_incomplete"):
+            logger.warning(f"Couldn't fetch the replies of thread {parent['ts']}, will retry on the next sync")
+            continue
+        since = float(known.get(parent["ts"]) or 0)
+        replies = [reply for reply in parent.get("reply_messages", []) if float(reply["ts"]) > since]
+        threads.append((parent["ts"], parent["latest_reply"], replies))
+    await asyncio.to_thread(thread_updates.record, archive, threads)
+    return sum(1 for *_, replies in threads if replies)
+
+
+async def sync_channel_archive(
+    slack_context, channel_id: str, archive: Archive, on_fetch: Optional[Callable[[], Awaitable[Any]]] = None
+) -> tuple[int, int]:
+    """
+    Bring the channel's archive up to date: append messages posted since its latest `ts` (with their replies)
+    and record new replies to threads archived in the last `ARCHIVE_THREAD_LOOKBACK_DAYS`.
+
+    The history is consumed one page at a time, so memory stays bounded by a page (plus its replies) however
+    far behind the archive is. `on_fetch` is awaited once the first new messages come in, before their replies
+    are fetched and parsed. Every file read and write (and fsync) runs in a worker thread, so a big channel
+    doesn't stall the event loop.
+
+    Returns:
+        tuple[int, int]: The number of new messages archived and of threads that got new replies.
+    """
+    async with _sync_locks.setdefault(str(archive.path), asyncio.Lock()):
+        await asyncio.to_thread(_reload_manifest, archive)
+        return await _sync_channel_archive(slack_context, channel_id, archive, on_fetch)
+
+
+def _reload_manifest(archive: Archive) -> float:
+    """Read the manifest again (recovering an interrupted append first), returning the archive's latest `ts`."""
+    archive.refresh()
+    return archive.latest_ts
+
+
+def _spool_page(spool_dir: str, index: int, messages: list[dict]) -> Path:
+    path = Path(spool_dir) / f"{index:08d}.jsonl"
+    with open(path, "w") as f:
+        for message in messages:
+            f.write(json.dumps(message) + "\n")
+    return path
+
+
+def _read_spooled_page(path: Path) -> list[dict]:
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f]
+
+
+async def _sync_channel_archive(slack_context, channel_id: str, archive: Archive, on_fetch) -> tuple[int, int]:
+    latest_ts = archive.latest_ts
+    thread_updates = ThreadUpdates(archive.channel_name, directory=str(archive.directory))
+    since_ts = latest_ts
+    if latest_ts:
+        # reach back far enough to see which recent threads have new replies, and every thread still missing them
+        since_ts = min(latest_ts, time.time() - ARCHIVE_THREAD_LOOKBACK_DAYS * 86_400)
+        oldest_pending = ThreadUpdates.get_oldest_pending(await asyncio.to_thread(thread_updates.load_index, archive))
+        if oldest_pending is not None:
+            since_ts = min(since_ts, oldest_pending - 1)  # `oldest` is exclusive
+
+    updated_threads = 0
+    # Slack pages newest first but the archive only appends oldest first, so each parsed page is spooled to a
+    # temporary file and the pages are appended in reverse once they're all in
+    with tempfile.TemporaryDirectory(prefix="ossai-archive-") as spool_dir:
+        spooled = []
+        async with aclosing(slack_context.iter_channel_history(channel_id, since_ts=since_ts)) as pages:
+            async for page in pages:
+                page.reverse()
+                updated_threads += await sync_thread_replies(slack_context, archive, channel_id, page, thread_updates)
+                new_page = [message for message in page if float(message["ts"]) > latest_ts]
+                if not new_page:
+                    continue
+                if on_fetch and not spooled:
+                    await on_fetch()
+                messages = await slack_context.get_rich_parsed_messages(
+                    new_page, channel_id=channel_id, include_threads=True
+                )
+                spooled.append(await asyncio.to_thread(_spool_page, spool_dir, len(spooled), messages))
+
+        new_messages = 0
+        for path in reversed(spooled):
+            messages = await asyncio.to_thread(_read_spooled_page, path)
+            new_messages += await asyncio.to_thread(archive.append, messages)
+            await asyncio.to_thread(thread_updates.track, archive, messages)
+    return new_messages, updated_threads
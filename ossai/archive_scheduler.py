@@ -0,0 +1,149 @@
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+from slack_sdk.errors import SlackApiError
+
+from ossai.archive import get_archive, sync_channel_archive
+from ossai.logging_config import logger
+from ossai.slack_context import SlackContext
+
+# comma-separated channel IDs to keep archived in the background, e.g. "C0123,C0456"
+ARCHIVE_CHANNELS = [channel.strip() for channel in os.getenv("ARCHIVE_CHANNELS", "").split(",") if channel.strip()]
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", 6 * 3600))
+ARCHIVE_CONCURRENCY = int(os.getenv("ARCHIVE_CONCURRENCY", 2))
+ARCHIVE_JITTER_SECONDS = float(os.getenv("ARCHIVE_JITTER_SECONDS", 60))
+ARCHIVE_MAX_RETRIES = 3
+ARCHIVE_BACKOFF_SECONDS = 30  # doubled on each retry, unless Slack says how long to wait
+
+
+class ArchiveScheduler:
+    """
+    Periodically sync the archives of a fixed set of channels in the background.
+
+    Every `interval` seconds each channel that isn't already waiting or running is put on a queue, which
+    `concurrency` workers drain, each sync starting after a random delay of up to `jitter` seconds so they
+    don't all hit Slack at once. A failed sync is retried with exponential backoff; when Slack rate limits us
+    (after the client's own retries), every worker pauses for the `Retry-After` Slack asked for. The outcome and
+    duration of each channel's last run is kept in `status` for /stats.
+    """
+
+    def __init__(
+        self,
+        slack_context: SlackContext,
+        channels: list[str],
+        interval: float = ARCHIVE_INTERVAL_SECONDS,
+        concurrency: int = ARCHIVE_CONCURRENCY,
+        jitter: float = ARCHIVE_JITTER_SECONDS,
+        max_retries: int = ARCHIVE_MAX_RETRIES,
+        backoff: float = ARCHIVE_BACKOFF_SECONDS,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        self.slack_context = slack_context
+        self.channels = channels
+        self.interval = interval
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._sleep = sleep
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._paused_until = 0.0
+        self.status = {channel_id: {"state": "idle", "runs": 0, "failures": 0} for channel_id in channels}
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        logger.info(f"Archiving {len(self.channels)} channels every {self.interval:.0f}s in the background")
+        self._tasks = [asyncio.create_task(self._enqueue_periodically())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, channel_id: str) -> bool:
+        """Queue a sync of the channel, unless one is already queued or running."""
+        status = self.status.setdefault(channel_id, {"state": "idle", "runs": 0, "failures": 0})
+        if status["state"] in ("queued", "running"):
+            return False
+        status["state"] = "queued"
+        self._queue.put_nowait(channel_id)
+        return True
+
+    async def _enqueue_periodically(self):
+        while True:
+            for channel_id in self.channels:
+                self.enqueue(channel_id)
+            await self._sleep(self.interval)
+
+    async def _worker(self):
+        while True:
+            channel_id = await self._queue.get()
+            try:
+                await self._sleep(random.uniform(0, self.jitter))
+                await self.run(channel_id)
+            finally:
+                self._queue.task_done()
+
+    async def _wait_if_paused(self):
+        remaining = self._paused_until - time.monotonic()
+        if remaining > 0:
+            await self._sleep(remaining)
+
+    async def run(self, channel_id: str) -> Optional[tuple[int, int]]:
+        """Sync one channel's archive now, with retries, recording the outcome in `status`."""
+        status = self.status.setdefault(channel_id, {"state": "idle", "runs": 0, "failures": 0})
+        status.update(state="running", last_started_at=time.time())
+        started = time.perf_counter()
+        result, error = None, None
+        for attempt in range(self.max_retries + 1):
+            await self._wait_if_paused()
+            try:
+                _, channel_name = await self.slack_context.get_is_private_and_channel_name(channel_id)
+                if channel_name == "unknown":  # the lookup failed; don't archive into unknown.jsonl
+                    raise RuntimeError(f"Couldn't look up the name of {channel_id}")
+                result = await sync_channel_archive(self.slack_context, channel_id, get_archive(channel_name))
+                break
+            except Exception as e:
+                error = e
+            if attempt == self.max_retries:
+                break
+            delay = self.backoff * 2**attempt
+            if isinstance(error, SlackApiError) and (
+                error.response.status_code == 429 or error.response.get("error") == "ratelimited"
+            ):
+                delay = float(error.response.headers.get("Retry-After", delay) or delay)
+                # Slack's limits are per workspace, so hold every worker back (the wait happens at the loop's top)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logger.warning(f"Rate limited while archiving {channel_id}, pausing archiving for {delay:.0f}s")
+                continue
+            logger.warning(f"Archiving {channel_id} failed ({error}), retrying in {delay:.0f}s")
+            await self._sleep(delay)
+
+        status["runs"] += 1
+        status["last_finished_at"] = time.time()
+        status["last_duration_seconds"] = round(time.perf_counter() - started, 3)
+        if result is None:
+            logger.error(f"Giving up archiving {channel_id} until the next run: {error}")
+            status.update(state="failed", last_error=str(error))
+            status["failures"] += 1
+            return None
+        new_messages, updated_threads = result
+        status.update(
+            state="idle", last_error=None, last_new_messages=new_messages, last_updated_threads=updated_threads
+        )
+        logger.info(f"Archived {new_messages} new messages and {updated_threads} updated threads of {channel_id}")
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "channels": self.status,
+            "queued": self._queue.qsize(),
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
@@ -1,10 +1,10 @@
 from functools import wraps
 from typing import Optional, Union
 from pydantic import BaseModel, Field, ValidationError
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
 from ossai.logging_config import logger
-from ossai.slack_context import SlackContext
+from ossai.slack_context import SlackContext, SyncWebClientAdapter
 
 
 class SlackPayload(BaseModel):
@@ -24,7 +24,9 @@ def catch_errors_dm_user(func):
     @wraps(func)
     async def wrapper(slack_context: SlackContext, *args, **kwargs):
         assert isinstance(slack_context, SlackContext), "slack_context must be a SlackContext"
-        assert isinstance(slack_context.client, WebClient), "slack_context.client must be a Slack WebClient"
+        assert isinstance(
+            slack_context.client, (AsyncWebClient, SyncWebClientAdapter)
+        ), "slack_context.client must be a Slack AsyncWebClient (or a WebClient wrapped by SlackContext)"
 
         payload = None
         if args:
@@ -73,7 +75,7 @@ async def _handle_channel_error(slack_context: SlackContext, user_id: str):
     channel_id = await slack_context.get_direct_message_channel_id(user_id)
     error_type = "Not in channel"
     bot_id = await slack_context.get_bot_id()
-    bot_info = slack_context.client.bots_info(bot=bot_id)
+    bot_info = await slack_context.client.bots_info(bot=bot_id)
     bot_name = bot_info["bot"]["name"]
     error_message = f"Sorry, couldn't find the channel. Have you added `@{bot_name}` to the channel?"
     return channel_id, error_type, error_message
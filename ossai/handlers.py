@@ -1,16 +1,20 @@
+import asyncio
 import os
-import json
-from pathlib import Path
 
 from aiohttp import ClientSession
+from contextlib import aclosing
 from datetime import datetime
-from langsmith import Client
+from typing import Optional
 
+from ossai.archive import ThreadUpdates, get_archive, sync_channel_archive
 from ossai.decorators.catch_error_dm_user import catch_errors_dm_user
 from ossai.logging_config import logger
+from ossai.rolling_summary import summarize_channel_incrementally
 from ossai.summarizer import Summarizer
-from ossai.topic_analysis import analyze_topics_of_history
+from ossai.topic_analysis import TopicAnalysisBusyError, analyze_topics_of_history
+from ossai.topic_corpus import get_message_key
 from ossai.utils import (
+    ThrottledMessageUpdater,
     get_text_and_blocks_for_say,
     get_since_timeframe_presets,
 )
@@ -18,10 +22,28 @@ from ossai.slack_context import SlackContext
 
 _custom_prompt_cache = {}
 
+# edit the "..." placeholder as the summary streams in, instead of waiting for the whole summary
+STREAM_SUMMARIES = os.getenv("STREAM_SUMMARIES", "true").strip().lower() == "true"
+STREAM_UPDATE_INTERVAL_SECONDS = float(os.getenv("STREAM_UPDATE_INTERVAL_SECONDS", 1.5))
+
+
+def _get_stream_updater(client, placeholder, title: str) -> Optional[ThrottledMessageUpdater]:
+    if not STREAM_SUMMARIES or not placeholder or not placeholder.get("ts"):
+        return None
+    return ThrottledMessageUpdater(
+        client,
+        placeholder["channel"],
+        placeholder["ts"],
+        title=title,
+        min_interval=STREAM_UPDATE_INTERVAL_SECONDS,
+    )
+
 def handler_feedback(body):
     """
     Handler for the feedback buttons that passes the feedback to Langsmith.
     """
+    from langsmith import Client  # slow to import, and only needed once someone clicks a button
+
     client = Client()
     actions_data = body.get("actions")[0]
     run_id = actions_data.get("value")
@@ -55,15 +77,13 @@ async def handler_shortcuts(
     )
     dm_channel_id = await slack_context.get_direct_message_channel_id(user_id)
     channel_id_for_say = dm_channel_id if is_private else channel_id
-    await say(channel=channel_id_for_say, text="...")
+    placeholder = await say(channel=channel_id_for_say, text="...")
 
-    response = slack_context.client.conversations_replies(
-        channel=channel_id, ts=payload["message_ts"]
-    )
+    response = await slack_context.get_thread_messages(channel_id, payload["message_ts"])
     if response["ok"]:
         messages = response["messages"]
         original_message = messages[0]["text"]
-        workspace_name = slack_context.get_workspace_name()
+        workspace_name = await slack_context.get_workspace_name()
         link = f"https://{workspace_name}.slack.com/archives/{channel_id}/p{payload['message_ts'].replace('.', '')}"
 
         original_message = original_message.split("\n")
@@ -79,12 +99,19 @@ async def handler_shortcuts(
         title = f'*Summary of <{link}|{"thread" if len(messages) > 1 else "message"}>:*\n>{thread_hint}\n'
         user = await slack_context.get_user_context(user_id)
         summarizer = Summarizer(slack_context)
-        summary, run_id = summarizer.summarize_slack_messages(
-            messages, channel_id, feature_name="summarize_thread", user=user
+        updater = _get_stream_updater(client, placeholder, title)
+        summary, run_id = await summarizer.summarize_slack_messages(
+            messages,
+            channel_id,
+            feature_name="summarize_thread",
+            user=user,
+            on_update=updater.update if updater else None,
         )
         text, blocks = get_text_and_blocks_for_say(
             title=title, run_id=run_id, messages=summary
         )
+        if updater:
+            return await updater.finish(text, blocks)
         return await say(channel=channel_id_for_say, text=text, blocks=blocks)
     else:
         return await say(
@@ -99,27 +126,32 @@ async def handler_tldr_extended_slash_command(
 ):
     await ack()
     client = slack_context.client
-    channel_name = payload["channel_name"]
     channel_id = payload["channel_id"]
 
     dm_channel_id = await slack_context.get_direct_message_channel_id(user_id)
-    await say(channel=dm_channel_id, text="...")
+    placeholder = await say(channel=dm_channel_id, text="...")
 
-    history = await slack_context.get_channel_history(channel_id)
-    history.reverse()
     user = await slack_context.get_user_context(user_id)
-    title = f"*Summary of #{channel_name}* (last {len(history)} messages)\n"
+    is_private, channel_name = await slack_context.get_is_private_and_channel_name(channel_id)
     custom_prompt = payload.get("text", None)
     summarizer = Summarizer(slack_context, custom_prompt=custom_prompt)
-    summary, run_id = summarizer.summarize_slack_messages(
-        history,
+    updater = _get_stream_updater(client, placeholder, f"*Summary of #{channel_name}*\n")
+    # only the messages posted since the last /tldr_extended are summarized, then merged into the stored summary
+    summary, run_id, message_count = await summarize_channel_incrementally(
+        summarizer,
         channel_id,
         feature_name="summarize_channel_messages",
         user=user,
+        is_private=is_private,
+        channel_name=channel_name,
+        on_update=updater.update if updater else None,
     )
+    title = f"*Summary of #{channel_name}* (last {message_count} messages)\n"
     text, blocks = get_text_and_blocks_for_say(
         title=title, run_id=run_id, messages=summary, custom_prompt=custom_prompt
     )
+    if updater:
+        return await updater.finish(text, blocks)
     return await say(channel=dm_channel_id, text=text, blocks=blocks)
 
 
@@ -133,12 +165,17 @@ async def handler_topics_slash_command(
     dm_channel_id = await slack_context.get_direct_message_channel_id(user_id)
     await say(channel=dm_channel_id, text="...")
 
-    history = await slack_context.get_channel_history(channel_id)
-    history.reverse()
+    # the topic models need the whole channel, but only its parsed text and message keys are kept, page by page
+    messages, message_keys = [], []
+    async with aclosing(slack_context.iter_channel_history(channel_id)) as pages:
+        async for page in pages:
+            messages.extend(await slack_context.get_parsed_messages(page, with_names=False))
+            message_keys.extend(get_message_key(msg) for msg in page)
+    messages.reverse()
+    message_keys.reverse()
 
-    messages = slack_context.get_parsed_messages(history, with_names=False)
     user = await slack_context.get_user_context(user_id)
-    is_private, channel_name = slack_context.get_is_private_and_channel_name(channel_id)
+    is_private, channel_name = await slack_context.get_is_private_and_channel_name(channel_id)
     custom_prompt = payload.get("text", None)
     if custom_prompt:
         # todo: add support for custom prompts to /tldr
@@ -147,9 +184,21 @@ async def handler_topics_slash_command(
             text="Sorry, this command doesn't support custom prompts yet so I'm processing your request without it.",
         )
 
-    topic_overview, run_id = await analyze_topics_of_history(
-        channel_name, messages, user=user, is_private=is_private
-    )
+    try:
+        topic_overview, run_id = await analyze_topics_of_history(
+            channel_name,
+            messages,
+            user=user,
+            is_private=is_private,
+            channel_id=channel_id,
+            message_keys=message_keys,
+        )
+    except TopicAnalysisBusyError:
+        logger.warning(f"Topic analysis is busy, turning away /tldr for #{channel_name}")
+        return await say(
+            channel=dm_channel_id,
+            text="Sorry, I'm busy preparing other channel overviews right now. Please try again in a minute.",
+        )
     title = f"*Channel Overview: #{channel_name}*\n\n"
     text, blocks = get_text_and_blocks_for_say(
         title=title, run_id=run_id, messages=[topic_overview]
@@ -166,7 +215,7 @@ async def handler_tldr_since_slash_command(slack_context: SlackContext, ack, pay
 
     custom_prompt = payload.get("text", None)
 
-    result = client.chat_postEphemeral(
+    result = await client.chat_postEphemeral(
         channel=payload["channel_id"],
         user=payload["user_id"],
         text=title,
@@ -224,31 +273,40 @@ async def handler_action_summarize_since_date(slack_context: SlackContext, ack,
         since_datetime: datetime = datetime.strptime(since_date, "%Y-%m-%d").date()
 
     dm_channel_id = await slack_context.get_direct_message_channel_id(user_id)
-    client.chat_postMessage(channel=dm_channel_id, text="...")
+    placeholder = await client.chat_postMessage(channel=dm_channel_id, text="...")
 
     async with ClientSession() as session:
         await session.post(body["response_url"], json={"delete_original": "true"})
 
-    history = await slack_context.get_channel_history(channel_id, since=since_datetime)
-    history.reverse()
     user = await slack_context.get_user_context(user_id)
     custom_prompt = None
     if "container" in body and "message_ts" in body["container"]:
         key = f"{body['container']['message_ts']}__{user_id}"
         custom_prompt = _custom_prompt_cache.get(key, None)
     summarizer = Summarizer(slack_context, custom_prompt=custom_prompt)
-    summary, run_id = summarizer.summarize_slack_messages(
-        history, channel_id, feature_name=feature_name, user=user
-    )
+    title = f'*Summary of #{channel_name}* since {since_datetime.strftime("%A %b %-d, %Y")}'
+    updater = _get_stream_updater(client, placeholder, f"{title}\n")
+    # summarized page by page as the history is fetched, so a long timeframe is never held in memory at once
+    async with aclosing(slack_context.iter_channel_history(channel_id, since=since_datetime)) as pages:
+        summary, run_id, message_count = await summarizer.summarize_history_pages(
+            pages,
+            channel_id,
+            feature_name=feature_name,
+            user=user,
+            on_update=updater.update if updater else None,
+        )
+    title = f"{title} ({message_count} messages)\n"
     text, blocks = get_text_and_blocks_for_say(
-        title=f'*Summary of #{channel_name}* since {since_datetime.strftime("%A %b %-d, %Y")} ({len(history)} messages)\n',
+        title=title,
         run_id=run_id,
         messages=summary,
         custom_prompt=custom_prompt,
     )
     # todo: somehow add date/preset choice to langsmith metadata
     #   feature_name: str -> feature: str || Tuple[str, List(Tuple[str, str])]
-    return client.chat_postMessage(channel=dm_channel_id, text=text, blocks=blocks)
+    if updater:
+        return await updater.finish(text, blocks)
+    return await client.chat_postMessage(channel=dm_channel_id, text=text, blocks=blocks)
 
 
 @catch_errors_dm_user
@@ -262,57 +320,40 @@ async def handler_tldr_archive_slash_command_experimental(
     channel_id = payload["channel_id"]
     channel_name = payload["channel_name"]
     
-    # Create data/history directory if it doesn't exist
-    history_dir = Path("data/history")
-    history_dir.mkdir(parents=True, exist_ok=True)
+    archive = get_archive(channel_name)
 
-    # Write messages to channel-specific jsonl file
-    history_file = history_dir / f"{channel_name}.jsonl"
-    
-    # Get latest timestamp and total message count from existing file
-    # FIXME: this only gets the oldest message up to a limit of 1000 messages
-    # FIXME: this won't fetch new replies to messages that were already fetched
-    # TODO: don't just brute force this, its not efficient
-    latest_ts = 0  # FIXME: this doesn't reset if the save fails
-    total_messages = 0
-    if history_file.exists():
-        with open(history_file, "r") as f:
-            for line in f:
-                msg = json.loads(line)
-                latest_ts = max(latest_ts, float(msg["ts"]))
-                total_messages += 1
-
-    # Get and parse the messages from the channel
-    history = await slack_context.get_channel_history(channel_id, since_ts=latest_ts)
-    history.reverse()
-    client.chat_postEphemeral(
-        channel=channel_id,
-        user=user_id,
-        text=f"Fetching {len(history)} messages and any replies from #{channel_name}...",
-    )
-    messages = slack_context.get_rich_parsed_messages(history, channel_id=channel_id, include_threads=True)
-    
-    # Only write messages newer than latest_ts
-    new_messages = 0
-    with open(history_file, "a") as f:
-        for message in messages:
-            if float(message["ts"]) > latest_ts:
-                json.dump(message, f)
-                f.write("\n")
-                new_messages += 1
+    async def on_fetch():
+        await client.chat_postEphemeral(
+            channel=channel_id,
+            user=user_id,
+            text=f"Fetching new messages and any replies from #{channel_name}...",
+        )
+
+    # Append messages newer than the archive's latest ts, and new replies to recently archived threads
+    new_messages, updated_threads = await sync_channel_archive(slack_context, channel_id, archive, on_fetch=on_fetch)
+    upload_file, upload_filename = await asyncio.to_thread(archive.get_upload_file)
+    file_uploads = [
+        {"file": str(upload_file), "filename": upload_filename, "title": f"{channel_name} Message History"}
+    ]
+    thread_updates = ThreadUpdates(channel_name, directory=str(archive.directory))
+    if await asyncio.to_thread(thread_updates.has_records):
+        file_uploads.append(
+            {
+                "file": str(thread_updates.path),
+                "filename": f"{channel_name}_thread_updates.jsonl",
+                "title": f"{channel_name} Thread Replies Since Archiving",
+            }
+        )
 
     dm_channel_id = await slack_context.get_direct_message_channel_id(user_id)
 
     # Upload file to Slack
-    upload_response = client.files_upload_v2(
-        channel=dm_channel_id,
-        file=str(history_file),
-        title=f"{channel_name} Message History",
-        filename=f"{channel_name}_history.jsonl"
-    )
-    file_url = upload_response["file"]["permalink"]
+    upload_response = await client.files_upload_v2(channel=dm_channel_id, file_uploads=file_uploads)
+    file_url = upload_response["files"][0]["permalink"]
 
-    text = f"Saved {new_messages} new messages to #{channel_name} history (total: {total_messages + new_messages} messages archived)"
+    text = f"Saved {new_messages} new messages to #{channel_name} history (total: {archive.count} messages archived)"
+    if updated_threads:
+        text += f" and new replies in {updated_threads} threads"
     blocks = [
         {
             "type": "section",
@@ -329,13 +370,12 @@ async def handler_tldr_archive_slash_command_experimental(
             }
         }
     ]
-    return client.chat_postEphemeral(
+    return await client.chat_postEphemeral(
         channel=channel_id,
         user=user_id,
         text=text,
         blocks=blocks
     )
-    # TODO: ideally this becomes a scheduled job that automatically runs periodically
 
 
 @catch_errors_dm_user
@@ -345,7 +385,7 @@ async def handler_sandbox_slash_command(slack_context: SlackContext, ack, payloa
     channel_id = payload["channel_id"]
     channel_name = payload["channel_name"]
     
-    return client.chat_postEphemeral(
+    return await client.chat_postEphemeral(
         channel=channel_id,
         user=user_id,
         text=f"This is a test of the /sandbox command running in #{channel_name}.",
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from uuid import UUID
+
+from ossai.logging_config import logger
+from ossai.summarizer import OnUpdate, Summarizer
+from ossai.utils.cache import TTLCache
+from ossai.utils.files import atomic_write_json
+
+ROLLING_SUMMARY_DIR = os.getenv("ROLLING_SUMMARY_DIR", "data/summaries")
+ROLLING_SUMMARY_MEMORY_CHANNELS = int(os.getenv("ROLLING_SUMMARY_MEMORY_CHANNELS", 128))
+MAX_STORED_CHUNKS = int(os.getenv("ROLLING_SUMMARY_MAX_CHUNKS", 100))
+
+
+class RollingSummaryStore:
+    """
+    Persist a rolling summary per channel (and custom prompt) as JSON, e.g. `data/summaries/C123.default.json`.
+
+    The state records the newest summarized `ts`, the merged summary so far ("rollup") and the summary of each
+    batch of new messages, keyed by the range of message timestamps it covers. Private channels' states are only
+    kept in an in-memory LRU of `max_channels` entries, never on disk.
+    """
+
+    def __init__(self, directory: str = ROLLING_SUMMARY_DIR, max_channels: int = ROLLING_SUMMARY_MEMORY_CHANNELS):
+        self.directory = Path(directory)
+        self._memory = TTLCache(maxsize=max_channels, ttl=float("inf"))
+
+    def _path(self, channel_id: str, custom_prompt: Optional[str]) -> Path:
+        prompt_key = (
+            hashlib.sha256(custom_prompt.encode("utf-8")).hexdigest()[:16]
+            if custom_prompt
+            else "default"
+        )
+        return self.directory / f"{channel_id}.{prompt_key}.json"
+
+    def load(self, channel_id: str, custom_prompt: Optional[str] = None) -> Optional[dict]:
+        path = self._path(channel_id, custom_prompt)
+        state = self._memory.get(path)
+        if state is not None:
+            return state
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable rolling summary {path}: {e}")
+            return None
+
+    def save(self, state: dict, persist: bool = True) -> None:
+        """
+        Write the state atomically, so a crash mid-write never leaves a truncated file behind. Pass
+        `persist=False` to keep it in memory only (e.g. for private channels).
+        """
+        path = self._path(state["channel_id"], state.get("custom_prompt"))
+        if persist:
+            atomic_write_json(path, state)
+        else:
+            self._memory.set(path, state)
+
+    def clear(self, channel_id: str, custom_prompt: Optional[str] = None) -> bool:
+        path = self._path(channel_id, custom_prompt)
+        in_memory = self._memory.invalidate(path)
+        if not path.exists():
+            return in_memory
+        path.unlink()
+        return True
+
+
+async def summarize_channel_incrementally(
+    summarizer: Summarizer,
+    channel_id: str,
+    feature_name: str,
+    user: dict,
+    is_private: bool,
+    channel_name: str,
+    store: Optional[RollingSummaryStore] = None,
+    on_update: Optional[OnUpdate] = None,
+) -> tuple[list, Optional[UUID], int]:
+    """
+    Summarize a channel's history, only sending messages newer than the stored rollup to the LLM.
+
+    On the first run the whole history is summarized. Afterwards only messages posted since the last run are
+    summarized, and that summary is merged into the stored rollup, so the cost grows with the number of new
+    messages rather than the size of the channel. If `on_update` is given, the final summary (the first full
+    summary, or the merge) is streamed to it. `is_private` and `channel_name` come from the caller's
+    `get_is_private_and_channel_name` lookup.
+
+    Returns:
+        tuple[list, Optional[UUID], int]: The summary text (as a list, like `summarize_slack_messages`), the run
+            ID and the total number of messages covered by the summary.
+    """
+    store = store or rolling_summary_store
+    slack_context = summarizer.slack_context
+    state = store.load(channel_id, summarizer.custom_prompt)
+
+    since_ts = state["latest_ts"] if state else None
+    chunk = {}
+
+    async def new_pages(pages: AsyncIterator[list]) -> AsyncIterator[list]:
+        async for page in pages:
+            page = [msg for msg in page if not since_ts or float(msg["ts"]) > float(since_ts)]
+            if page:
+                # pages and their messages come newest first
+                chunk.setdefault("latest_ts", page[0]["ts"])
+                chunk["oldest_ts"] = page[-1]["ts"]
+                yield page
+
+    # the history is summarized page by page as it's fetched, so a busy channel is never held in memory at once
+    async with aclosing(new_pages(slack_context.iter_channel_history(channel_id, since_ts=since_ts))) as pages:
+        first_page = await anext(pages, None)
+        if state and first_page is None:
+            logger.info(f"No new messages in {channel_id} since {since_ts}, reusing the stored summary")
+            run_id = state.get("run_id")
+            return [state["rollup"]], None if run_id is None else UUID(run_id), state["message_count"]
+
+        summary, run_id, new_count = await summarizer.summarize_history_pages(
+            _prepend(first_page, pages),
+            channel_id,
+            feature_name=feature_name,
+            user=user,
+            map_reduce=True,
+            on_update=None if state else on_update,
+            is_private=is_private,
+            channel_name=channel_name,
+        )
+    if run_id is None or not new_count:
+        # an error message, or nothing to remember
+        return summary, run_id, new_count
+
+    delta_summary = summary[0]
+    rollup = delta_summary
+    if state:
+        rollup, run_id = await summarizer.amerge_summaries(
+            [state["rollup"], delta_summary],
+            feature_name=feature_name,
+            user=user,
+            channel=channel_name,
+            is_private=is_private,
+            on_update=on_update,
+        )
+
+    chunk.update(message_count=new_count, summary=delta_summary)
+    message_count = (state["message_count"] if state else 0) + new_count
+    store.save(
+        {
+            "channel_id": channel_id,
+            "custom_prompt": summarizer.custom_prompt,
+            "latest_ts": chunk["latest_ts"],
+            "message_count": message_count,
+            "rollup": rollup,
+            "run_id": None if run_id is None else str(run_id),
+            "chunks": ((state["chunks"] if state else []) + [chunk])[-MAX_STORED_CHUNKS:],
+            "updated_at": time.time(),
+        },
+        persist=not is_private,
+    )
+    return [rollup], run_id, message_count
+
+
+async def _prepend(page: Optional[list], pages: AsyncIterator[list]) -> AsyncIterator[list]:
+    if page is not None:
+        yield page
+    async for page in pages:
+        yield page
+
+
+rolling_summary_store = RollingSummaryStore()
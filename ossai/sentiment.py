@@ -1,11 +1,25 @@
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 from ossai.logging_config import logger
+from ossai.utils.cache import TTLCache
 import threading
 
+NEUTRAL_SCORES = {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
+SENTIMENT_MEMO_SIZE = int(os.getenv("SENTIMENT_MEMO_SIZE", 100_000))
+# VADER is pure Python, so only worker processes (not threads) speed it up; 1 scores in the calling thread
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", 1))
+SENTIMENT_CHUNK_SIZE = 2000  # texts per worker task; smaller batches are scored in-process
+
 # Initialize the VADER sentiment analyzer
 _sia = None
 _lock = threading.Lock()
+# scores by text hash, so repeated texts (bot messages, "+1", emoji-only replies) are only scored once
+_memo = TTLCache(maxsize=SENTIMENT_MEMO_SIZE, ttl=float("inf"))
+_pool = None
+_pool_lock = threading.Lock()
 
 def _get_analyzer():
     """Lazy initialization of VADER sentiment analyzer with error handling"""
@@ -13,6 +27,10 @@ def _get_analyzer():
     if _sia is None:
         with _lock:
             if _sia is None:  # Double-check lock
+                # imported here since nltk pulls in scipy, which would add seconds to the bot's startup
+                import nltk
+                from nltk.sentiment import SentimentIntensityAnalyzer
+
                 try:
                     # Try to initialize the analyzer
                     _sia = SentimentIntensityAnalyzer()
@@ -44,7 +62,7 @@ def get_traditional_sentiment(text: str) -> dict:
     """
     if not text or not text.strip():
         # Return neutral scores for empty or whitespace-only text
-        return {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
+        return dict(NEUTRAL_SCORES)
     
     try:
         analyzer = _get_analyzer()
@@ -53,4 +71,96 @@ def get_traditional_sentiment(text: str) -> dict:
     except Exception as e:
         logger.error(f"Error calculating sentiment for text: {e}")
         # Return neutral scores as fallback
-        return {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0} 
\ No newline at end of file
+        return dict(NEUTRAL_SCORES)
+
+
+def _score_texts(texts: list[str]) -> list[Optional[dict]]:
+    """Score texts with one analyzer, None where scoring failed. Runs in-process or in a sentiment worker."""
+    analyzer = _get_analyzer()
+    scores = []
+    for text in texts:
+        try:
+            scores.append(analyzer.polarity_scores(text))
+        except Exception as e:
+            logger.error(f"Error calculating sentiment for text: {e}")
+            scores.append(None)
+    return scores
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Lazy initialization of the process pool used for large batches"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:  # Double-check lock
+                _pool = ProcessPoolExecutor(
+                    max_workers=SENTIMENT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def get_traditional_sentiments(texts: list[str], workers: Optional[int] = None) -> list[dict]:
+    """
+    Calculate VADER sentiment scores for many texts at once, in the same format as `get_traditional_sentiment`.
+
+    Identical texts are scored once per batch and remembered across batches, empty texts are neutral without
+    touching the analyzer, and batches larger than `SENTIMENT_CHUNK_SIZE` are split across `workers` processes
+    (default `SENTIMENT_WORKERS`). Blocking; call it from a worker thread in async code.
+
+    Args:
+        texts (list[str]): The texts to analyze for sentiment
+        workers (int, optional): Number of worker processes for large batches
+
+    Returns:
+        list[dict]: One dictionary of scores per text, in order
+    """
+    workers = SENTIMENT_WORKERS if workers is None else workers
+    results = [None] * len(texts)
+    pending = {}  # text -> (memo key, indices of the texts it stands for)
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            results[i] = dict(NEUTRAL_SCORES)
+            continue
+        if text in pending:
+            pending[text][1].append(i)
+            continue
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        scores = _memo.get(key)
+        if scores is not None:
+            results[i] = dict(scores)
+        else:
+            pending[text] = (key, [i])
+
+    if pending:
+        unique_texts = list(pending)
+        try:
+            if workers > 1 and len(unique_texts) > SENTIMENT_CHUNK_SIZE:
+                chunks = [
+                    unique_texts[start : start + SENTIMENT_CHUNK_SIZE]
+                    for start in range(0, len(unique_texts), SENTIMENT_CHUNK_SIZE)
+                ]
+                unique_scores = [
+                    scores for chunk_scores in _get_pool().map(_score_texts, chunks) for scores in chunk_scores
+                ]
+            else:
+                unique_scores = _score_texts(unique_texts)
+        except Exception as e:
+            logger.error(f"Error calculating sentiment for {len(unique_texts)} texts: {e}")
+            unique_scores = [None] * len(unique_texts)
+
+        for text, scores in zip(unique_texts, unique_scores):
+            key, indices = pending[text]
+            if scores is not None:
+                _memo.set(key, scores)
+            for i in indices:
+                results[i] = dict(scores or NEUTRAL_SCORES)
+    return results
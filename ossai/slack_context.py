@@ -1,58 +1,191 @@
+import asyncio
+import inspect
 import os
 import re
+from contextlib import aclosing
 from time import mktime
 from datetime import date
-from typing import List
+from typing import AsyncIterator, List, Union
 
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
 
 from ossai.logging_config import logger
-from ossai.sentiment import get_traditional_sentiment
+from ossai.sentiment import get_traditional_sentiments
+from ossai.utils.cache import TTLCache
+from ossai.utils.rate_limit import RateLimiter
+
+# Slack recommends requesting no more than 200 results per page from its paginated methods
+HISTORY_PAGE_SIZE = 200
+USERS_LIST_PAGE_SIZE = 200
+# how many conversations.replies / users.info calls may wait on Slack at once; the pacing is up to rate_limiters
+THREAD_REPLIES_CONCURRENCY = int(os.getenv("SLACK_THREAD_REPLIES_CONCURRENCY", 4))
+NAME_RESOLUTION_CONCURRENCY = int(os.getenv("SLACK_NAME_RESOLUTION_CONCURRENCY", 10))
+# Slack's per-method budgets (tier 2: ~20/minute, tier 3: ~50/minute, tier 4: ~100/minute), shared by every
+# SlackContext in the process; the client's retry handler only has to absorb the occasional 429. By default a
+# whole minute's budget may go out back to back, so concurrent lookups only start queueing once it's spent.
+SLACK_RATE_LIMIT_BURST = int(os.getenv("SLACK_RATE_LIMIT_BURST", 0))
+rate_limiters = {
+    method: RateLimiter(per_minute, burst=SLACK_RATE_LIMIT_BURST or per_minute)
+    for method, per_minute in {
+        "conversations_history": 50,
+        "conversations_replies": 50,
+        "users_info": 100,
+        "users_list": 20,
+    }.items()
+}
+MENTION_PATTERN = re.compile(r"<@([UB]\w+)>")
+UNKNOWN_AUTHOR = ("Someone", True)  # Default to internal for unknown users
+
+# Shared by every SlackContext in the process so names, the bot ID and the workspace name survive across requests
+directory_cache = TTLCache(
+    maxsize=int(os.getenv("DIRECTORY_CACHE_MAX_SIZE", 10_000)),
+    ttl=float(os.getenv("DIRECTORY_CACHE_TTL_SECONDS", 3600)),
+)
+BOT_ID_CACHE_KEY = ("auth_test", "bot_id")
+WORKSPACE_NAME_CACHE_KEY = ("team_info", "name")
+
+
+def _get_name_and_is_internal(user: dict) -> tuple[str, bool]:
+    name = user.get("real_name", user["profile"]["real_name"])
+    is_internal = not user.get("is_restricted", True)  # if is_restricted is not present, infers is_restricted=True
+    return name, is_internal
+
+
+class SyncWebClientAdapter:
+    """
+    Gives a synchronous WebClient the AsyncWebClient interface (handy for tests and scripts): each API method
+    returns a coroutine that makes the blocking call in a worker thread.
+    """
 
-class SlackContext:
     def __init__(self, client: WebClient):
         self.client = client
-        self._id_name_cache = {}
-        self._bot_id = None
-        self._workspace_name = None
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+
+        return call
+
+
+class SlackContext:
+    def __init__(self, client: Union[AsyncWebClient, WebClient, SyncWebClientAdapter]):
+        """
+        `client` should be an AsyncWebClient so Slack round trips don't block the event loop. A synchronous
+        WebClient is wrapped in a `SyncWebClientAdapter`, so handlers can await its calls all the same.
+        """
+        if isinstance(client, WebClient):
+            client = SyncWebClientAdapter(client)
+        self.client = client
+        self._id_name_cache = directory_cache
+        self._bot_id = directory_cache.get(BOT_ID_CACHE_KEY)
+        self._workspace_name = directory_cache.get(WORKSPACE_NAME_CACHE_KEY)
+
+    async def _call(self, method: str, **kwargs):
+        rate_limiter = rate_limiters.get(method)
+        if rate_limiter:
+            await rate_limiter.acquire()
+        response = getattr(self.client, method)(**kwargs)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
 
     async def get_bot_id(self) -> str:
          # todo: refactor this to be an attribute getter i.e. slack_context.bot_id
         if self._bot_id is None:
             try:
-                response = self.client.auth_test()
+                response = await self._call("auth_test")
                 self._bot_id = response["bot_id"]
+                directory_cache[BOT_ID_CACHE_KEY] = self._bot_id
             except SlackApiError as e:
                 logger.error(f"Error fetching bot ID: {e.response['error']}")
                 self._bot_id = "None"
         return self._bot_id
 
+    async def _fetch_history_page(
+        self, channel_id: str, oldest: float, limit: int, cursor: str = None
+    ) -> dict:
+        return await self._call(
+            "conversations_history",
+            channel=channel_id,
+            limit=limit,
+            oldest=oldest,
+            cursor=cursor,
+        )
+
+    async def iter_channel_history(
+        self,
+        channel_id: str,
+        since: date = None,
+        since_ts: str = None,
+        page_size: int = HISTORY_PAGE_SIZE,
+    ) -> AsyncIterator[list]:
+        """
+        Yield the channel's history one page at a time (newest first), following Slack's cursor pagination.
+
+        The next page is requested before the current one is yielded, so callers can parse page N while
+        page N+1 is in flight. At most two pages are held in memory at a time.
+        """
+        oldest_timestamp = since_ts if since_ts else (mktime(since.timetuple()) if since else 0)
+        next_page = asyncio.ensure_future(
+            self._fetch_history_page(channel_id, oldest_timestamp, page_size)
+        )
+        try:
+            bot_id = await self.get_bot_id()
+            while next_page is not None:
+                response = await next_page
+                cursor = (response.get("response_metadata") or {}).get("next_cursor")
+                next_page = (
+                    asyncio.ensure_future(
+                        self._fetch_history_page(
+                            channel_id, oldest_timestamp, page_size, cursor=cursor
+                        )
+                    )
+                    if cursor
+                    else None
+                )
+                yield [msg for msg in response["messages"] if msg.get("bot_id") != bot_id]
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
     async def get_channel_history(
         self,
         channel_id: str,
         since: date = None,
         since_ts: str = None,
         include_threads: bool = False,
+        limit: int = None,
     ) -> list:
-        oldest_timestamp = since_ts if since_ts else (mktime(since.timetuple()) if since else 0)
-        response = self.client.conversations_history(
-            channel=channel_id, limit=1000, oldest=oldest_timestamp
-        )
-        bot_id = await self.get_bot_id()
-        return [msg for msg in response["messages"] if msg.get("bot_id") != bot_id]
+        """
+        Return the channel's full history (newest first), optionally capped at `limit` messages.
+        """
+        history = []
+        async with aclosing(
+            self.iter_channel_history(channel_id, since=since, since_ts=since_ts)
+        ) as pages:
+            async for page in pages:
+                history.extend(page)
+                if limit is not None and len(history) >= limit:
+                    return history[:limit]
+        return history
 
     async def get_direct_message_channel_id(self, user_id: str) -> str:
         try:
-            response = self.client.conversations_open(users=user_id)
+            response = await self._call("conversations_open", users=user_id)
             return response["channel"]["id"]
         except SlackApiError as e:
             logger.error(f"Error fetching bot DM channel ID: {e.response['error']}")
             raise e
 
-    def get_is_private_and_channel_name(self, channel_id: str) -> tuple[bool, str]:
+    async def get_is_private_and_channel_name(self, channel_id: str) -> tuple[bool, str]:
         try:
-            channel_info = self.client.conversations_info(channel=channel_id)
+            channel_info = await self._call("conversations_info", channel=channel_id)
             channel_name = channel_info["channel"]["name"]
             is_private = channel_info["channel"]["is_private"]
         except Exception as e:
@@ -63,20 +196,18 @@ class SlackContext:
             is_private = True
         return is_private, channel_name
 
-    def get_name_from_id(self, user_or_bot_id: str, is_bot=False) -> tuple[str, bool]:
+    async def get_name_from_id(self, user_or_bot_id: str, is_bot=False) -> tuple[str, bool]:
         """
         Returns a tuple of (name, is_internal)
         """
-        if user_or_bot_id in self._id_name_cache:
-            return self._id_name_cache[user_or_bot_id]
+        cached = self._id_name_cache.get(user_or_bot_id)
+        if cached is not None:
+            return cached
 
         try:
-            user_response = self.client.users_info(user=user_or_bot_id)
+            user_response = await self._call("users_info", user=user_or_bot_id)
             if user_response.get("ok"):
-                name = user_response["user"].get(
-                    "real_name", user_response["user"]["profile"]["real_name"]
-                )
-                is_internal = not user_response["user"].get("is_restricted", True)  # if is_restricted is not present, infers is_restricted=True
+                name, is_internal = _get_name_and_is_internal(user_response["user"])
                 self._id_name_cache[user_or_bot_id] = (name, is_internal)
                 return name, is_internal
             else:
@@ -85,7 +216,7 @@ class SlackContext:
         except SlackApiError as e:
             if e.response["error"] == "user_not_found":
                 try:
-                    bot_response = self.client.bots_info(bot=user_or_bot_id)
+                    bot_response = await self._call("bots_info", bot=user_or_bot_id)
                     if bot_response.get("ok"):
                         name = bot_response["bot"]["name"]
                         is_internal = True  # Bots are considered internal
@@ -100,26 +231,84 @@ class SlackContext:
                     )
             logger.error(f"Error fetching name for {user_or_bot_id=} {is_bot=} {e=}")
 
-        return "Someone", True  # Default to internal for unknown users
+        return UNKNOWN_AUTHOR
 
-    def get_parsed_messages(self, messages, with_names=True, with_internal_external=False):
-        
-        def parse_message(msg):
-            user_id = msg.get("user")
-            if user_id is None:
-                bot_id = msg.get("bot_id")
-                name, is_internal = self.get_name_from_id(bot_id, is_bot=True)
-            else:
-                name, is_internal = self.get_name_from_id(user_id)
+    async def warm_directory_cache(self, page_size: int = USERS_LIST_PAGE_SIZE) -> int:
+        """
+        Page through users.list once and cache every member's (and bot user's) name and internal status, so
+        message parsing can resolve authors and mentions without a users.info call per person.
 
-            parsed_message = re.sub(
-                r"<@[UB]\w+>",
-                lambda m: self.get_name_from_id(m.group(0)[2:-1])[0],
-                msg["text"],
-            )
+        Returns the number of IDs cached.
+        """
+        cached = 0
+        cursor = None
+        while True:
+            response = await self._call("users_list", limit=page_size, cursor=cursor)
+            for member in response["members"]:
+                name, is_internal = _get_name_and_is_internal(member)
+                self._id_name_cache[member["id"]] = (name, is_internal)
+                cached += 1
+                bot_id = member.get("profile", {}).get("bot_id")
+                if member.get("is_bot") and bot_id:
+                    self._id_name_cache[bot_id] = (name, True)  # Bots are considered internal
+                    cached += 1
+            cursor = (response.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                break
+        logger.info(f"Warmed the directory cache with {cached} users and bots")
+        return cached
+
+    async def resolve_names(
+        self, user_or_bot_ids, max_concurrency: int = NAME_RESOLUTION_CONCURRENCY
+    ) -> dict[str, tuple[str, bool]]:
+        """
+        Resolve many user/bot IDs in one go: cached IDs come straight from memory and the rest are fetched
+        concurrently (at most `max_concurrency` lookups in flight).
+
+        Returns a dict of ID -> (name, is_internal).
+        """
+        unique_ids = list(dict.fromkeys(i for i in user_or_bot_ids if i))
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def resolve(user_or_bot_id):
+            cached = self._id_name_cache.get(user_or_bot_id)
+            if cached is not None:
+                return cached
+            async with semaphore:
+                return await self.get_name_from_id(user_or_bot_id)
+
+        names = await asyncio.gather(*(resolve(i) for i in unique_ids))
+        return dict(zip(unique_ids, names))
 
-            if not with_names:
-                return re.sub(r"<@[UB]\w+>", lambda m: "", msg["text"])
+    @staticmethod
+    def _get_referenced_ids(messages, with_mentions=True) -> list[str]:
+        ids = []
+        for msg in messages:
+            ids.append(msg.get("user") or msg.get("bot_id"))
+            if with_mentions:
+                ids.extend(MENTION_PATTERN.findall(msg.get("text", "")))
+        return ids
+
+    @staticmethod
+    def _get_author(msg, names: dict) -> tuple[str, bool]:
+        return names.get(msg.get("user") or msg.get("bot_id"), UNKNOWN_AUTHOR)
+
+    @staticmethod
+    def _replace_mentions(text: str, names: dict) -> str:
+        return MENTION_PATTERN.sub(
+            lambda m: names.get(m.group(1), UNKNOWN_AUTHOR)[0], text
+        )
+
+    async def get_parsed_messages(self, messages, with_names=True, with_internal_external=False):
+        if not with_names:
+            return [MENTION_PATTERN.sub("", msg["text"]) for msg in messages]
+
+        # resolve every author & mention up front so the parsing pass below is pure CPU
+        names = await self.resolve_names(self._get_referenced_ids(messages))
+
+        def parse_message(msg):
+            name, is_internal = self._get_author(msg, names)
+            parsed_message = self._replace_mentions(msg["text"], names)
 
             prefix = name
             if with_internal_external:
@@ -130,44 +319,100 @@ class SlackContext:
 
         return [parse_message(message) for message in messages]
     
-    def get_rich_parsed_messages(self, messages, channel_id=None, include_threads=False) -> List[dict]:
-        def parse_message(msg, is_reply=False):
-            if include_threads and not channel_id:
-                raise ValueError("channel_id is required if include_threads is True")
-            
-            # If include_threads and this message starts a thread, fetch and parse replies
+    async def get_thread_messages(self, channel_id: str, thread_ts: str) -> dict:
+        """Fetch the first page of a thread, the parent message first, as Slack's conversations.replies response."""
+        return await self._call("conversations_replies", channel=channel_id, ts=thread_ts)
+
+    async def get_thread_replies(self, channel_id: str, thread_ts: str) -> List[dict]:
+        """
+        Return every reply in a thread (excluding the parent), following Slack's cursor pagination.
+
+        Raises SlackApiError if the replies couldn't be fetched, e.g. when still rate limited after the client's
+        retries.
+        """
+        replies = []
+        cursor = None
+        while True:
+            logger.debug(f"Fetching thread replies for ts={thread_ts} {cursor=}")
+            response = await self._call(
+                "conversations_replies",
+                channel=channel_id,
+                ts=thread_ts,
+                limit=HISTORY_PAGE_SIZE,
+                cursor=cursor,
+            )
+            if not response.get("ok"):
+                logger.error(f"Failed to fetch thread replies: {response}")
+                raise SlackApiError("thread replies fetch failed", response)
+            # Slack repeats the parent message at the top of every page
+            replies.extend(msg for msg in response["messages"] if msg.get("ts") != thread_ts)
+            cursor = (response.get("response_metadata") or {}).get("next_cursor")
+            if not cursor:
+                return replies
+
+    async def get_rich_parsed_messages(
+        self,
+        messages,
+        channel_id=None,
+        include_threads=False,
+        max_concurrency: int = THREAD_REPLIES_CONCURRENCY,
+    ) -> List[dict]:
+        """
+        Parse messages into dicts enriched with author, internal/external status, and sentiment.
+
+        With include_threads, the replies of every threaded message are fetched concurrently (at most
+        `max_concurrency` threads in flight, paced to Slack's tier 3 rate limit) and attached as
+        `reply_messages`. A message whose replies couldn't be fetched is marked `replies_incomplete` instead.
+        """
+        if include_threads and not channel_id:
+            raise ValueError("channel_id is required if include_threads is True")
+
+        replies_by_thread_ts = {}
+        failed_thread_tss = set()
+        if include_threads:
             # TODO: port this to other channel analysis features & functions
-            if include_threads and msg.get("thread_ts") and not is_reply:
-                try:
-                    logger.debug(f"Fetching thread replies for ts={msg['thread_ts']}")
-                    response = self.client.conversations_replies(channel=channel_id, ts=msg["thread_ts"])
-                    if response.get("ok"):
-                        thread_messages = response["messages"][1:]  # skip the parent message
-                        msg["reply_messages"] = [parse_message(thread_msg, is_reply=True) for thread_msg in thread_messages]
-                    else:
-                        logger.error(f"Failed to fetch thread replies: {response}")
-                except SlackApiError as e:
-                    logger.error(f"Error fetching thread replies for ts={msg['thread_ts']}: {e.response['error']}")
-
-            user_id = msg.get("user")
-            if user_id is None:
-                bot_id = msg.get("bot_id")
-                name, is_internal = self.get_name_from_id(bot_id, is_bot=True)
-            else:
-                name, is_internal = self.get_name_from_id(user_id)
+            thread_tss = list(dict.fromkeys(msg["thread_ts"] for msg in messages if msg.get("thread_ts")))
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def fetch_replies(thread_ts):
+                async with semaphore:
+                    try:
+                        return await self.get_thread_replies(channel_id, thread_ts)
+                    except SlackApiError as e:
+                        logger.error(f"Error fetching thread replies for ts={thread_ts}: {e.response['error']}")
+                        return None
+
+            results = await asyncio.gather(*(fetch_replies(ts) for ts in thread_tss))
+            replies_by_thread_ts = {
+                ts: replies for ts, replies in zip(thread_tss, results) if replies is not None
+            }
+            failed_thread_tss = {ts for ts, replies in zip(thread_tss, results) if replies is None}
+
+        all_replies = [reply for replies in replies_by_thread_ts.values() for reply in replies]
+        names = await self.resolve_names(self._get_referenced_ids(messages + all_replies))
+        # score every message and reply in one batch, off the event loop
+        sentiments = await asyncio.to_thread(
+            get_traditional_sentiments, [msg["text"] for msg in messages + all_replies]
+        )
+        sentiment_by_msg = {id(msg): scores for msg, scores in zip(messages + all_replies, sentiments)}
+
+        def parse_message(msg, is_reply=False):
+            name, is_internal = self._get_author(msg, names)
 
             rich_msg = msg.copy()
+            if not is_reply and msg.get("thread_ts") in replies_by_thread_ts:
+                rich_msg["reply_messages"] = [
+                    parse_message(reply, is_reply=True)
+                    for reply in replies_by_thread_ts[msg["thread_ts"]]
+                ]
+            elif not is_reply and msg.get("thread_ts") in failed_thread_tss:
+                rich_msg["replies_incomplete"] = True
             rich_msg["author"] = name
             rich_msg["is_internal"] = is_internal
             rich_msg["timestamp"] = msg["ts"].split(".")[0]
-            rich_msg["text"] = re.sub(
-                r"<@[UB]\w+>",
-                lambda m: self.get_name_from_id(m.group(0)[2:-1])[0],
-                msg["text"],
-            )  # replace mentions with names
+            rich_msg["text"] = self._replace_mentions(msg["text"], names)  # replace mentions with names
 
-            # TODO: calculate trad_sentiment from sentiment.py (which uses nltk vader) and add to rich_msg
-            rich_msg["trad_sentiment"] = get_traditional_sentiment(msg["text"])
+            rich_msg["trad_sentiment"] = sentiment_by_msg[id(msg)]
 
             return rich_msg
         
@@ -176,7 +421,7 @@ class SlackContext:
 
     async def get_user_context(self, user_id: str) -> dict:
         try:
-            user_info = self.client.users_info(user=user_id)
+            user_info = await self._call("users_info", user=user_id)
             logger.debug(user_info)
             if user_info["ok"]:
                 name = user_info["user"]["name"]
@@ -186,13 +431,14 @@ class SlackContext:
             logger.error(f"Failed to fetch username: {e}")
             return {}
 
-    def get_workspace_name(self):
+    async def get_workspace_name(self):
         # todo: refactor this to be an attribute getter i.e. slack_context.workspace_name
         if self._workspace_name is None:
             try:
-                response = self.client.team_info()
+                response = await self._call("team_info")
                 if response["ok"]:
                     self._workspace_name = response["team"]["name"]
+                    directory_cache[WORKSPACE_NAME_CACHE_KEY] = self._workspace_name
                 else:
                     logger.warning(
                         f"Error retrieving workspace name: {response['error']}. Falling back to WORKSPACE_NAME_FALLBACK."
@@ -1,15 +1,26 @@
 import os
 import asyncio
+import hmac
+import time
 from contextlib import asynccontextmanager
 
+_import_started_at = time.perf_counter()
+
+from aiohttp import ClientSession, TCPConnector
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from slack_bolt.adapter.socket_mode.aiohttp import AsyncSocketModeHandler
 from slack_bolt.async_app import AsyncApp
-from slack_sdk import WebClient
-from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
-from ossai.slack_context import SlackContext
+from slack_sdk.http_retry.builtin_async_handlers import AsyncRateLimitErrorRetryHandler
+from slack_sdk.web.async_client import AsyncWebClient
+from ossai.logging_config import logger
+from ossai.slack_context import (
+    SlackContext,
+    directory_cache,
+    WORKSPACE_NAME_CACHE_KEY,
+)
+from ossai.utils.llm_cache import llm_cache
 
 load_dotenv(override=True)
 
@@ -23,26 +34,84 @@ from ossai.handlers import (
     handler_action_summarize_since_date,
     handler_sandbox_slash_command,
 )
+from ossai import sentiment, topic_analysis
+from ossai.archive import recover_archives
+from ossai.archive_scheduler import ARCHIVE_CHANNELS, ArchiveScheduler
 
 app = FastAPI()
 async_app = AsyncApp(token=os.environ["SLACK_BOT_TOKEN"])
-client = WebClient(token=os.environ["SLACK_BOT_TOKEN"])
-client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=3))
+client = AsyncWebClient(token=os.environ["SLACK_BOT_TOKEN"])
+client.retry_handlers.append(AsyncRateLimitErrorRetryHandler(max_retry_count=3))
+SLACK_HTTP_POOL_SIZE = int(os.getenv("SLACK_HTTP_POOL_SIZE", 20))
+DIRECTORY_PREFETCH = os.getenv("DIRECTORY_PREFETCH", "false").lower() in ("1", "true", "yes")
+DIRECTORY_REFRESH_SECONDS = float(os.getenv("DIRECTORY_REFRESH_SECONDS", 1800))
+TOPIC_WARM_UP = os.getenv("TOPIC_WARM_UP", "true").lower() in ("1", "true", "yes")
+# /stats reveals timings and cache sizes: it needs `Authorization: Bearer <STATS_TOKEN>`, or without one, localhost
+STATS_TOKEN = os.getenv("STATS_TOKEN", "")
+LOCALHOSTS = ("127.0.0.1", "::1")
 socket_handler = None
+archive_scheduler = None
+# the event loop only keeps weak references to tasks, so hold on to the ones started at startup
+background_tasks: set = set()
+startup_timings = {"import_seconds": time.perf_counter() - _import_started_at}
+logger.info(f"Imported ossai.slack_server in {startup_timings['import_seconds']:.2f}s")
 
 
 async def create_socket_handler():
     return AsyncSocketModeHandler(async_app, os.environ["SLACK_APP_TOKEN"])
 
 
+async def warm_up_topic_analysis():
+    """Start the topic analysis workers, which load spaCy, NLTK and friends, so the first /tldr doesn't pay for it."""
+    try:
+        startup_timings["topic_warm_up_seconds"] = await asyncio.to_thread(topic_analysis.warm_up)
+    except Exception as e:
+        logger.error(f"Failed to warm up topic analysis, it will load on the first /tldr instead: {e}")
+
+
+async def refresh_directory_cache_periodically():
+    """Keep every workspace member's name warm in the directory cache so parsing rarely needs users.info."""
+    while True:
+        try:
+            await SlackContext(client).warm_directory_cache()
+        except Exception as e:
+            logger.error(f"Failed to warm the directory cache: {e}")
+        await asyncio.sleep(DIRECTORY_REFRESH_SECONDS)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global socket_handler
+    global socket_handler, archive_scheduler
+    # share one aiohttp connection pool across every Slack Web API call instead of a session per request
+    client.session = ClientSession(connector=TCPConnector(limit=SLACK_HTTP_POOL_SIZE))
     socket_handler = await create_socket_handler()
     try:
+        # finish or roll back archive writes a crash interrupted, before anything can append to them again
+        recovered = await asyncio.to_thread(recover_archives)
+        if recovered:
+            logger.warning(f"Recovered {len(recovered)} archives after an unclean shutdown: {', '.join(recovered)}")
         await socket_handler.connect_async()
+        startup_timings["ready_seconds"] = time.perf_counter() - _import_started_at
+        logger.info(f"Slack socket connected, ready {startup_timings['ready_seconds']:.2f}s after import")
+        if TOPIC_WARM_UP:
+            background_tasks.add(asyncio.create_task(warm_up_topic_analysis()))
+        if DIRECTORY_PREFETCH:
+            background_tasks.add(asyncio.create_task(refresh_directory_cache_periodically()))
+        if ARCHIVE_CHANNELS:
+            archive_scheduler = ArchiveScheduler(SlackContext(client), ARCHIVE_CHANNELS)
+            archive_scheduler.start()
         yield
     finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        background_tasks.clear()
+        if archive_scheduler:
+            await archive_scheduler.stop()
+        await client.session.close()
+        client.session = None
+        topic_analysis.shutdown_pool()
+        sentiment.shutdown_pool()
         if socket_handler:
             await socket_handler.disconnect_async()
             if hasattr(socket_handler, "client") and hasattr(
@@ -66,6 +135,25 @@ def pulse():
     return {"status": 200, "message": "ok"}
 
 
+def _is_stats_request_authorized(request: Request) -> bool:
+    if STATS_TOKEN:
+        authorization = request.headers.get("authorization", "")
+        return hmac.compare_digest(authorization.encode(), f"Bearer {STATS_TOKEN}".encode())
+    return request.client is not None and request.client.host in LOCALHOSTS
+
+
+@app.get("/stats")
+def stats(request: Request):
+    if not _is_stats_request_authorized(request):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return {
+        "startup": startup_timings,
+        "directory_cache": directory_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "archive_scheduler": archive_scheduler.stats() if archive_scheduler else None,
+    }
+
+
 @app.post("/slack/events")
 async def slack_events(request: Request):
     event = await request.json()
@@ -143,6 +231,23 @@ async def handle_feedback(ack, body, logger):
     return logger.info(body)
 
 
+# MARK: - EVENTS
+
+
+@async_app.event("user_change")
+async def handle_user_change(event):
+    # keep the process-wide directory cache from serving stale names or internal/external status
+    user = event["user"]
+    directory_cache.invalidate(user["id"])
+    if user.get("profile", {}).get("bot_id"):
+        directory_cache.invalidate(user["profile"]["bot_id"])
+
+
+@async_app.event("team_rename")
+async def handle_team_rename(event):
+    directory_cache.invalidate(WORKSPACE_NAME_CACHE_KEY)
+
+
 # MARK: - SHORTCUTS
 
 
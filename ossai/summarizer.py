@@ -1,61 +1,42 @@
+import asyncio
 import os
 from uuid import UUID
-import re
-import openai
-from typing import Optional, List, Dict, Any
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
 
 from ossai.logging_config import logger
 from ossai.utils import (
     get_langsmith_config,
     get_llm_config,
+    get_token_counter,
 )
+from ossai.utils.llm import get_chain, get_chat_model
+from ossai.utils.llm_cache import llm_cache
+from ossai.utils.tokens import HeuristicTokenCounter
 from ossai.slack_context import SlackContext
 load_dotenv(override=True)
 
+# called with the text generated so far while a summary streams in
+OnUpdate = Callable[[str], Awaitable[Any]]
+
 
 class Summarizer:
     def __init__(self, slack_context: SlackContext, custom_prompt: Optional[str] = None):
         # todo: apply pydantic model
         self.slack_context = slack_context
         self.config = get_llm_config()
-        self.model = ChatOpenAI(
-            model=self.config["chat_model"], temperature=self.config["temperature"]
+        self.model = get_chat_model(self.config["chat_model"], self.config["temperature"])
+        self.token_counter = get_token_counter(
+            self.config["token_counter"],
+            self.config["chat_model"],
+            self.config["token_count_memo_size"],
         )
-        self.parser = StrOutputParser()
         self.custom_prompt = custom_prompt
 
-    def summarize(
-        self,
-        text: str,
-        feature_name: str,
-        user: str,
-        channel: str,
-        is_private: bool = False,
-    ) -> tuple[str, UUID]:
-        """
-        Summarize a chat log in bullet points, in the specified language.
-
-        Args:
-            text (str): The chat log to summarize, in the format "Speaker: Message" separated by line breaks.
-            feature_name (str): The name of the feature being used.
-            user (str): The user requesting the summary.
-            channel (str): The channel where the summary is requested.
-            is_private (bool, optional): Whether the chat log is private. Defaults to False.
-
-        Returns:
-            tuple[str, UUID]: The summarized chat log in bullet point format and the run ID.
-
-        Examples:
-            # >>> summarizer = Summarizer(slack_context)
-            # >>> summarizer.summarize("Alice: Hi\nBob: Hello\nAlice: How are you?\nBob: I'm doing well, thanks.", "test", "user1", "general")
-            '- Alice greeted Bob.\n- Bob responded with a greeting.\n- Alice asked how Bob was doing.
-            \n- Bob replied that he was doing well.', UUID('...')
-        """
+    @staticmethod
+    def _get_summary_prompts() -> tuple[str, str]:
         system_msg = """\
         You're a highly capable summarization expert who provides succinct summaries of Slack chat logs.
         The chat log format consists of one line per message in the format "Speaker: Message".
@@ -78,12 +59,64 @@ class Summarizer:
         """
 
         # todo: guard against prompt injection
+        return system_msg, base_human_msg
 
-        prompt_template = ChatPromptTemplate.from_messages(
-            [("system", system_msg), ("user", base_human_msg)]
+    def _get_summary_chain(
+        self,
+        feature_name: str,
+        user: str,
+        channel: str,
+        is_private: bool = False,
+    ):
+        return self._get_chain(
+            *self._get_summary_prompts(), feature_name, user, channel, is_private
         )
 
-        chain = prompt_template | self.model | self.parser
+    @staticmethod
+    def _get_merge_prompts() -> tuple[str, str]:
+        system_msg = """\
+        You're a highly capable summarization expert who combines partial summaries of a Slack chat log into one.
+        Each partial summary covers a consecutive portion of the same chat log, in chronological order.
+        Merge overlapping points, drop repetition, and keep the most important details.
+        The user understands {language} only.
+        So, The assistant needs to speak in {language}.
+        """
+
+        merge_human_msg = """\
+        Please combine the following partial summaries into a single flat markdown formatted bullet list.
+        Do not summarize each partial summary separately. Instead, summarize the overall conversation.
+        Keep the combined summary no longer than the longest partial summary.
+        Write in conversational English.
+        {custom_instructions}
+
+        {text}
+        """
+
+        return system_msg, merge_human_msg
+
+    def _get_merge_chain(
+        self,
+        feature_name: str,
+        user: str,
+        channel: str,
+        is_private: bool = False,
+    ):
+        return self._get_chain(
+            *self._get_merge_prompts(), feature_name, user, channel, is_private
+        )
+
+    def _get_chain(
+        self,
+        system_msg: str,
+        human_msg: str,
+        feature_name: str,
+        user: str,
+        channel: str,
+        is_private: bool = False,
+    ):
+        chain = get_chain(
+            system_msg, human_msg, self.config["chat_model"], self.config["temperature"]
+        )
 
         # Attach the context to the chain invocation
         langsmith_config = get_langsmith_config(
@@ -93,25 +126,220 @@ class Summarizer:
             is_private=is_private,
         )
         logger.info(f"{langsmith_config=}")
-        result = chain.invoke(
-            {
-                "text": text,
-                "language": self.config["language"],
-                "custom_instructions": (
-                    f"\n\nAdditionally, please follow these specific instructions for this summary:\n{self.custom_prompt}"
-                    if self.custom_prompt
-                    else ""
-                ),
-            },
-            config=langsmith_config,
+        return chain, langsmith_config
+
+    def _get_chain_inputs(self, text: str) -> dict:
+        return {
+            "text": text,
+            "language": self.config["language"],
+            "custom_instructions": (
+                f"\n\nAdditionally, please follow these specific instructions for this summary:\n{self.custom_prompt}"
+                if self.custom_prompt
+                else ""
+            ),
+        }
+
+    def _get_cache_key(self, kind: str, text: str) -> str:
+        # the prompt templates are part of the key, so editing a prompt doesn't serve answers to the old one
+        prompts = self._get_summary_prompts() if kind == "summary" else self._get_merge_prompts()
+        return llm_cache.make_key(
+            kind=kind,
+            prompts=prompts,
+            model=self.config["chat_model"],
+            temperature=self.config["temperature"],
+            language=self.config["language"],
+            custom_prompt=self.custom_prompt,
+            text=text,
         )
+
+    def summarize(
+        self,
+        text: str,
+        feature_name: str,
+        user: str,
+        channel: str,
+        is_private: bool = False,
+    ) -> tuple[str, UUID]:
+        """
+        Summarize a chat log in bullet points, in the specified language.
+
+        Identical requests (same model, temperature, language, custom prompt and text) are answered from
+        `llm_cache` without calling the model.
+
+        Args:
+            text (str): The chat log to summarize, in the format "Speaker: Message" separated by line breaks.
+            feature_name (str): The name of the feature being used.
+            user (str): The user requesting the summary.
+            channel (str): The channel where the summary is requested.
+            is_private (bool, optional): Whether the chat log is private. Defaults to False.
+
+        Returns:
+            tuple[str, UUID]: The summarized chat log in bullet point format and the run ID.
+
+        Examples:
+            # >>> summarizer = Summarizer(slack_context)
+            # >>> summarizer.summarize("Alice: Hi\nBob: Hello\nAlice: How are you?\nBob: I'm doing well, thanks.", "test", "user1", "general")
+            '- Alice greeted Bob.\n- Bob responded with a greeting.\n- Alice asked how Bob was doing.
+            \n- Bob replied that he was doing well.', UUID('...')
+        """
+        cache_key = self._get_cache_key("summary", text)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Serving {feature_name} summary from the LLM cache")
+            return cached
+
+        chain, langsmith_config = self._get_summary_chain(
+            feature_name, user, channel, is_private
+        )
+        result = chain.invoke(self._get_chain_inputs(text), config=langsmith_config)
+        llm_cache.set(cache_key, result, langsmith_config["run_id"], persist=not is_private)
+        return result, langsmith_config["run_id"]
+
+    async def asummarize(
+        self,
+        text: str,
+        feature_name: str,
+        user: str,
+        channel: str,
+        is_private: bool = False,
+        on_update: Optional[OnUpdate] = None,
+    ) -> tuple[str, UUID]:
+        """
+        Async version of `summarize` that awaits the LLM call instead of blocking the event loop.
+
+        If `on_update` is given, the summary is streamed and `on_update` is awaited with the text so far as
+        each token arrives.
+        """
+        cache_key = self._get_cache_key("summary", text)
+        cached = await llm_cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"Serving {feature_name} summary from the LLM cache")
+            if on_update is not None:
+                await on_update(cached[0])
+            return cached
+
+        chain, langsmith_config = self._get_summary_chain(
+            feature_name, user, channel, is_private
+        )
+        result = await self._ainvoke(
+            chain, self._get_chain_inputs(text), langsmith_config, on_update
+        )
+        await llm_cache.aset(cache_key, result, langsmith_config["run_id"], persist=not is_private)
+        return result, langsmith_config["run_id"]
+
+    async def amerge_summaries(
+        self,
+        summaries: list[str],
+        feature_name: str,
+        user: str,
+        channel: str,
+        is_private: bool = False,
+        on_update: Optional[OnUpdate] = None,
+    ) -> tuple[str, UUID]:
+        """
+        Merge several partial summaries (in chronological order) into a single summary, streaming it to
+        `on_update` if given (see `asummarize`).
+        """
+        text = "\n\n".join(
+            f"Partial summary {i}:\n{summary}" for i, summary in enumerate(summaries, 1)
+        )
+        cache_key = self._get_cache_key("merge", text)
+        cached = await llm_cache.aget(cache_key)
+        if cached is not None:
+            if on_update is not None:
+                await on_update(cached[0])
+            return cached
+
+        chain, langsmith_config = self._get_merge_chain(
+            feature_name, user, channel, is_private
+        )
+        result = await self._ainvoke(
+            chain, self._get_chain_inputs(text), langsmith_config, on_update
+        )
+        await llm_cache.aset(cache_key, result, langsmith_config["run_id"], persist=not is_private)
         return result, langsmith_config["run_id"]
 
+    async def reduce_summaries(
+        self,
+        summaries: list[str],
+        feature_name: str,
+        user: str,
+        channel: str,
+        is_private: bool = False,
+        on_update: Optional[OnUpdate] = None,
+    ) -> tuple[str, Optional[UUID]]:
+        """
+        Merge chunk summaries in a tree until a single summary remains.
+
+        Each level merges groups of up to `reduce_fan_in` neighbouring summaries concurrently, so the number
+        of levels grows logarithmically with the number of chunks. Once a level fits in one context window
+        (`max_body_tokens`) or `reduce_max_depth` is reached, everything left is merged in one final call,
+        which is streamed to `on_update` if given.
+
+        Returns:
+            tuple[str, Optional[UUID]]: The merged summary and the run ID of the final merge.
+        """
+        kwargs = dict(feature_name=feature_name, user=user, channel=channel, is_private=is_private)
+        fan_in = max(2, self.config["reduce_fan_in"])
+        max_depth = max(1, self.config["reduce_max_depth"])  # at least the final merge, or summaries are dropped
+        level = [(summary, None) for summary in summaries]
+
+        for depth in range(1, max_depth + 1):
+            if len(level) <= 1:
+                break
+            texts = [text for text, _ in level]
+            token_count = sum(self.token_counter.count(text) for text in texts)
+            if len(texts) <= fan_in or token_count <= self.config["max_body_tokens"] or depth == max_depth:
+                return await self.amerge_summaries(texts, **kwargs, on_update=on_update)
+
+            groups = [texts[i : i + fan_in] for i in range(0, len(texts), fan_in)]
+            logger.info(f"Reducing {len(texts)} summaries into {len(groups)} at depth {depth}")
+            level = await self._run_concurrently(
+                [
+                    partial(self.amerge_summaries, group, **kwargs)
+                    if len(group) > 1
+                    else partial(_passthrough_summary, group[0])
+                    for group in groups
+                ]
+            )
+
+        return level[0] if level else ("", None)
+
+    @staticmethod
+    async def _ainvoke(chain, inputs: dict, config: dict, on_update: Optional[OnUpdate] = None) -> str:
+        if on_update is None:
+            return await chain.ainvoke(inputs, config=config)
+        result = ""
+        async for token in chain.astream(inputs, config=config):
+            result += token
+            await on_update(result)
+        return result
+
+    async def _run_concurrently(self, factories: list) -> list:
+        """
+        Await the coroutines produced by `factories` with at most `max_concurrency` running at once and
+        return their results in the original order. If one fails, the rest are cancelled.
+        """
+        semaphore = asyncio.Semaphore(self.config["max_concurrency"])
+
+        async def run(factory):
+            async with semaphore:
+                return await factory()
+
+        tasks = [asyncio.ensure_future(run(factory)) for factory in factories]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()  # no-op for finished tasks
+
     @staticmethod
     def estimate_openai_chat_token_count(text: str) -> int:
         """
         Estimate the number of OpenAI API tokens that would be consumed by sending the given text to the chat API.
 
+        This is the vocabulary-free heuristic; `self.token_counter` gives exact counts when tiktoken is available.
+
         Args:
             text (str): The text to be sent to the OpenAI chat API.
 
@@ -122,31 +350,9 @@ class Summarizer:
             >>> Summarizer.estimate_openai_chat_token_count("Hello, how are you?")
             7
         """
-        # todo: replace with `tiktoken`
-        # Split the text into words and count the number of characters of each type
-        pattern = re.compile(
-            r"""(
-                \d+       | # digits
-                [a-z]+    | # alphabets
-                \s+       | # whitespace
-                .           # other characters
-                )""",
-            re.VERBOSE | re.IGNORECASE,
-        )
-        matches = re.findall(pattern, text)
-
-        # based on https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
-        def counter(tok):
-            if tok == " " or tok == "\n":
-                return 0
-            elif tok.isdigit() or tok.isalpha():
-                return (len(tok) + 3) // 4
-            else:
-                return 1
+        return HeuristicTokenCounter().count(text)
 
-        return sum(map(counter, matches))
-
-    def split_messages_by_token_count(
+    async def split_messages_by_token_count(
         self, messages: list[dict]
     ) -> list[list[str]]:
         """
@@ -158,11 +364,9 @@ class Summarizer:
         Returns:
             list[list[str]]: A list of sub lists, where each sublist has a token count less than or equal to max_body_tokens
         """
-        parsed_messages = self.slack_context.get_parsed_messages(messages)
+        parsed_messages = await self.slack_context.get_parsed_messages(messages)
 
-        body_token_counts = [
-            self.estimate_openai_chat_token_count(msg) for msg in parsed_messages
-        ]
+        body_token_counts = [self.token_counter.count(msg) for msg in parsed_messages]
         result = []
         current_sublist = []
         current_count = 0
@@ -179,56 +383,182 @@ class Summarizer:
         result.append(current_sublist)
         return result
 
-    def summarize_slack_messages(
+    async def iter_history_splits(self, pages: AsyncIterator[list]) -> AsyncIterator[list[str]]:
+        """
+        Parse history arriving one page at a time, newest first (as `SlackContext.iter_channel_history` yields
+        it), into sub lists of at most max_body_tokens. The newest sub list comes first, each in chronological
+        order, and each is yielded as soon as it's full so it can be summarized while later pages are fetched.
+        """
+        current, current_count = [], 0  # newest first
+        async for page in pages:
+            for message in await self.slack_context.get_parsed_messages(page):
+                count = self.token_counter.count(message)
+                if current and current_count + count > self.config["max_body_tokens"]:
+                    yield current[::-1]
+                    current, current_count = [], 0
+                current.append(message)
+                current_count += count
+        yield current[::-1]
+
+    async def _summarize_splits(
+        self,
+        splits: AsyncIterator[list[str]],
+        kwargs: dict,
+        map_reduce: bool,
+        on_update: Optional[OnUpdate] = None,
+        newest_first: bool = False,
+    ) -> list:
+        """
+        Summarize the splits as they arrive, with at most `max_concurrency` LLM calls at a time, and return the
+        summaries in chronological order (merged into one in map-reduce mode). The first split is held back until
+        the second arrives, so a lone split can still be streamed to `on_update`.
+        """
+        semaphore = asyncio.Semaphore(self.config["max_concurrency"])
+
+        async def run(split, stream):
+            async with semaphore:
+                return await self.asummarize("\n".join(split), **kwargs, on_update=on_update if stream else None)
+
+        tasks = []
+        first = None
+        try:
+            async for split in splits:
+                if first is None and not tasks:
+                    first = split
+                    continue
+                if first is not None:
+                    tasks.append(asyncio.ensure_future(run(first, False)))
+                    first = None
+                tasks.append(asyncio.ensure_future(run(split, False)))
+            if first is not None:
+                tasks.append(asyncio.ensure_future(run(first, True)))
+            logger.info(f"Summarizing {len(tasks)} splits")
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()  # no-op for finished tasks
+
+        if newest_first:
+            results.reverse()
+        if map_reduce and len(results) > 1:
+            results = [
+                await self.reduce_summaries([text for text, _ in results], **kwargs, on_update=on_update)
+            ]
+        return results
+
+    async def summarize_history_pages(
+        self,
+        pages: AsyncIterator[list],
+        channel_id: str,
+        feature_name: str,
+        user: str,
+        map_reduce: Optional[bool] = None,
+        on_update: Optional[OnUpdate] = None,
+        is_private: Optional[bool] = None,
+        channel_name: Optional[str] = None,
+    ) -> tuple[list, Optional[UUID], int]:
+        """
+        Summarize a channel's history as it is fetched, one page at a time (see `iter_channel_history`).
+
+        Like `summarize_slack_messages`, but each page is parsed and split as it arrives and full splits are
+        summarized while later pages are still being fetched, so the raw history is never held in memory all
+        at once. Callers that already know the channel's privacy and name can pass them to skip the lookup.
+
+        Returns:
+            tuple[list, Optional[UUID], int]: The summary text (as a list), the run ID and the number of messages.
+        """
+        if is_private is None or channel_name is None:
+            is_private, channel_name = await self.slack_context.get_is_private_and_channel_name(channel_id)
+        if map_reduce is None:
+            map_reduce = self.config["summary_mode"] == "map_reduce"
+        kwargs = dict(feature_name=feature_name, user=user, channel=channel_name, is_private=is_private)
+        message_count = 0
+
+        async def counted(pages):
+            nonlocal message_count
+            async for page in pages:
+                message_count += len(page)
+                yield page
+
+        import openai  # already loaded along with the chat model; kept off the import path of this module
+
+        try:
+            results = await self._summarize_splits(
+                self.iter_history_splits(counted(pages)), kwargs, map_reduce, on_update, newest_first=True
+            )
+        except openai.RateLimitError as e:
+            logger.error(e)
+            return [f"Sorry, OpenAI rate limit exceeded..."], None, message_count
+        except openai.AuthenticationError as e:
+            logger.error(e)
+            return ["Sorry, unable to authenticate with OpenAI"], None, message_count
+
+        return [text for text, _ in results], results[-1][1], message_count
+
+    async def summarize_slack_messages(
         self,
         messages: list,
         channel_id: str,
         feature_name: str,
         user: str,
+        map_reduce: Optional[bool] = None,
+        on_update: Optional[OnUpdate] = None,
     ) -> tuple[list, UUID]:
         """
         Summarize a list of slack messages.
 
         This method takes a list of slack messages, a context message, and the channel ID, splits the
-        messages into sublists based on token count, and then summarizes each sublist.
+        messages into sublists based on token count, and then summarizes the sublists concurrently (up to
+        `max_concurrency` LLM calls at a time), returning the summaries in the original order.
         The summary is returned as a list, with the context message as the first element.
+        In map-reduce mode the chunk summaries are then merged into a single summary (see `reduce_summaries`).
 
         Args:
             messages (list): A list of slack messages to be summarized.
             channel_id (str): The ID of the Slack channel.
             feature_name (str): The name of the feature being used.
             user (str): The user requesting the summary.
+            map_reduce (bool, optional): Merge the chunk summaries into one. Defaults to the SUMMARY_MODE setting.
+            on_update (callable, optional): Awaited with the text so far while the final summary streams in.
+                Only used when there is a single final summary (one chunk, or map-reduce mode).
 
         Returns:
             tuple[list, UUID]: A list of summary text and the run ID.
         """
         # Determine if the channel is private
-        is_private, channel_name = self.slack_context.get_is_private_and_channel_name(channel_id)
-
-        message_splits = self.split_messages_by_token_count(messages)
-        logger.info(f"{len(message_splits)=}")
-        result_text = []
-
-        for message_split in message_splits:
-            try:
-                text, run_id = self.summarize(
-                    "\n".join(message_split),
-                    feature_name=feature_name,
-                    user=user,
-                    channel=channel_name,
-                    is_private=is_private,
-                )
-            except openai.RateLimitError as e:
-                logger.error(e)
-                return [f"Sorry, OpenAI rate limit exceeded..."], None
-            except openai.AuthenticationError as e:
-                logger.error(e)
-                return ["Sorry, unable to authenticate with OpenAI"], None
-            result_text.append(text)
-
+        is_private, channel_name = await self.slack_context.get_is_private_and_channel_name(channel_id)
+
+        message_splits = await self.split_messages_by_token_count(messages)
+        if map_reduce is None:
+            map_reduce = self.config["summary_mode"] == "map_reduce"
+        kwargs = dict(feature_name=feature_name, user=user, channel=channel_name, is_private=is_private)
+
+        import openai
+
+        try:
+            # summarize the splits concurrently; the results keep the original order
+            results = await self._summarize_splits(_aiter(message_splits), kwargs, map_reduce, on_update)
+        except openai.RateLimitError as e:
+            logger.error(e)
+            return [f"Sorry, OpenAI rate limit exceeded..."], None
+        except openai.AuthenticationError as e:
+            logger.error(e)
+            return ["Sorry, unable to authenticate with OpenAI"], None
+
+        result_text = [text for text, _ in results]
+        run_id = results[-1][1]
         return result_text, run_id
 
 
+async def _passthrough_summary(summary: str) -> tuple[str, None]:
+    return summary, None
+
+
+async def _aiter(items: list) -> AsyncIterator:
+    for item in items:
+        yield item
+
+
 def main():
     logger.error("DEBUGGING")
 
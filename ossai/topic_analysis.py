@@ -1,47 +1,219 @@
+import asyncio
+import multiprocessing
 import os
 import re
 import string
-import nltk
-import spacy
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from uuid import UUID
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from gensim import corpora
-from gensim.models import LdaModel, Phrases
-from nltk.corpus import stopwords
-from sklearn.cluster import KMeans
-from sklearn.decomposition import TruncatedSVD
-from sklearn.feature_extraction.text import TfidfVectorizer
 
 from ossai.utils import get_llm_config, get_langsmith_config
+from ossai.utils.llm import get_chain
+from ossai.utils.llm_cache import llm_cache
+from ossai.topic_corpus import get_ts_from_message_key, lda_model_store, topic_corpus_store
 from ossai.logging_config import logger
 
 load_dotenv(override=True)
-nltk.download("stopwords")
-try:
-    nlp = spacy.load(
-        "en_core_web_md"
-    )  # `poetry add {download link}` from https://spacy.io/models/en#en_core_web_md
-except:
-    logger.warning(
-        "Downloading language model for the spaCy POS tagger (don't worry, this will only happen once)"
-    )
-    from spacy.cli import download
-
-    download("en_core_web_md")
-    nlp = spacy.load("en_core_web_md")
+SPACY_MODEL = "en_core_web_md"  # `poetry add {download link}` from https://spacy.io/models/en#en_core_web_md
+# lemmas only need tok2vec, tagger, attribute_ruler and lemmatizer, so skip loading the rest of the pipeline
+SPACY_EXCLUDE = ["parser", "ner"]
+# identifies how cached lemmas were produced, so changing the model invalidates the per-channel corpus cache
+LEMMATIZE_PIPELINE = f"{SPACY_MODEL}-{'-'.join(SPACY_EXCLUDE)}"
+LEMMATIZE_BATCH_SIZE = int(os.getenv("LEMMATIZE_BATCH_SIZE", 256))
+LEMMATIZE_N_PROCESS = int(os.getenv("LEMMATIZE_N_PROCESS", 1))  # >1 forks workers; worth it for very large channels
+# topic modeling is pure CPU work, so it runs in worker processes to keep the event loop free to ack Slack events.
+# Lemmatizing gets a worker of its own, so only that one process ever loads the spaCy model.
+TOPIC_POOL_WORKERS = int(os.getenv("TOPIC_POOL_WORKERS", 3))  # one per algorithm, so they run in parallel
+TOPIC_MAX_PENDING = int(os.getenv("TOPIC_MAX_PENDING", 4))  # /tldr requests allowed to queue for the pool
+# "exact" fits every model on the full corpus, "scalable" uses mini-batch/randomized/online variants that keep
+# time and memory flat on very large channels, "auto" picks by the number of messages
+TOPIC_BACKEND = os.getenv("TOPIC_BACKEND", "auto").strip().lower()
+TOPIC_SCALABLE_THRESHOLD = int(os.getenv("TOPIC_SCALABLE_THRESHOLD", 5000))
+SVD_N_ITER = 4
+SVD_MAX_ROWS = 20_000  # LSA components are learned from a sample of this many messages
+LDA_CHUNKSIZE = 2000
+# stored per-channel LDA models are updated online on each /tldr and retrained from scratch in the background
+# once they're this old, or have absorbed this many new messages relative to what they were trained on
+LDA_RETRAIN_INTERVAL_SECONDS = float(os.getenv("LDA_RETRAIN_INTERVAL_SECONDS", 7 * 86_400))
+LDA_RETRAIN_UPDATE_RATIO = float(os.getenv("LDA_RETRAIN_UPDATE_RATIO", 0.5))
 config = get_llm_config()
 TEMPERATURE = (
     float(config["temperature"]) + 0.1
 )  # a little more creativity is beneficial here
 DEBUG = bool(os.environ.get("DEBUG", False))
 
+# spaCy, NLTK, gensim and scikit-learn take seconds to import (and the spaCy model and stopwords may need
+# downloading), so they're loaded by the worker processes as they start, on the first /tldr or in `warm_up`
+_nlp = None
+_stop_words = None
+_lock = threading.Lock()
+_pools = {}  # "corpus" (spaCy, one worker) and "models" (the topic algorithms) -> ProcessPoolExecutor
+_pool_lock = threading.Lock()
+_pending = 0
+_lda_retraining = set()  # channels whose LDA model is being retrained
+_lda_write_locks: dict = {}  # channel ID -> asyncio.Lock held while a worker updates or retrains its LDA model
+_background_tasks = set()
+
+
+class TopicAnalysisBusyError(RuntimeError):
+    pass
+
+
+def _get_nlp():
+    """Lazy initialization of the spaCy pipeline, downloading the model on first use if needed"""
+    global _nlp
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:  # Double-check lock
+                import spacy
+
+                start = time.perf_counter()
+                try:
+                    _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+                except OSError:
+                    logger.warning(
+                        "Downloading language model for the spaCy POS tagger (don't worry, this will only happen once)"
+                    )
+                    from spacy.cli import download
+
+                    download(SPACY_MODEL)
+                    _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+                logger.info(f"Loaded spaCy {SPACY_MODEL} in {time.perf_counter() - start:.2f}s")
+    return _nlp
+
+
+def _get_stop_words() -> frozenset:
+    """Lazy initialization of NLTK's English stop words, downloading them on first use if needed"""
+    global _stop_words
+    if _stop_words is None:
+        with _lock:
+            if _stop_words is None:  # Double-check lock
+                from nltk.corpus import stopwords
+
+                try:
+                    words = stopwords.words("english")
+                except LookupError:
+                    import nltk
+
+                    logger.info("NLTK stopwords not found, downloading...")
+                    nltk.download("stopwords", quiet=True)
+                    words = stopwords.words("english")
+                _stop_words = frozenset(words)
+    return _stop_words
+
+
+def _lemmatize(
+    messages: list[str],
+    batch_size: int = LEMMATIZE_BATCH_SIZE,
+    n_process: int = LEMMATIZE_N_PROCESS,
+) -> list[str]:
+    """Lemmatize messages in batches through `nlp.pipe` (e.g. running -> run)."""
+    nlp = _get_nlp()
+    return [
+        " ".join(token.lemma_ for token in doc)
+        for doc in nlp.pipe(messages, batch_size=batch_size, n_process=n_process)
+    ]
 
-async def _kmeans_topics(tfidf_matrix, num_topics, terms):
-    km = KMeans(n_clusters=num_topics)
+
+def _init_corpus_worker() -> None:
+    """Pool initializer: load what `_prepare_corpus` needs, once per worker as it starts."""
+    try:
+        _get_nlp()
+        _get_stop_words()
+        import sklearn.feature_extraction.text
+    except Exception as e:
+        # a failing initializer breaks the whole pool; let the task that needs the resource report the error
+        logger.error(f"Failed to preload the topic analysis corpus worker: {e}")
+
+
+def _init_models_worker() -> None:
+    """Pool initializer: load what the topic algorithms need, once per worker as it starts."""
+    import gensim.models
+    import sklearn.cluster
+    import sklearn.decomposition
+
+
+def _get_pool(name: str = "models") -> ProcessPoolExecutor:
+    """Lazy initialization of the process pools that run the topic pipeline"""
+    if name not in _pools:
+        with _pool_lock:
+            if name not in _pools:  # Double-check lock
+                max_workers, initializer = {
+                    "corpus": (1, _init_corpus_worker),
+                    "models": (TOPIC_POOL_WORKERS, _init_models_worker),
+                }[name]
+                # spawn rather than fork: the server process has running threads (asyncio, aiohttp, Slack socket)
+                _pools[name] = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=initializer,
+                )
+    return _pools[name]
+
+
+def shutdown_pool() -> None:
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+async def _run_in_pool(fn, *args):
+    # lemmatizing is the only step that needs spaCy, so it always runs in the corpus worker
+    pool = _get_pool("corpus" if fn is _prepare_corpus else "models")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # a worker died (e.g. killed for using too much memory); start fresh pools for the next request
+        shutdown_pool()
+        raise
+
+
+def _ready() -> None:
+    pass
+
+
+def warm_up() -> float:
+    """
+    Start the topic analysis workers ahead of the first /tldr; each one loads what it needs in the pools'
+    initializer as it starts. Blocking; run it in a worker thread.
+
+    Returns:
+        float: How long it took, in seconds.
+    """
+    start = time.perf_counter()
+    # the workers are spawned on demand, and every submit that finds no idle worker starts a new one
+    futures = [_get_pool("corpus").submit(_ready)]
+    futures += [_get_pool("models").submit(_ready) for _ in range(TOPIC_POOL_WORKERS)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Topic analysis workers warmed up in {elapsed:.2f}s")
+    return elapsed
+
+
+def _choose_backend(num_documents: int, backend: str = None) -> str:
+    backend = backend or TOPIC_BACKEND
+    if backend in ("exact", "scalable"):
+        return backend
+    return "scalable" if num_documents >= TOPIC_SCALABLE_THRESHOLD else "exact"
+
+
+def _num_rows(matrix) -> int:
+    return matrix.shape[0] if hasattr(matrix, "shape") else len(matrix)
+
+
+def _compute_kmeans_topics(tfidf_matrix, num_topics, terms, backend: str = None):
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    if _choose_backend(_num_rows(tfidf_matrix), backend) == "scalable":
+        km = MiniBatchKMeans(n_clusters=num_topics, batch_size=2048, n_init=3, random_state=0)
+    else:
+        km = KMeans(n_clusters=num_topics)
     km.fit(tfidf_matrix)
     order_centroids = km.cluster_centers_.argsort()[:, ::-1]
     cluster_terms = {}
@@ -50,29 +222,52 @@ async def _kmeans_topics(tfidf_matrix, num_topics, terms):
     return cluster_terms
 
 
-async def _lsa_topics(tfidf_matrix, num_topics, terms):
-    lsa_model = TruncatedSVD(n_components=num_topics)
-    lsa_model.fit_transform(tfidf_matrix)
+def _compute_lsa_topics(tfidf_matrix, num_topics, terms, backend: str = None):
+    from sklearn.decomposition import TruncatedSVD
+
+    num_rows = _num_rows(tfidf_matrix)
+    if _choose_backend(num_rows, backend) == "scalable":
+        # only the term components are needed, so learn them from a sample and skip transforming every row
+        lsa_model = TruncatedSVD(
+            n_components=num_topics, algorithm="randomized", n_iter=SVD_N_ITER, random_state=0
+        )
+        if num_rows > SVD_MAX_ROWS:
+            import numpy as np
+
+            rows = np.random.default_rng(0).choice(num_rows, SVD_MAX_ROWS, replace=False)
+            tfidf_matrix = tfidf_matrix[np.sort(rows)]
+        lsa_model.fit(tfidf_matrix)
+    else:
+        lsa_model = TruncatedSVD(n_components=num_topics)
+        lsa_model.fit_transform(tfidf_matrix)
     topics = {}
     for i, topic in enumerate(lsa_model.components_):
         topics[i] = [terms[t] for t in topic.argsort()[:-6:-1]]
     return topics
 
 
-async def _lda_topics(messages, num_topics, stop_words):
+def _tokenize_for_lda(messages, stop_words) -> list[list[str]]:
     # Remove punctuation
     translator = str.maketrans("", "", string.punctuation)
     cleaned_messages = [message.translate(translator) for message in messages]
 
     # Tokenize the messages, filter out stop words and short words
-    tokenized_messages = [
+    return [
         [word for word in message.split() if word not in stop_words and len(word) > 3]
         for message in cleaned_messages
     ]
 
+
+def _train_lda(messages, num_topics, stop_words, backend: str = None):
+    """Train the phrase models, dictionary and LDA model from scratch."""
+    from gensim import corpora
+    from gensim.models import LdaModel, Phrases
+
+    tokenized_messages = _tokenize_for_lda(messages, stop_words)
+
     # Create n-gram models
-    bi_gram = Phrases(tokenized_messages, min_count=5, threshold=100)
-    tri_gram = Phrases(bi_gram[tokenized_messages], threshold=100)
+    bi_gram = Phrases(tokenized_messages, min_count=5, threshold=100).freeze()
+    tri_gram = Phrases(bi_gram[tokenized_messages], threshold=100).freeze()
     tokenized_messages = [tri_gram[bi_gram[message]] for message in tokenized_messages]
 
     # Create a dictionary and corpus for LDA
@@ -81,17 +276,167 @@ async def _lda_topics(messages, num_topics, stop_words):
     corpus = [dictionary.doc2bow(message) for message in tokenized_messages]
 
     # Train the LDA model
-    lda_model = LdaModel(
-        corpus, num_topics=num_topics, id2word=dictionary, passes=20
-    )  # was 15
-
-    # Extract topics
+    if _choose_backend(len(corpus), backend) == "scalable":
+        # online variational Bayes: a couple of passes of chunked updates instead of 20 full passes
+        lda_model = LdaModel(
+            corpus,
+            num_topics=num_topics,
+            id2word=dictionary,
+            chunksize=LDA_CHUNKSIZE,
+            update_every=1,
+            passes=2,
+            random_state=0,
+        )
+    else:
+        lda_model = LdaModel(
+            corpus, num_topics=num_topics, id2word=dictionary, passes=20
+        )  # was 15
+    return bi_gram, tri_gram, dictionary, lda_model
+
+
+def _get_lda_topic_terms(lda_model, num_topics):
     topics = {}
     for i in range(num_topics):
         topics[i] = [word[0] for word in lda_model.show_topic(i, topn=5)]
     return topics
 
 
+def _compute_lda_topics(messages, num_topics, stop_words, backend: str = None):
+    *_, lda_model = _train_lda(messages, num_topics, stop_words, backend)
+    return _get_lda_topic_terms(lda_model, num_topics)
+
+
+def _compute_channel_lda_topics(
+    channel_id, messages, message_keys, num_topics, stop_words, retrain: bool = False, update: bool = True
+):
+    """
+    Get LDA topics from the channel's stored model, updating it online with the messages posted since it was
+    last saved, or train and store a new one if there is none (or `retrain` is set).
+
+    With `update=False` nothing is written: the stored model is used as it is, or a throwaway one is trained if
+    there is none. Callers pass it while another worker is writing the channel's model.
+
+    New words only enter the vocabulary when the model is retrained, so callers should retrain in the
+    background once the second return value says it's due.
+
+    Returns:
+        tuple[dict, bool]: The topics and whether a full retrain is due.
+    """
+    latest_ts = max(map(get_ts_from_message_key, message_keys), default=0.0)
+    saved = None if retrain else lda_model_store.load(channel_id)
+    if saved is not None and (
+        saved["meta"].get("pipeline") != LEMMATIZE_PIPELINE or saved["meta"].get("num_topics") != num_topics
+    ):
+        saved = None
+
+    if not update:
+        if saved is None:
+            return _compute_lda_topics(messages, num_topics, stop_words), False
+        return _get_lda_topic_terms(saved["model"], num_topics), False
+
+    if saved is None:
+        start = time.perf_counter()
+        bi_gram, tri_gram, dictionary, lda_model = _train_lda(messages, num_topics, stop_words)
+        lda_model_store.save(
+            channel_id,
+            lda_model,
+            dictionary,
+            bi_gram,
+            tri_gram,
+            {
+                "pipeline": LEMMATIZE_PIPELINE,
+                "num_topics": num_topics,
+                "latest_ts": latest_ts,
+                "trained_at": time.time(),
+                "trained_count": len(messages),
+                "updated_count": 0,
+            },
+        )
+        elapsed = time.perf_counter() - start
+        logger.info(f"Trained LDA model for {channel_id} on {len(messages)} messages in {elapsed:.2f}s")
+        return _get_lda_topic_terms(lda_model, num_topics), False
+
+    meta, lda_model = saved["meta"], saved["model"]
+    new_messages = [
+        message
+        for message, key in zip(messages, message_keys)
+        if get_ts_from_message_key(key) > meta["latest_ts"]
+    ]
+    if new_messages:
+        bi_gram, tri_gram, dictionary = saved["bigram"], saved["trigram"], saved["dictionary"]
+        corpus = [
+            dictionary.doc2bow(tri_gram[bi_gram[tokens]])
+            for tokens in _tokenize_for_lda(new_messages, stop_words)
+        ]
+        lda_model.update(corpus, chunksize=LDA_CHUNKSIZE)
+        meta = lda_model_store.save(
+            channel_id,
+            lda_model,
+            dictionary,
+            bi_gram,
+            tri_gram,
+            {**meta, "latest_ts": latest_ts, "updated_count": meta["updated_count"] + len(new_messages)},
+        )
+        logger.info(f"Updated LDA model for {channel_id} with {len(new_messages)} new messages")
+
+    retrain_due = (
+        time.time() - meta["trained_at"] > LDA_RETRAIN_INTERVAL_SECONDS
+        or meta["updated_count"] > LDA_RETRAIN_UPDATE_RATIO * meta["trained_count"]
+    )
+    return _get_lda_topic_terms(lda_model, num_topics), retrain_due
+
+
+def _schedule_lda_retrain(channel_id, messages, message_keys, num_topics, stop_words):
+    """Retrain the channel's LDA model from scratch in a pool worker without making /tldr wait for it."""
+    if channel_id in _lda_retraining:
+        return
+    _lda_retraining.add(channel_id)
+
+    async def retrain():
+        try:
+            async with _lda_write_locks.setdefault(channel_id, asyncio.Lock()):
+                await _run_in_pool(
+                    _compute_channel_lda_topics, channel_id, messages, message_keys, num_topics, stop_words, True
+                )
+        except Exception as e:
+            logger.warning(f"Background LDA retrain for {channel_id} failed: {e}")
+        finally:
+            _lda_retraining.discard(channel_id)
+
+    task = asyncio.get_running_loop().create_task(retrain())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _kmeans_topics(tfidf_matrix, num_topics, terms):
+    return await _run_in_pool(_compute_kmeans_topics, tfidf_matrix, num_topics, terms)
+
+
+async def _lsa_topics(tfidf_matrix, num_topics, terms):
+    return await _run_in_pool(_compute_lsa_topics, tfidf_matrix, num_topics, terms)
+
+
+async def _lda_topics(messages, num_topics, stop_words, channel_id=None, message_keys=None):
+    if channel_id is None or message_keys is None:
+        return await _run_in_pool(_compute_lda_topics, messages, num_topics, stop_words)
+
+    write_lock = _lda_write_locks.setdefault(channel_id, asyncio.Lock())
+    if write_lock.locked():
+        # a retrain (or another /tldr) is writing this channel's model: read it as it is instead of racing it
+        topics, _ = await _run_in_pool(
+            _compute_channel_lda_topics, channel_id, messages, message_keys, num_topics, stop_words, False, False
+        )
+        return topics
+
+    async with write_lock:
+        topics, retrain_due = await _run_in_pool(
+            _compute_channel_lda_topics, channel_id, messages, message_keys, num_topics, stop_words
+        )
+    if retrain_due:
+        _schedule_lda_retrain(channel_id, messages, message_keys, num_topics, stop_words)
+    return topics
+
+
 async def _synthesize_topics(
     topics_str: str, channel: str, user: str, is_private: bool = False
 ) -> tuple[str, UUID]:
@@ -102,7 +447,7 @@ async def _synthesize_topics(
     Do not wrap your response in code blocks or markdown code blocks.
     """
 
-    user_msg = f"""\
+    user_msg = """\
     For the provided results from topic analyses on the entire history of the "{channel}" Slack channel, 
     please provide a conversational summary and interpretation. Each bullet is a cluster under the methodology 
     heading; do not mention the methodology. When analyzing each cluster, please conflate duplicates and ignore 
@@ -115,14 +460,25 @@ async def _synthesize_topics(
     """
 
     config = get_llm_config()
-    model = ChatOpenAI(model=config["chat_model"], temperature=config["temperature"])
-
-    prompt_template = ChatPromptTemplate.from_messages(
-        [("system", system_msg), ("user", user_msg)]
+    cache_key = llm_cache.make_key(
+        kind="channel_topics",
+        prompts=(system_msg, user_msg),  # so editing the prompt doesn't serve answers to the old one
+        model=config["chat_model"],
+        temperature=config["temperature"],
+        channel=channel,
+        text=topics_str,
     )
-
-    parser = StrOutputParser()
-    chain = prompt_template | model | parser  # todo: add privacy mode
+    cached = await llm_cache.aget(cache_key)
+    if cached is not None:
+        logger.info("Serving channel topics from the LLM cache")
+        return cached
+
+    chain = get_chain(
+        system_msg,
+        user_msg,
+        config["chat_model"],
+        config["temperature"],
+    )  # todo: add privacy mode
 
     langsmith_config = get_langsmith_config(
         feature_name="channel_topics",
@@ -131,7 +487,7 @@ async def _synthesize_topics(
         is_private=is_private,
     )
     logger.debug(f"{langsmith_config=}")
-    result = chain.invoke(
+    result = await chain.ainvoke(
         {"topics_str": topics_str, "channel": channel}, config=langsmith_config
     )
     logger.debug(result)
@@ -140,31 +496,40 @@ async def _synthesize_topics(
     result = result.replace("\n* ", "\n- ")
     result = result.replace("**", "*")
 
+    await llm_cache.aset(cache_key, result, langsmith_config["run_id"], persist=not is_private)
     return result, langsmith_config["run_id"]
 
 
-async def analyze_topics_of_history(
-    channel_name: str,
-    messages,
-    user: str,
-    num_topics: int = 6,
-    is_private: bool = False,
-) -> str:
-    # Remove URLs
-    messages = [re.sub(r"http\S+", "", message) for message in messages]
+def _prepare_corpus(messages: list[str], channel_name: str, lemmatized: list = None):
+    """
+    Clean and lemmatize the messages and build their TF-IDF matrix. Runs in a topic analysis worker.
 
-    # Remove emojis
-    messages = [re.sub(r":[^:\s]+:", "", message) for message in messages]
+    `lemmatized` may hold the already lemmatized text of some messages (None for the rest), in which case only
+    the missing ones are cleaned and lemmatized.
 
-    # Lemmatize e.g. running -> run
-    messages = [
-        " ".join([token.lemma_ for token in nlp(message)]) for message in messages
-    ]
+    Returns:
+        tuple: The lemmatized messages, the TF-IDF matrix, its terms and the stop words used.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    lemmatized = list(lemmatized) if lemmatized else [None] * len(messages)
+    missing = [i for i, lemma in enumerate(lemmatized) if lemma is None]
+    if missing:
+        # Remove URLs
+        cleaned = [re.sub(r"http\S+", "", messages[i]) for i in missing]
+
+        # Remove emojis
+        cleaned = [re.sub(r":[^:\s]+:", "", message) for message in cleaned]
+
+        # Lemmatize e.g. running -> run
+        for i, lemma in zip(missing, _lemmatize(cleaned)):
+            lemmatized[i] = lemma
+    messages = lemmatized
 
     # todo: Support the ability to redact the names of channel members (to prevent any awkwardness)
 
     # Define stop words
-    stop_words = set(stopwords.words("english"))
+    stop_words = set(_get_stop_words())
     for word in [
         channel_name,
         "join",
@@ -180,11 +545,67 @@ async def analyze_topics_of_history(
     )
     tfidf_matrix = vectorizer.fit_transform(messages)
     terms = vectorizer.get_feature_names_out()
+    return messages, tfidf_matrix, terms, stop_words
+
 
-    # todo: make these part of the langsmith trace
-    kmeans_results = await _kmeans_topics(tfidf_matrix, num_topics, terms)
-    lsa_results = await _lsa_topics(tfidf_matrix, num_topics, terms)
-    lda_results = await _lda_topics(messages, num_topics, stop_words)
+async def analyze_topics_of_history(
+    channel_name: str,
+    messages,
+    user: str,
+    num_topics: int = 6,
+    is_private: bool = False,
+    channel_id: str = None,
+    message_keys: list[str] = None,
+) -> str:
+    """
+    Run KMeans, LSA and LDA over the channel's messages and have the LLM summarize the topics they found.
+
+    If `channel_id` and `message_keys` (from `topic_corpus.get_message_key`, one per message) are given, the
+    lemmatized messages are cached per channel and only new or edited messages are lemmatized on later runs.
+    """
+    global _pending
+    if _pending >= TOPIC_MAX_PENDING:
+        raise TopicAnalysisBusyError(
+            "Too many channel overviews are being prepared right now, please try again in a minute."
+        )
+
+    use_corpus_cache = channel_id is not None and message_keys is not None
+    _pending += 1
+    try:
+        lemmatized = None
+        if use_corpus_cache:
+            cached = await asyncio.to_thread(topic_corpus_store.load, channel_id, LEMMATIZE_PIPELINE)
+            lemmatized = [cached.get(key) for key in message_keys]
+            reused = sum(lemma is not None for lemma in lemmatized)
+            logger.info(f"Reusing {reused}/{len(message_keys)} lemmatized messages for {channel_id}")
+
+        messages, tfidf_matrix, terms, stop_words = await _run_in_pool(
+            _prepare_corpus, messages, channel_name, lemmatized
+        )
+        if use_corpus_cache:
+            await asyncio.to_thread(
+                topic_corpus_store.save,
+                channel_id,
+                dict(zip(message_keys, messages)),
+                LEMMATIZE_PIPELINE,
+                persist=not is_private,
+            )
+
+        # todo: make these part of the langsmith trace
+        kmeans_results, lsa_results, lda_results = await asyncio.gather(
+            _kmeans_topics(tfidf_matrix, num_topics, terms),
+            _lsa_topics(tfidf_matrix, num_topics, terms),
+            _lda_topics(
+                messages,
+                num_topics,
+                stop_words,
+                # private channels' models aren't written to disk, so they're trained from scratch each time
+                channel_id=None if is_private else channel_id,
+                message_keys=message_keys,
+            ),
+        )
+    finally:
+        _pending -= 1
 
     topics_str = f""
 
@@ -0,0 +1,172 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from ossai.logging_config import logger
+from ossai.utils.cache import TTLCache
+from ossai.utils.files import atomic_write_json
+
+TOPIC_CORPUS_DIR = os.getenv("TOPIC_CORPUS_DIR", "data/topic_corpus")
+TOPIC_CORPUS_MEMORY_CHANNELS = int(os.getenv("TOPIC_CORPUS_MEMORY_CHANNELS", 32))
+TOPIC_MODEL_DIR = os.getenv("TOPIC_MODEL_DIR", "data/topic_models")
+
+
+def get_message_key(message: dict) -> str:
+    """Key a message by its `ts` and the `ts` of its last edit, so editing a message invalidates its entry."""
+    edited = message.get("edited") or {}
+    return f"{message['ts']}:{edited.get('ts', '')}"
+
+
+def get_ts_from_message_key(key: str) -> float:
+    return float(key.split(":", 1)[0])
+
+
+class TopicCorpusStore:
+    """
+    Keep the lemmatized messages of each channel between /tldr runs, keyed by `get_message_key`, so only new
+    or edited messages go through spaCy again.
+
+    Corpora are held in an in-memory LRU of `max_channels` channels and written to `<directory>/<channel>.json`;
+    private channels are only kept in memory. A stored corpus is ignored if it was built by another
+    lemmatization pipeline (e.g. after changing the spaCy model).
+    """
+
+    def __init__(
+        self,
+        directory: str = TOPIC_CORPUS_DIR,
+        max_channels: int = TOPIC_CORPUS_MEMORY_CHANNELS,
+    ):
+        self.directory = Path(directory)
+        self._memory = TTLCache(maxsize=max_channels, ttl=float("inf"))
+
+    def _path(self, channel_id: str) -> Path:
+        return self.directory / f"{channel_id}.json"
+
+    def load(self, channel_id: str, pipeline: str) -> dict[str, str]:
+        """Return the cached `{message key: lemmatized text}` for the channel, or an empty dict."""
+        state = self._memory.get(channel_id)
+        if state is None:
+            path = self._path(channel_id)
+            if not path.exists():
+                return {}
+            try:
+                with open(path, "r") as f:
+                    state = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable topic corpus {path}: {e}")
+                return {}
+            self._memory.set(channel_id, state)
+        if state.get("pipeline") != pipeline:
+            return {}
+        return state["lemmas"]
+
+    def save(self, channel_id: str, lemmas: dict[str, str], pipeline: str, persist: bool = True) -> None:
+        """
+        Replace the channel's corpus with `lemmas`, which should cover the whole current history so deleted
+        messages drop out. Pass `persist=False` to keep it off disk (e.g. for private channels).
+        """
+        state = {"pipeline": pipeline, "lemmas": lemmas, "updated_at": time.time()}
+        self._memory.set(channel_id, state)
+        if persist:
+            atomic_write_json(self._path(channel_id), state)
+
+    def clear(self, channel_id: str) -> bool:
+        in_memory = self._memory.invalidate(channel_id)
+        path = self._path(channel_id)
+        if not path.exists():
+            return in_memory
+        path.unlink()
+        return True
+
+
+
+class LdaModelStore:
+    """
+    Persist each channel's LDA model, dictionary and phrase (bigram/trigram) models, so /tldr can update them
+    online with new messages instead of training from scratch.
+
+    Every save goes to a new `<directory>/<channel>/<version>/` directory and then `current.json` is atomically
+    pointed at it, so a reader never sees a half-written model; older versions are removed afterwards. Runs in
+    the topic analysis workers, where gensim is already loaded; topic_analysis only lets one of them write a
+    channel's model at a time.
+    """
+
+    def __init__(self, directory: str = TOPIC_MODEL_DIR):
+        self.directory = Path(directory)
+
+    def _pointer_path(self, channel_id: str) -> Path:
+        return self.directory / channel_id / "current.json"
+
+    def _current_version(self, channel_id: str) -> Optional[str]:
+        pointer = self._pointer_path(channel_id)
+        if not pointer.exists():
+            return None
+        try:
+            with open(pointer, "r") as f:
+                return json.load(f).get("version")
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def load(self, channel_id: str) -> Optional[dict]:
+        """
+        Return `{"meta", "model", "dictionary", "bigram", "trigram"}` for the channel's current model, or None if
+        there is none (or it can't be read).
+        """
+        from gensim.corpora import Dictionary
+        from gensim.models import LdaModel
+        from gensim.models.phrases import FrozenPhrases
+
+        pointer = self._pointer_path(channel_id)
+        if not pointer.exists():
+            return None
+        try:
+            with open(pointer, "r") as f:
+                meta = json.load(f)
+            version_dir = pointer.parent / meta["version"]
+            return {
+                "meta": meta,
+                "model": LdaModel.load(str(version_dir / "lda.model")),
+                "dictionary": Dictionary.load(str(version_dir / "dictionary")),
+                "bigram": FrozenPhrases.load(str(version_dir / "bigram")),
+                "trigram": FrozenPhrases.load(str(version_dir / "trigram")),
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable LDA model for {channel_id}: {e}")
+            return None
+
+    def save(self, channel_id: str, model, dictionary, bigram, trigram, meta: dict) -> dict:
+        """Save a new version of the channel's model and make it current, returning the meta that was written."""
+        channel_dir = self.directory / channel_id
+        previous = self._current_version(channel_id)
+
+        meta = {**meta, "version": uuid.uuid4().hex, "saved_at": time.time()}
+        version_dir = channel_dir / meta["version"]
+        version_dir.mkdir(parents=True)
+        model.save(str(version_dir / "lda.model"))
+        dictionary.save(str(version_dir / "dictionary"))
+        bigram.save(str(version_dir / "bigram"))
+        trigram.save(str(version_dir / "trigram"))
+        atomic_write_json(self._pointer_path(channel_id), meta)
+
+        # keep the previous version around in case another worker is loading it right now, and never remove the
+        # one `current.json` points at, even if another writer has replaced ours in the meantime
+        keep = {meta["version"], previous, self._current_version(channel_id)}
+        for path in channel_dir.iterdir():
+            if path.is_dir() and path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        return meta
+
+    def clear(self, channel_id: str) -> bool:
+        channel_dir = self.directory / channel_id
+        if not channel_dir.exists():
+            return False
+        shutil.rmtree(channel_dir)
+        return True
+
+
+topic_corpus_store = TopicCorpusStore()
+lda_model_store = LdaModelStore()
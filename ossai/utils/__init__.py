@@ -1,11 +1,28 @@
+from .cache import TTLCache
 from .config import get_llm_config
-from .langsmith import CustomLangChainTracer, get_langsmith_config
-from .slack import get_since_timeframe_presets, get_text_and_blocks_for_say
+from .langsmith import get_langsmith_config
+from .slack import (
+    ThrottledMessageUpdater,
+    get_since_timeframe_presets,
+    get_text_and_blocks_for_say,
+)
+from .tokens import get_token_counter
 
 __all__ = [
+    "TTLCache",
     "get_llm_config",
     "CustomLangChainTracer",
     "get_langsmith_config",
     "get_text_and_blocks_for_say",
     "get_since_timeframe_presets",
-] 
\ No newline at end of file
+    "ThrottledMessageUpdater",
+    "get_token_counter",
+] 
+
+def __getattr__(name: str):
+    # built on first use, so importing ossai.utils doesn't load langchain
+    if name == "CustomLangChainTracer":
+        from .langsmith import CustomLangChainTracer
+
+        return CustomLangChainTracer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -12,6 +12,12 @@ def get_llm_config():
     debug = bool(os.environ.get("DEBUG", False))
     max_body_tokens = int(os.getenv("MAX_BODY_TOKENS", 1000))
     language = os.getenv("LANGUAGE", "english")
+    max_concurrency = int(os.getenv("SUMMARY_CONCURRENCY", 4))
+    summary_mode = os.getenv("SUMMARY_MODE", "map_reduce").strip().lower()  # "map" or "map_reduce"
+    reduce_fan_in = int(os.getenv("REDUCE_FAN_IN", 4))
+    reduce_max_depth = int(os.getenv("REDUCE_MAX_DEPTH", 3))
+    token_counter = os.getenv("TOKEN_COUNTER", "tiktoken").strip().lower()  # "tiktoken" or "heuristic"
+    token_count_memo_size = int(os.getenv("TOKEN_COUNT_MEMO_SIZE", 50_000))
 
     if not openai_api_key:
         raise ValueError("OPENAI_API_KEY is not set in .env file")
@@ -22,4 +28,10 @@ def get_llm_config():
         "debug": debug,
         "max_body_tokens": max_body_tokens,
         "language": language,
+        "max_concurrency": max_concurrency,
+        "summary_mode": summary_mode,
+        "reduce_fan_in": reduce_fan_in,
+        "reduce_max_depth": reduce_max_depth,
+        "token_counter": token_counter,
+        "token_count_memo_size": token_count_memo_size,
     } 
\ No newline at end of file
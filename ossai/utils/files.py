@@ -0,0 +1,37 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+
+def atomic_write_json(path: Path, data: Any, fsync: bool = False) -> None:
+    """
+    Write `data` as JSON to `path` via a temporary file in the same directory and `os.replace`, so a crash
+    mid-write never leaves a truncated file behind. With `fsync`, the data is on disk before the rename and the
+    rename itself is made durable by syncing the directory.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    if fsync:
+        fsync_directory(path.parent)
+
+
+def fsync_directory(path: Path) -> None:
+    """Flush the entries of the directory at `path` to disk, so a file created, renamed or unlinked in it stays so."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
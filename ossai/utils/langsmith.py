@@ -1,27 +1,40 @@
 import uuid
-
-from langchain_core.tracers import LangChainTracer
+from functools import lru_cache
 
 from ossai.logging_config import logger
 
 
-class CustomLangChainTracer(LangChainTracer):
-    def __init__(self, is_private=False, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.is_private = is_private
+@lru_cache(maxsize=None)
+def _get_tracer_class() -> type:
+    # langchain's tracer pulls in the LangSmith client, which is slow to import, so the class is built on first use
+    from langchain_core.tracers import LangChainTracer
+
+    class CustomLangChainTracer(LangChainTracer):
+        def __init__(self, is_private=False, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.is_private = is_private
+
+        def handleText(self, text, runId):
+            if not self.is_private:
+                logger.info("passing text")
+                super().handleText(text, runId)
+            else:
+                logger.info("passing no text")
+                super().handleText("", runId)
+
+    CustomLangChainTracer.__qualname__ = "CustomLangChainTracer"  # importable (and picklable) as a module attribute
+    return CustomLangChainTracer
+
 
-    def handleText(self, text, runId):
-        if not self.is_private:
-            logger.info("passing text")
-            super().handleText(text, runId)
-        else:
-            logger.info("passing no text")
-            super().handleText("", runId)
+def __getattr__(name: str):
+    if name == "CustomLangChainTracer":
+        return _get_tracer_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_langsmith_config(feature_name: str, user: dict, channel: str, is_private=False):
     run_id = str(uuid.uuid4())
-    tracer = CustomLangChainTracer(
+    tracer = _get_tracer_class()(
         is_private=is_private
     )  # FIXME: this doesn't add privacy like it should
 
@@ -35,4 +48,4 @@ def get_langsmith_config(feature_name: str, user: dict, channel: str, is_private
         },
         "tags": [feature_name],
         "callbacks": [tracer],
-    } 
\ No newline at end of file
+    } 
@@ -0,0 +1,41 @@
+from functools import lru_cache
+
+# langchain and the OpenAI client take seconds to import, so they're only loaded when the first chain is built
+
+
+@lru_cache(maxsize=32)
+def get_chat_model(model: str, temperature: float, model_cls=None):
+    """
+    Return the process-wide chat model for `model` and `temperature` (a `ChatOpenAI` unless `model_cls` is given).
+
+    Reusing one instance keeps its HTTP client (and pooled connections to the API) warm across requests.
+    """
+    if model_cls is None:
+        from langchain_openai import ChatOpenAI as model_cls
+    return model_cls(model=model, temperature=temperature)
+
+
+@lru_cache(maxsize=128)
+def get_chain(
+    system_msg: str,
+    human_msg: str,
+    model: str,
+    temperature: float,
+    model_cls=None,
+    parser_cls=None,
+):
+    """
+    Return the process-wide `prompt | model | parser` chain for a pair of prompt templates.
+
+    Chains are stateless, so per-request details (LangSmith run ID, callbacks, metadata) are passed in the
+    `config` of each call rather than baked into the chain.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+
+    if parser_cls is None:
+        from langchain_core.output_parsers import StrOutputParser as parser_cls
+
+    prompt_template = ChatPromptTemplate.from_messages(
+        [("system", system_msg), ("user", human_msg)]
+    )
+    return prompt_template | get_chat_model(model, temperature, model_cls) | parser_cls()
@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from ossai.logging_config import logger
+from ossai.utils.cache import TTLCache
+
+
+class LLMResponseCache:
+    """
+    A content-addressed cache of LLM responses, so repeating an identical prompt doesn't call the model again.
+
+    Responses live in an in-memory LRU and, if `db_path` is set, in a SQLite table that survives restarts.
+    Entries expire after `ttl` seconds and responses larger than `max_entry_bytes` are not cached.
+    Values are `(response, run_id)` pairs so a cached answer still points at the LangSmith run that produced it.
+    Async callers should use `aget`/`aset`, which do the SQLite reads and writes in a worker thread.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        ttl: float = 86_400,
+        max_entry_bytes: int = 64_000,
+        db_path: Optional[str] = None,
+        enabled: bool = True,
+    ):
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.enabled = enabled
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._db = None
+        self._db_lock = threading.Lock()
+        if enabled and db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, run_id TEXT, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """Hash everything that determines the model's answer (model, temperature, prompt, text, ...)."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[tuple[str, Optional[str]]]:
+        if not self.enabled:
+            return None
+        value = self._memory.get(key)
+        if value is not None or self._db is None:
+            return value
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT response, run_id, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response, run_id, expires_at = row
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            self._delete(key)
+            return None
+        self._memory.set(key, (response, run_id), ttl=remaining)
+        return response, run_id
+
+    def set(self, key: str, response: str, run_id: Optional[str] = None, persist: bool = True) -> bool:
+        """
+        Cache `response`, returning whether it was stored. Pass `persist=False` to keep it out of the
+        on-disk tier (e.g. for summaries of private channels).
+        """
+        if not self.enabled or len(response.encode("utf-8")) > self.max_entry_bytes:
+            return False
+        self._memory.set(key, (response, run_id))
+        if self._db is not None and persist:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, run_id, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, response, None if run_id is None else str(run_id), time.time() + self.ttl),
+                )
+                self._db.commit()
+        return True
+
+    async def aget(self, key: str) -> Optional[tuple[str, Optional[str]]]:
+        """`get` without blocking the event loop: only an in-memory miss goes to SQLite, in a worker thread."""
+        if not self.enabled:
+            return None
+        value = self._memory.get(key)
+        if value is not None or self._db is None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, response: str, run_id: Optional[str] = None, persist: bool = True) -> bool:
+        """`set` without blocking the event loop on the SQLite write."""
+        if self._db is None or not persist:
+            return self.set(key, response, run_id, persist=persist)
+        return await asyncio.to_thread(self.set, key, response, run_id, persist)
+
+    def _delete(self, key: str) -> None:
+        with self._db_lock:
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "persistent": self._db is not None, **self._memory.stats()}
+
+
+def _create_llm_cache() -> LLMResponseCache:
+    db_path = os.getenv("LLM_CACHE_PATH", "").strip() or None
+    kwargs = dict(
+        maxsize=int(os.getenv("LLM_CACHE_MAX_SIZE", 1000)),
+        ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", 86_400)),
+        max_entry_bytes=int(os.getenv("LLM_CACHE_MAX_ENTRY_BYTES", 64_000)),
+        enabled=os.getenv("LLM_CACHE_ENABLED", "true").strip().lower() == "true",
+    )
+    try:
+        return LLMResponseCache(db_path=db_path, **kwargs)
+    except sqlite3.Error as e:
+        logger.warning(f"Unable to open the LLM cache at {db_path}, caching in memory only: {e}")
+        return LLMResponseCache(**kwargs)
+
+
+llm_cache = _create_llm_cache()
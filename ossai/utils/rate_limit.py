@@ -0,0 +1,36 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class RateLimiter:
+    """
+    Pace calls to at most `per_minute` a minute, letting up to `burst` of them through back to back.
+
+    A token bucket kept as the time the next call is due (GCRA), so `acquire` only has to sleep until its slot.
+    Slots are handed out before sleeping, so concurrent callers queue up in order instead of all waking at once.
+    """
+
+    def __init__(
+        self,
+        per_minute: float,
+        burst: int = 1,
+        timer: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        self.interval = 60.0 / per_minute
+        self.burst = burst
+        self._timer = timer
+        self._sleep = sleep
+        self._due = 0.0
+
+    def reserve(self) -> float:
+        """Take the next slot, returning how many seconds to wait before using it."""
+        now = self._timer()
+        self._due = max(self._due, now) + self.interval
+        return max(0.0, self._due - self.burst * self.interval - now)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await self._sleep(delay)
@@ -1,8 +1,15 @@
+import asyncio
 import calendar
+import time
 import uuid
 from time import gmtime, strptime
 from typing import Union
 
+from aiohttp import ClientError
+from slack_sdk.errors import SlackApiError
+
+from ossai.logging_config import logger
+
 
 def get_text_and_blocks_for_say(
     title: str,
@@ -129,4 +136,53 @@ def get_since_timeframe_presets():
             }
             for (text, value) in options
         ],
-    } 
\ No newline at end of file
+    } 
+
+class ThrottledMessageUpdater:
+    """
+    Progressively edit a posted message (e.g. the "..." placeholder) while a summary streams in.
+
+    `chat.update` is rate limited (roughly one call per second per channel), so edits are sent at most once
+    every `min_interval` seconds; text that arrives in between is picked up by the next edit or by `finish`.
+    """
+
+    def __init__(
+        self,
+        client,
+        channel: str,
+        ts: str,
+        title: str = "",
+        min_interval: float = 1.5,
+        timer=time.monotonic,
+    ):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.title = title
+        self.min_interval = min_interval
+        self._timer = timer
+        self._next_update_at = 0.0
+        self.updates = 0
+
+    async def update(self, text: str) -> None:
+        now = self._timer()
+        if now < self._next_update_at:
+            return
+        self._next_update_at = now + self.min_interval
+        try:
+            await self.client.chat_update(
+                channel=self.channel, ts=self.ts, text=f"{self.title}{text} ..."
+            )
+            self.updates += 1
+        except SlackApiError as e:
+            # a dropped progress update isn't worth failing the summary for; back off if asked to
+            retry_after = float(e.response.headers.get("Retry-After", 0) or 0)
+            self._next_update_at = now + max(self.min_interval, retry_after)
+            logger.warning(f"Unable to stream summary update: {e.response.get('error')}")
+        except (ClientError, asyncio.TimeoutError, OSError) as e:
+            # likewise for a dropped connection or timeout; the next update (or finish) tries again
+            logger.warning(f"Unable to stream summary update: {e!r}")
+
+    async def finish(self, text: str, blocks: list):
+        """Replace the message with the final summary."""
+        return await self.client.chat_update(channel=self.channel, ts=self.ts, text=text, blocks=blocks)
@@ -0,0 +1,123 @@
+import hashlib
+import re
+from functools import lru_cache
+from typing import Optional
+
+from ossai.logging_config import logger
+from ossai.utils.cache import TTLCache
+
+DEFAULT_ENCODING = "o200k_base"
+
+_HEURISTIC_PATTERN = re.compile(
+    r"""(
+        \d+       | # digits
+        [a-z]+    | # alphabets
+        \s+       | # whitespace
+        .           # other characters
+        )""",
+    re.VERBOSE | re.IGNORECASE,
+)
+
+
+class HeuristicTokenCounter:
+    """
+    Approximate token counts without a vocabulary, based on
+    https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
+
+    Cheap, but can be badly off for code, URLs and non-English text.
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        def counter(tok):
+            if tok == " " or tok == "\n":
+                return 0
+            elif tok.isdigit() or tok.isalpha():
+                return (len(tok) + 3) // 4
+            else:
+                return 1
+
+        return sum(map(counter, _HEURISTIC_PATTERN.findall(text)))
+
+
+class TiktokenTokenCounter:
+    """
+    Exact token counts using the BPE vocabulary the chat model was trained with.
+
+    tiktoken downloads the vocabulary on first use and caches it in `TIKTOKEN_CACHE_DIR`, so pointing that
+    at a pre-populated directory (see the Dockerfile) lets this work offline.
+    """
+
+    name = "tiktoken"
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING):
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text: str) -> int:
+        # Slack messages are user content, so special tokens are counted as plain text rather than rejected
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+class CachedTokenCounter:
+    """
+    Memoize another counter's results per message, keyed by a hash of the message content.
+
+    Histories are re-split every time a channel is summarized, so most messages have been counted before.
+    """
+
+    def __init__(self, counter, maxsize: int = 50_000):
+        self.counter = counter
+        self.name = f"cached-{counter.name}"
+        self._memo = TTLCache(maxsize=maxsize, ttl=float("inf"))
+
+    def count(self, text: str) -> int:
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        count = self._memo.get(key)
+        if count is None:
+            count = self.counter.count(text)
+            self._memo.set(key, count)
+        return count
+
+    def stats(self) -> dict:
+        return self._memo.stats()
+
+
+def get_encoding_name_for_model(chat_model: str) -> str:
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_name_for_model(chat_model)
+    except (ImportError, KeyError):
+        return DEFAULT_ENCODING
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(
+    backend: str = "tiktoken",
+    chat_model: str = "gpt-4.1",
+    memo_size: int = 50_000,
+):
+    """
+    Return the process-wide token counter for `backend` ("tiktoken" or "heuristic").
+
+    Falls back to the heuristic if tiktoken is not installed or its vocabulary can't be loaded (e.g. when
+    offline without a pre-populated `TIKTOKEN_CACHE_DIR`).
+    """
+    counter: Optional[object] = None
+    if backend == "tiktoken":
+        encoding_name = get_encoding_name_for_model(chat_model)
+        try:
+            counter = TiktokenTokenCounter(encoding_name)
+        except Exception as e:
+            logger.warning(
+                f"Unable to load the {encoding_name} tokenizer, falling back to estimated token counts: {e}"
+            )
+    elif backend != "heuristic":
+        logger.warning(f"Unknown TOKEN_COUNTER {backend!r}, falling back to estimated token counts")
+
+    if counter is None:
+        counter = HeuristicTokenCounter()
+    return CachedTokenCounter(counter, maxsize=memo_size) if memo_size > 0 else counter
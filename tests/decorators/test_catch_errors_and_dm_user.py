@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from slack_sdk import WebClient
+from slack_sdk.web.async_client import AsyncWebClient
 from slack_sdk.errors import SlackApiError
 from ossai import slack_context
 from ossai.decorators.catch_error_dm_user import (
@@ -16,7 +17,7 @@ from ossai.slack_context import SlackContext
 async def test_catch_errors_dm_user_happy_path():
     # Setup
     slack_context = AsyncMock(spec=SlackContext)
-    slack_context.client = AsyncMock(spec=WebClient)
+    slack_context.client = AsyncMock(spec=AsyncWebClient)
     mock_func = AsyncMock()
     mock_func.return_value = "Success"
     decorated_func = catch_errors_dm_user(mock_func)
@@ -39,12 +40,28 @@ async def test_catch_errors_dm_user_happy_path():
     slack_context.client.chat_postEphemeral.assert_not_called()
 
 
+@pytest.mark.asyncio
+async def test_catch_errors_dm_user_accepts_a_sync_web_client():
+    """A SlackContext built on a synchronous WebClient runs handlers through its async adapter."""
+    client = MagicMock(spec=WebClient)
+    client.chat_postMessage.return_value = {"ok": True}
+
+    @catch_errors_dm_user
+    async def handler(slack_context, ack, payload):
+        return await slack_context.client.chat_postMessage(channel=payload["channel_id"], text="hi")
+
+    result = await handler(SlackContext(client), AsyncMock(), {"channel_id": "C123", "user_id": "U123"})
+
+    assert result == {"ok": True}
+    client.chat_postMessage.assert_called_once_with(channel="C123", text="hi")
+
+
 @pytest.mark.asyncio
 @patch("ossai.decorators.catch_error_dm_user.logger")
 async def test_catch_errors_dm_user_error_handling(mock_logger):
     # Setup
     slack_context = AsyncMock(spec=SlackContext)
-    slack_context.client = AsyncMock(spec=WebClient)
+    slack_context.client = AsyncMock(spec=AsyncWebClient)
     mock_func = AsyncMock()
     mock_func.side_effect = SlackApiError(
         message="Pineapple on pizza error", response={"error": "API error"}
@@ -84,10 +101,10 @@ async def test_catch_errors_dm_user_error_handling(mock_logger):
 async def test_handle_slack_api_error_channel_error_branch(error_code):
     """not_in_channel and channel_not_found route through _handle_channel_error and mention the bot by name."""
     mock_context = AsyncMock(spec=SlackContext)
-    mock_context.client = AsyncMock(spec=WebClient)
+    mock_context.client = AsyncMock(spec=AsyncWebClient)
     mock_context.get_direct_message_channel_id = AsyncMock(return_value="DM123")
     mock_context.get_bot_id = AsyncMock(return_value="B123")
-    mock_context.client.bots_info = MagicMock(return_value={"bot": {"name": "MyBot"}})
+    mock_context.client.bots_info = AsyncMock(return_value={"bot": {"name": "MyBot"}})
     mock_context.client.chat_postEphemeral = AsyncMock()
 
     payload = SlackPayload(user_id="U123", channel_id="C123")
@@ -106,7 +123,7 @@ async def test_handle_slack_api_error_channel_error_branch(error_code):
 async def test_handle_slack_api_error_generic_error_branch():
     """Generic Slack errors post to the original channel (not DM) with the error code in the message."""
     mock_context = AsyncMock(spec=SlackContext)
-    mock_context.client = AsyncMock(spec=WebClient)
+    mock_context.client = AsyncMock(spec=AsyncWebClient)
     mock_context.client.chat_postEphemeral = AsyncMock()
 
     payload = SlackPayload(user_id="U123", channel_id="C123")
@@ -125,7 +142,7 @@ async def test_handle_slack_api_error_generic_error_branch():
 @patch("ossai.decorators.catch_error_dm_user.logger")
 async def test_send_error_message_exception_is_swallowed(mock_logger):
     """When chat_postEphemeral itself raises, _send_error_message logs and does not re-raise."""
-    mock_client = AsyncMock(spec=WebClient)
+    mock_client = AsyncMock(spec=AsyncWebClient)
     mock_client.chat_postEphemeral.side_effect = Exception("network failure")
 
     # Should not raise
@@ -0,0 +1,352 @@
+import json
+import threading
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+from ossai import archive as archive_module
+from ossai.archive import (
+    ColumnarArchive,
+    JsonlArchive,
+    ThreadUpdates,
+    convert_archive,
+    recover_archives,
+    sync_channel_archive,
+)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return JsonlArchive("general", directory=str(tmp_path))
+
+
+def messages(*timestamps):
+    return [{"ts": ts, "text": f"message {ts}"} for ts in timestamps]
+
+
+def read_records(thread_updates):
+    with open(thread_updates.path) as f:
+        return [json.loads(line) for line in f]
+
+
+def history_pages(*pages):
+    """Mock `SlackContext.iter_channel_history` yielding `pages` (each newest first, like Slack)."""
+
+    async def iter_channel_history(channel_id, since_ts=None):
+        for page in pages:
+            yield list(page)
+
+    return MagicMock(side_effect=iter_channel_history)
+
+
+def test_append_only_writes_new_messages_and_updates_manifest(archive, tmp_path):
+    assert (archive.latest_ts, archive.count) == (0.0, 0)
+
+    assert archive.append(messages("1.0", "2.0")) == 2
+    assert archive.append(messages("2.0", "3.0")) == 1
+
+    reopened = JsonlArchive("general", directory=str(tmp_path))
+    assert (reopened.latest_ts, reopened.count) == (3.0, 3)
+    assert [m["ts"] for m in reopened.iter_messages()] == ["1.0", "2.0", "3.0"]
+    manifest = json.loads(archive.manifest_path.read_text())
+    assert manifest["size"] == archive.path.stat().st_size
+
+
+def test_manifest_is_rebuilt_for_an_archive_without_one(tmp_path):
+    path = tmp_path / "general.jsonl"
+    path.write_text("".join(json.dumps(m) + "\n" for m in messages("1.0", "5.0", "3.0")))
+
+    archive = JsonlArchive("general", directory=str(tmp_path))
+
+    assert (archive.latest_ts, archive.count) == (5.0, 3)
+    assert archive.manifest_path.exists()
+
+
+def test_only_the_tail_past_the_manifest_is_read(archive, tmp_path, monkeypatch):
+    """Lines appended after the manifest was written are picked up, a partial last line is dropped."""
+    archive.append(messages("1.0", "2.0"))
+    with open(archive.path, "a") as f:
+        f.write(json.dumps(messages("3.0")[0]) + "\n" + '{"ts": "4.0", "te')
+
+    scanned_from = []
+    original_scan = JsonlArchive._scan
+    monkeypatch.setattr(
+        JsonlArchive, "_scan", lambda self, m, f, start: scanned_from.append(start) or original_scan(self, m, f, start)
+    )
+    reopened = JsonlArchive("general", directory=str(tmp_path))
+
+    assert (reopened.latest_ts, reopened.count) == (3.0, 3)
+    assert scanned_from == [archive.manifest["size"]]
+    assert reopened.append(messages("4.0")) == 1
+    assert [m["ts"] for m in reopened.iter_messages()] == ["1.0", "2.0", "3.0", "4.0"]
+
+
+def test_iter_messages_seeks_to_start(archive, monkeypatch):
+    monkeypatch.setattr(archive_module, "ARCHIVE_INDEX_INTERVAL", 2)
+    archive.append(messages(*[f"{i}.0" for i in range(1, 8)]))
+
+    assert len(archive.manifest["offsets"]) == 4
+    assert [m["ts"] for m in archive.iter_messages(start=5)] == ["6.0", "7.0"]
+
+
+def rich_messages():
+    sentiment = {"neg": 0.0, "neu": 0.508, "pos": 0.492, "compound": 0.8316}
+    return [
+        {
+            "ts": "1.0", "user": "U1", "author": "Ada", "is_internal": True, "text": "ship it :tada:",
+            "timestamp": "1", "trad_sentiment": sentiment, "thread_ts": "1.0",
+            "reply_messages": [
+                {"ts": "1.5", "author": "Bob", "is_internal": False, "text": "nice", "trad_sentiment": sentiment},
+            ],
+        },
+        {"ts": "2.0", "author": None, "text": "", "blocks": [{"type": "rich_text"}]},
+        {"ts": "3.0", "author": "Ada", "is_internal": False, "text": "héllo \u2603", "trad_sentiment": sentiment},
+    ]
+
+
+def test_append_interrupted_after_journaling_is_replayed(archive, tmp_path, monkeypatch):
+    archive.append(messages("1.0"))
+    monkeypatch.setattr(JsonlArchive, "_apply", MagicMock(side_effect=OSError("disk went away")))
+    with pytest.raises(OSError):
+        archive.append(messages("2.0", "3.0"))
+    monkeypatch.undo()
+    assert archive.journal_path.exists()
+
+    assert recover_archives(str(tmp_path)) == ["general.jsonl"]
+
+    reopened = JsonlArchive("general", directory=str(tmp_path))
+    assert (reopened.latest_ts, reopened.count) == (3.0, 3)
+    assert [m["ts"] for m in reopened.iter_messages()] == ["1.0", "2.0", "3.0"]
+    assert not archive.journal_path.exists()
+
+
+def test_torn_journal_and_partial_line_are_discarded(archive, tmp_path):
+    archive.append(messages("1.0", "2.0"))
+    archive.journal_path.write_text(json.dumps({"base_size": 0, "length": 100, "checksum": "x"}) + "\n{\"ts\"")
+    with open(archive.path, "a") as f:
+        f.write('{"ts": "3.0", "te')
+
+    reopened = JsonlArchive("general", directory=str(tmp_path))
+
+    assert (reopened.latest_ts, reopened.count) == (2.0, 2)
+    assert not archive.journal_path.exists()
+    assert archive.path.stat().st_size == reopened.manifest["size"]
+
+
+def test_appends_are_committed_in_journaled_batches(archive, monkeypatch):
+    monkeypatch.setattr(archive_module, "ARCHIVE_JOURNAL_BATCH_SIZE", 2)
+    commit = MagicMock(wraps=archive._commit)
+    monkeypatch.setattr(archive, "_commit", commit)
+
+    assert archive.append(messages("1.0", "2.0", "3.0")) == 3
+
+    assert [len(call.args[0]) for call in commit.call_args_list] == [2, 1]
+    assert [m["ts"] for m in archive.iter_messages()] == ["1.0", "2.0", "3.0"]
+
+
+def test_journal_creation_and_removal_are_made_durable(archive, monkeypatch):
+    """The directory is fsynced once the journal exists and again after it's unlinked."""
+    synced = []
+    monkeypatch.setattr(
+        archive_module, "fsync_directory", lambda path: synced.append((path, archive.journal_path.exists()))
+    )
+
+    archive.append(messages("1.0"))
+
+    assert synced == [(archive.directory, True), (archive.directory, False)]
+
+
+def test_columnar_segments_not_in_the_manifest_are_removed(tmp_path):
+    columnar = ColumnarArchive("general", directory=str(tmp_path))
+    columnar.append(rich_messages()[:1])
+    (columnar.path / "segment-000001.npz").write_bytes(b"half a segment")
+    (columnar.path / "segment-000002.npzabc.tmp").write_bytes(b"")
+
+    assert recover_archives(str(tmp_path)) == ["general.columnar"]
+
+    assert sorted(path.name for path in columnar.path.iterdir()) == ["manifest.json", "segment-000000.npz"]
+    assert [m["ts"] for m in ColumnarArchive("general", directory=str(tmp_path)).iter_messages()] == ["1.0"]
+
+
+def test_columnar_archive_round_trips_jsonl_messages(tmp_path, monkeypatch):
+    """JSONL -> columnar -> JSONL gives back the same messages, replies and scores included."""
+    monkeypatch.setattr(archive_module, "ARCHIVE_SEGMENT_SIZE", 2)
+    jsonl = JsonlArchive("general", directory=str(tmp_path))
+    jsonl.append(rich_messages())
+
+    columnar = ColumnarArchive("general", directory=str(tmp_path))
+    assert convert_archive(jsonl, columnar, batch_size=2) == 3
+    assert len(columnar.manifest["segments"]) == 2
+
+    reopened = ColumnarArchive("general", directory=str(tmp_path))
+    assert (reopened.latest_ts, reopened.count) == (3.0, 3)
+    assert list(reopened.iter_messages()) == rich_messages()
+    assert [m["ts"] for m in reopened.iter_messages(start=1)] == ["2.0", "3.0"]
+
+    back = JsonlArchive("copy", directory=str(tmp_path))
+    convert_archive(reopened, back)
+    assert list(back.iter_messages()) == rich_messages()
+
+
+def test_columnar_archive_keeps_empty_reply_lists(tmp_path):
+    message = {"ts": "1.0", "text": "thread without replies", "reply_messages": []}
+    columnar = ColumnarArchive("general", directory=str(tmp_path))
+    columnar.append([message])
+
+    assert list(ColumnarArchive("general", directory=str(tmp_path)).iter_messages()) == [message]
+
+
+def test_columnar_upload_file_is_only_rebuilt_after_an_append(tmp_path, monkeypatch):
+    columnar = ColumnarArchive("general", directory=str(tmp_path))
+    columnar.append(rich_messages()[:2])
+    read = MagicMock(wraps=columnar.read)
+    monkeypatch.setattr(columnar, "read", read)
+
+    bundle, _ = columnar.get_upload_file()
+    assert columnar.get_upload_file()[0] == bundle
+    assert read.call_count == 1
+
+    columnar.append(rich_messages()[2:])
+    columnar.get_upload_file()
+    assert read.call_count == 2
+    assert np.load(bundle)["ts_ends"].size == 4
+
+
+def test_columnar_archive_reads_only_the_requested_columns(tmp_path):
+    columnar = ColumnarArchive("general", directory=str(tmp_path))
+    columnar.append(rich_messages())
+    assert columnar.append(rich_messages()[:1]) == 0
+
+    data = columnar.read(["ts", "parent_ts", "sentiment_compound"])
+
+    assert set(data) == {"ts", "parent_ts", "sentiment_compound"}
+    assert data["ts"] == ["1.0", "1.5", "2.0", "3.0"]
+    assert data["parent_ts"] == ["", "1.0", "", ""]
+    assert data["sentiment_compound"].dtype.name == "float32"
+    with pytest.raises(ValueError):
+        columnar.read(["reactions"])
+
+
+@pytest.mark.asyncio
+async def test_sync_only_fetches_threads_whose_latest_reply_advanced(archive, tmp_path):
+    """Replies to already archived threads are recorded as updates; quiet threads aren't fetched again."""
+    slack_context = MagicMock()
+    parent = {"ts": "1.0", "text": "thread", "latest_reply": "1.5"}
+    quiet = {"ts": "2.0", "text": "quiet thread", "latest_reply": "2.5"}
+    slack_context.iter_channel_history = history_pages([quiet, parent])
+    slack_context.get_rich_parsed_messages = AsyncMock(
+        side_effect=lambda msgs, **kwargs: [
+            {**msg, "reply_messages": [{"ts": f"{msg['ts'][0]}.5", "text": "first reply"}]} for msg in msgs
+        ]
+    )
+    assert await sync_channel_archive(slack_context, "C123", archive) == (2, 0)
+
+    parent_with_new_reply = {**parent, "latest_reply": "3.0"}
+    slack_context.iter_channel_history = history_pages([{"ts": "4.0", "text": "new"}, quiet, parent_with_new_reply])
+    slack_context.get_rich_parsed_messages = AsyncMock(
+        side_effect=[
+            [{**parent_with_new_reply, "reply_messages": [{"ts": "1.5", "text": "first reply"}, {"ts": "3.0", "text": "late reply"}]}],
+            [{"ts": "4.0", "text": "new"}],
+        ]
+    )
+
+    assert await sync_channel_archive(slack_context, "C123", archive) == (1, 1)
+    assert slack_context.get_rich_parsed_messages.await_args_list[0].args[0] == [parent_with_new_reply]
+
+    thread_updates = ThreadUpdates("general", directory=str(tmp_path))
+    [record] = read_records(thread_updates)
+    assert (record["parent_ts"], record["latest_reply"]) == ("1.0", "3.0")
+    assert [reply["text"] for reply in record["reply_messages"]] == ["late reply"]
+    assert [m["ts"] for m in archive.iter_messages()] == ["1.0", "2.0", "4.0"]
+    assert thread_updates.load_index(archive)["1.0"] == "3.0"
+
+
+@pytest.mark.asyncio
+async def test_sync_parses_history_page_by_page_and_appends_oldest_first(archive):
+    slack_context = MagicMock()
+    slack_context.iter_channel_history = history_pages(messages("4.0", "3.0"), messages("2.0", "1.0"))
+    parsed_pages = []
+    slack_context.get_rich_parsed_messages = AsyncMock(
+        side_effect=lambda msgs, **kwargs: parsed_pages.append([m["ts"] for m in msgs]) or msgs
+    )
+    on_fetch = AsyncMock()
+
+    assert await sync_channel_archive(slack_context, "C123", archive, on_fetch=on_fetch) == (4, 0)
+
+    assert parsed_pages == [["3.0", "4.0"], ["1.0", "2.0"]]  # one page at a time
+    assert [m["ts"] for m in archive.iter_messages()] == ["1.0", "2.0", "3.0", "4.0"]
+    on_fetch.assert_awaited_once_with()
+
+
+@pytest.mark.asyncio
+async def test_sync_does_its_file_io_off_the_event_loop(archive, monkeypatch):
+    loop_thread = threading.current_thread()
+    io_threads = []
+
+    def on_thread(function):
+        return lambda *args: io_threads.append(threading.current_thread()) or function(*args)
+
+    for method in ("refresh", "append"):
+        monkeypatch.setattr(archive, method, on_thread(getattr(archive, method)))
+    for method in ("load_index", "track"):
+        monkeypatch.setattr(ThreadUpdates, method, on_thread(getattr(ThreadUpdates, method)))
+    slack_context = MagicMock()
+    slack_context.iter_channel_history = history_pages(messages("1.0"))
+    slack_context.get_rich_parsed_messages = AsyncMock(side_effect=lambda msgs, **kwargs: msgs)
+
+    await sync_channel_archive(slack_context, "C123", archive)
+
+    assert len(io_threads) >= 4
+    assert loop_thread not in io_threads
+
+
+@pytest.mark.asyncio
+async def test_replies_that_failed_to_fetch_are_retried_on_the_next_sync(archive, tmp_path, monkeypatch):
+    """A thread whose replies couldn't be fetched isn't marked as seen, even once it's past the lookback."""
+    monkeypatch.setattr(archive_module, "ARCHIVE_THREAD_LOOKBACK_DAYS", 0)
+    slack_context = MagicMock()
+    parent = {"ts": "1.0", "text": "thread", "latest_reply": "1.5"}
+    slack_context.iter_channel_history = history_pages([parent])
+    slack_context.get_rich_parsed_messages = AsyncMock(
+        side_effect=lambda msgs, **kwargs: [{**msg, "replies_incomplete": True} for msg in msgs]
+    )
+    assert await sync_channel_archive(slack_context, "C123", archive) == (1, 0)
+
+    def load_index():
+        return ThreadUpdates("general", directory=str(tmp_path)).load_index(archive)
+
+    assert load_index() == {"1.0": ThreadUpdates.PENDING_REPLIES}
+
+    # still rate limited: the thread stays pending
+    slack_context.iter_channel_history = history_pages([parent])
+    assert await sync_channel_archive(slack_context, "C123", archive) == (0, 0)
+    assert slack_context.iter_channel_history.call_args.kwargs["since_ts"] < 1.0
+    assert load_index() == {"1.0": ThreadUpdates.PENDING_REPLIES}
+    assert not ThreadUpdates("general", directory=str(tmp_path)).has_records()
+
+    slack_context.get_rich_parsed_messages = AsyncMock(
+        side_effect=lambda msgs, **kwargs: [{**msg, "reply_messages": [{"ts": "1.5", "text": "reply"}]} for msg in msgs]
+    )
+    assert await sync_channel_archive(slack_context, "C123", archive) == (0, 1)
+
+    assert load_index() == {"1.0": "1.5"}
+    [record] = read_records(ThreadUpdates("general", directory=str(tmp_path)))
+    assert [reply["text"] for reply in record["reply_messages"]] == ["reply"]
+
+
+@pytest.mark.asyncio
+async def test_sync_reads_the_thread_index_once_and_only_writes_updates_when_there_are_some(archive, tmp_path, monkeypatch):
+    archive.append([{"ts": "1.0", "text": "thread", "latest_reply": "1.5"}])
+    ThreadUpdates("general", directory=str(tmp_path)).load_index(archive)  # builds the index file
+    slack_context = MagicMock()
+    slack_context.iter_channel_history = history_pages(messages("3.0"), [{"ts": "1.0", "text": "thread", "latest_reply": "1.5"}])
+    slack_context.get_rich_parsed_messages = AsyncMock(side_effect=lambda msgs, **kwargs: msgs)
+    index_reads = []
+    load = json.load
+    monkeypatch.setattr(archive_module.json, "load", lambda f: index_reads.append(f.name) or load(f))
+
+    assert await sync_channel_archive(slack_context, "C123", archive) == (1, 0)
+
+    assert [name for name in index_reads if name.endswith(".threads.json")] == [str(tmp_path / "general.threads.json")]
+    assert not (tmp_path / "general.thread_updates.jsonl").exists()
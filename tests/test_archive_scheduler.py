@@ -0,0 +1,96 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+from ossai.archive_scheduler import ArchiveScheduler
+
+
+@pytest.fixture
+def slack_context():
+    mock = MagicMock()
+    mock.get_is_private_and_channel_name = AsyncMock(return_value=(False, "general"))
+    return mock
+
+
+def ratelimited(retry_after="7"):
+    response = MagicMock(status_code=429, headers={"Retry-After": retry_after})
+    response.get.return_value = "ratelimited"
+    return SlackApiError("ratelimited", response)
+
+
+@pytest.mark.asyncio
+@patch("ossai.archive_scheduler.get_archive")
+@patch("ossai.archive_scheduler.sync_channel_archive")
+async def test_run_records_status_of_a_successful_sync(sync_mock, get_archive_mock, slack_context):
+    sync_mock.return_value = (12, 3)
+    scheduler = ArchiveScheduler(slack_context, ["C123"], sleep=AsyncMock())
+
+    assert await scheduler.run("C123") == (12, 3)
+
+    get_archive_mock.assert_called_once_with("general")
+    status = scheduler.stats()["channels"]["C123"]
+    assert status["state"] == "idle"
+    assert (status["runs"], status["failures"], status["last_new_messages"]) == (1, 0, 12)
+    assert status["last_duration_seconds"] >= 0
+
+
+@pytest.mark.asyncio
+@patch("ossai.archive_scheduler.get_archive")
+@patch("ossai.archive_scheduler.sync_channel_archive")
+async def test_run_backs_off_for_retry_after_when_rate_limited(sync_mock, get_archive_mock, slack_context):
+    sync_mock.side_effect = [ratelimited("7"), RuntimeError("boom"), (1, 0)]
+    clock = [100.0]
+
+    async def advance(seconds):
+        clock[0] += seconds
+
+    sleep = AsyncMock(side_effect=advance)
+    scheduler = ArchiveScheduler(slack_context, ["C123"], backoff=2, sleep=sleep)
+
+    with patch("ossai.archive_scheduler.time.monotonic", side_effect=lambda: clock[0]):
+        assert await scheduler.run("C123") == (1, 0)
+
+    assert [c.args[0] for c in sleep.await_args_list] == [7.0, 4]  # Retry-After, then 2 * 2**1
+    assert sync_mock.await_count == 3
+
+
+@pytest.mark.asyncio
+@patch("ossai.archive_scheduler.get_archive")
+@patch("ossai.archive_scheduler.sync_channel_archive")
+async def test_run_gives_up_after_max_retries(sync_mock, get_archive_mock, slack_context):
+    sync_mock.side_effect = RuntimeError("boom")
+    scheduler = ArchiveScheduler(slack_context, ["C123"], max_retries=1, sleep=AsyncMock())
+
+    assert await scheduler.run("C123") is None
+
+    status = scheduler.stats()["channels"]["C123"]
+    assert (status["state"], status["failures"], status["last_error"]) == ("failed", 1, "boom")
+
+
+@pytest.mark.asyncio
+@patch("ossai.archive_scheduler.get_archive")
+@patch("ossai.archive_scheduler.sync_channel_archive")
+async def test_workers_drain_the_queue_within_the_concurrency_limit(sync_mock, get_archive_mock, slack_context):
+    running, peak = 0, 0
+
+    async def sync(*args):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return (0, 0)
+
+    sync_mock.side_effect = sync
+    scheduler = ArchiveScheduler(slack_context, ["C1", "C2", "C3", "C4"], interval=3600, concurrency=2, jitter=0)
+    scheduler.start()
+    await asyncio.sleep(0)
+    assert not scheduler.enqueue("C1")  # already queued by the first round
+    await asyncio.wait_for(scheduler._queue.join(), timeout=1)
+    await scheduler.stop()
+
+    assert sync_mock.await_count == 4
+    assert peak == 2
+    assert all(status["state"] == "idle" for status in scheduler.stats()["channels"].values())
@@ -1,14 +1,16 @@
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 import uuid
 import pytest
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
 from datetime import datetime, timezone, date
 from ossai.slack_context import SlackContext
 
 from ossai.handlers import (
     handler_sandbox_slash_command,
     handler_shortcuts,
+    handler_tldr_archive_slash_command_experimental,
     handler_tldr_extended_slash_command,
     handler_topics_slash_command,
     handler_feedback,
@@ -18,18 +20,34 @@ from ossai.handlers import (
 )
 
 
+def history_pages(*pages):
+    """Mock `SlackContext.iter_channel_history` yielding `pages` (each newest first, like Slack)."""
+
+    async def iter_channel_history(channel_id, **kwargs):
+        for page in pages:
+            yield list(page)
+
+    return MagicMock(side_effect=iter_channel_history)
+
+
 @pytest.fixture
 def mock_slack_context():
     mock = MagicMock(spec=SlackContext)
     mock.get_bot_id = AsyncMock(return_value="B12345")
     mock.get_channel_history = AsyncMock(return_value=[])
+    mock.iter_channel_history = history_pages()
     mock.get_direct_message_channel_id = AsyncMock(return_value="D12345")
-    mock.get_is_private_and_channel_name = MagicMock(return_value=(False, "general"))
-    mock.get_name_from_id = MagicMock(return_value="John Doe")
-    mock.get_parsed_messages = MagicMock(return_value=["John: Hello", "Jane: Hi"])
+    mock.get_is_private_and_channel_name = AsyncMock(return_value=(False, "general"))
+    mock.get_name_from_id = AsyncMock(return_value="John Doe")
+    mock.get_parsed_messages = AsyncMock(return_value=["John: Hello", "Jane: Hi"])
     mock.get_user_context = AsyncMock(return_value={"name": "John", "title": "Developer"})
-    mock.get_workspace_name = MagicMock(return_value="My Workspace")
-    mock.client = AsyncMock(spec=WebClient)
+    mock.get_workspace_name = AsyncMock(return_value="My Workspace")
+    mock.client = AsyncMock(spec=AsyncWebClient)
+
+    async def get_thread_messages(channel_id, thread_ts):
+        return await mock.client.conversations_replies(channel=channel_id, ts=thread_ts)
+
+    mock.get_thread_messages = AsyncMock(side_effect=get_thread_messages)
     return mock
 
 
@@ -119,13 +137,41 @@ async def test_handler_topics_slash_command(
     say,
 ):
     mock_slack_context.get_direct_message_channel_id.return_value = "dm_channel_id"
-    mock_slack_context.get_channel_history.return_value = ["message1", "message2", "message3"]
-    mock_slack_context.get_parsed_messages.return_value = "parsed_messages"
+    mock_slack_context.iter_channel_history = history_pages(
+        [{"ts": "3.0", "text": "message3"}, {"ts": "2.0", "text": "message2", "edited": {"ts": "4.0"}}],
+        [{"ts": "1.0", "text": "message1"}],
+    )
+    mock_slack_context.get_parsed_messages.side_effect = lambda msgs, **kwargs: [msg["text"] for msg in msgs]
     analyze_topics_of_history_mock.return_value = ("topic_overview", str(uuid.uuid4()))
     await handler_topics_slash_command(
         mock_slack_context, AsyncMock(), payload, say, user_id="foo123"
     )
     say.assert_called()
+    # parsed page by page, then handed over oldest first
+    assert mock_slack_context.get_parsed_messages.await_count == 2
+    assert analyze_topics_of_history_mock.call_args.args[1] == ["message1", "message2", "message3"]
+    assert analyze_topics_of_history_mock.call_args.kwargs["message_keys"] == ["1.0:", "2.0:4.0", "3.0:"]
+
+
+@pytest.mark.asyncio
+@patch("ossai.handlers.analyze_topics_of_history")
+async def test_handler_topics_slash_command_when_topic_analysis_is_busy(
+    analyze_topics_of_history_mock,
+    mock_slack_context,
+    payload,
+    say,
+):
+    from ossai.topic_analysis import TopicAnalysisBusyError
+
+    mock_slack_context.get_direct_message_channel_id.return_value = "dm_channel_id"
+    analyze_topics_of_history_mock.side_effect = TopicAnalysisBusyError("busy")
+
+    await handler_topics_slash_command(mock_slack_context, AsyncMock(), payload, say, user_id="foo123")
+
+    say.assert_awaited_with(
+        channel="dm_channel_id",
+        text="Sorry, I'm busy preparing other channel overviews right now. Please try again in a minute.",
+    )
 
 
 @pytest.mark.asyncio
@@ -148,6 +194,7 @@ async def test_handler_shortcuts(
 
     # Mock Summarizer instance
     summarizer_instance_mock = summarizer_mock.return_value
+    summarizer_instance_mock.summarize_slack_messages = AsyncMock()
     summarizer_instance_mock.summarize_slack_messages.return_value = (["summary"], run_id)
 
     expected_blocks = [
@@ -197,10 +244,45 @@ async def test_handler_shortcuts(
         "channel_id",
         feature_name="summarize_thread",
         user={"user": "info"},
+        on_update=None,
     )
     mock_slack_context.get_user_context.assert_called_once_with("foo123")
 
 
+@pytest.mark.asyncio
+@patch("ossai.handlers.STREAM_SUMMARIES", True)
+@patch("ossai.handlers.Summarizer")
+async def test_handler_shortcuts_streams_into_placeholder(
+    summarizer_mock,
+    mock_slack_context,
+    shortcuts_payload,
+):
+    """In streaming mode the "..." placeholder is edited as the summary arrives, then replaced with it."""
+    say = AsyncMock(return_value={"ok": True, "channel": "dm_channel_id", "ts": "123.456"})
+    mock_slack_context.get_direct_message_channel_id.return_value = "dm_channel_id"
+    mock_slack_context.client.conversations_replies.return_value = {
+        "ok": True,
+        "messages": [{"text": "test message"}],
+    }
+    mock_slack_context.get_workspace_name.return_value = "workspace_name"
+    mock_slack_context.get_user_context.return_value = {"user": "info"}
+
+    async def summarize_slack_messages(*args, on_update=None, **kwargs):
+        await on_update("- partial")
+        return ["- partial summary"], "run_id"
+
+    summarizer_mock.return_value.summarize_slack_messages = summarize_slack_messages
+
+    await handler_shortcuts(mock_slack_context, True, shortcuts_payload, say, user_id="foo123")
+
+    say.assert_awaited_once_with(channel="dm_channel_id", text="...")
+    updates = mock_slack_context.client.chat_update.await_args_list
+    assert len(updates) == 2
+    assert updates[0].kwargs["text"].endswith("- partial ...")
+    assert updates[1].kwargs["ts"] == "123.456"
+    assert updates[1].kwargs["blocks"][1]["text"]["text"] == "- partial summary"
+
+
 @pytest.mark.asyncio
 async def test_handler_tldr_extended_slash_command_public(
     mock_slack_context, say
@@ -218,7 +300,7 @@ async def test_handler_tldr_extended_slash_command_public(
     say.assert_called()
 
 
-@patch("ossai.handlers.Client")
+@patch("langsmith.Client")
 @patch("os.environ.get")
 def test_handler_feedback_not_helpful_button(env_get_mock, client_mock):
     # Arrange
@@ -239,7 +321,7 @@ def test_handler_feedback_not_helpful_button(env_get_mock, client_mock):
     )
 
 
-@patch("ossai.handlers.Client")
+@patch("langsmith.Client")
 @patch("os.environ.get")
 def test_handler_feedback_helpful_button(env_get_mock, client_mock):
     # Arrange
@@ -260,7 +342,7 @@ def test_handler_feedback_helpful_button(env_get_mock, client_mock):
     )
 
 
-@patch("ossai.handlers.Client")
+@patch("langsmith.Client")
 @patch("os.environ.get")
 def test_handler_feedback_very_helpful_button(env_get_mock, client_mock):
     # Arrange
@@ -317,22 +399,22 @@ async def test_handler_shortcuts_channel_not_found_error(
 
 
 @pytest.mark.asyncio
+@patch("ossai.handlers.STREAM_SUMMARIES", False)  # the placeholder is replaced in one go
+@patch("ossai.handlers.summarize_channel_incrementally", new_callable=AsyncMock)
 @patch("ossai.handlers.Summarizer")
 @patch("ossai.handlers.get_text_and_blocks_for_say")
 async def test_handler_tldr_extended_slash_command_non_public(
     get_text_and_blocks_for_say_mock,
     summarizer_mock,
+    summarize_incrementally_mock,
     mock_slack_context,
 ):
     # Setup
     say = AsyncMock()
     mock_slack_context.get_direct_message_channel_id.return_value = "DM123"
-    mock_slack_context.get_channel_history.return_value = ["message1", "message2"]
     mock_slack_context.get_user_context.return_value = {"user": "info"}
-    
-    summarizer_instance_mock = summarizer_mock.return_value
-    summarizer_instance_mock.summarize_slack_messages.return_value = ("summary", "run_id")
-    
+    summarize_incrementally_mock.return_value = (["summary"], "run_id", 2)
+
     get_text_and_blocks_for_say_mock.return_value = ("text", "blocks")
 
     # Execute
@@ -353,16 +435,27 @@ async def test_handler_tldr_extended_slash_command_non_public(
     say.assert_called_with(channel="DM123", text="text", blocks="blocks")
     mock_slack_context.get_direct_message_channel_id.assert_called_once_with("U123")
     summarizer_mock.assert_called_once()
-    summarizer_instance_mock.summarize_slack_messages.assert_called_once_with(
-        ["message2", "message1"],
+    summarize_incrementally_mock.assert_awaited_once_with(
+        summarizer_mock.return_value,
         "C123",
         feature_name="summarize_channel_messages",
         user={"user": "info"},
+        is_private=False,
+        channel_name="general",
+        on_update=None,
+    )
+    mock_slack_context.get_is_private_and_channel_name.assert_awaited_once_with("C123")
+    get_text_and_blocks_for_say_mock.assert_called_once_with(
+        title="*Summary of #general* (last 2 messages)\n",
+        run_id="run_id",
+        messages=["summary"],
+        custom_prompt=None,
     )
 
 
 
 @pytest.mark.asyncio
+@patch("ossai.handlers.STREAM_SUMMARIES", False)  # the placeholder is replaced in one go
 @patch("ossai.handlers.datetime")
 @patch("ossai.handlers.Summarizer")
 @patch("ossai.handlers.get_text_and_blocks_for_say")
@@ -388,11 +481,17 @@ async def test_handler_action_summarize_since_date(
         "response_url": "http://example.com/response",
     }
     mock_slack_context.get_direct_message_channel_id.return_value = "DM123"
-    mock_slack_context.get_channel_history.return_value = ["message1", "message2"]
+    mock_slack_context.iter_channel_history = history_pages(["message2", "message1"])
     mock_slack_context.get_user_context.return_value = {"user": "info"}
     
     summarizer_instance_mock = summarizer_mock.return_value
-    summarizer_instance_mock.summarize_slack_messages.return_value = ("summary", "run_id")
+    pages_summarized = []
+
+    async def summarize_history_pages(pages, *args, **kwargs):
+        pages_summarized.extend([page async for page in pages])
+        return "summary", "run_id", 2
+
+    summarizer_instance_mock.summarize_history_pages = AsyncMock(side_effect=summarize_history_pages)
     
     get_text_and_blocks_for_say_mock.return_value = ("text", "blocks")
 
@@ -407,17 +506,19 @@ async def test_handler_action_summarize_since_date(
     ack.assert_called_once()
     mock_slack_context.get_direct_message_channel_id.assert_called_once_with("U123")
     datetime_mock.fromtimestamp.assert_called_once_with(1676955600)
-    mock_slack_context.get_channel_history.assert_called_once_with(
+    mock_slack_context.iter_channel_history.assert_called_once_with(
         "C123", since=mocked_date.date()
     )
     mock_slack_context.get_user_context.assert_called_once_with("U123")
     summarizer_mock.assert_called_once()
-    summarizer_instance_mock.summarize_slack_messages.assert_called_once_with(
-        ["message2", "message1"],
+    summarizer_instance_mock.summarize_history_pages.assert_called_once_with(
+        ANY,
         "C123",
         feature_name="summarize_since_preset",
         user={"user": "info"},
+        on_update=None,
     )
+    assert pages_summarized == [["message2", "message1"]]
     get_text_and_blocks_for_say_mock.assert_called_once_with(
         title="*Summary of #general* since Tuesday Feb 21, 2023 (2 messages)\n",
         run_id="run_id",
@@ -671,14 +772,14 @@ async def test_handler_action_summarize_since_date_with_selected_date(
         "response_url": "http://example.com/response",
     }
     mock_slack_context.get_direct_message_channel_id.return_value = "DM123"
-    mock_slack_context.get_channel_history.return_value = []
+    mock_slack_context.client.chat_postMessage.return_value = {"ok": True, "channel": "DM123", "ts": "1.0"}
     mock_slack_context.get_user_context.return_value = {}
-    summarizer_mock.return_value.summarize_slack_messages.return_value = ("summary", "run_id")
+    summarizer_mock.return_value.summarize_history_pages = AsyncMock(return_value=("summary", "run_id", 0))
     get_text_and_blocks_for_say_mock.return_value = ("text", "blocks")
 
     await handler_action_summarize_since_date(mock_slack_context, ack, body)
 
-    mock_slack_context.get_channel_history.assert_called_once_with(
+    mock_slack_context.iter_channel_history.assert_called_once_with(
         "C123", since=date(2024, 1, 15)
     )
     # No container in body, so custom_prompt should be None
@@ -713,9 +814,9 @@ async def test_handler_action_summarize_since_date_custom_prompt_cache_hit(
             "container": {"message_ts": "TS42"},
         }
         mock_slack_context.get_direct_message_channel_id.return_value = "DM123"
-        mock_slack_context.get_channel_history.return_value = []
+        mock_slack_context.client.chat_postMessage.return_value = {"ok": True, "channel": "DM123", "ts": "1.0"}
         mock_slack_context.get_user_context.return_value = {}
-        summarizer_mock.return_value.summarize_slack_messages.return_value = ("summary", "run_id")
+        summarizer_mock.return_value.summarize_history_pages = AsyncMock(return_value=("summary", "run_id", 0))
         get_text_and_blocks_for_say_mock.return_value = ("text", "blocks")
 
         await handler_action_summarize_since_date(mock_slack_context, ack, body)
@@ -724,3 +825,59 @@ async def test_handler_action_summarize_since_date_custom_prompt_cache_hit(
         assert kwargs.get("custom_prompt") == "summarize in haiku"
     finally:
         _custom_prompt_cache.pop("TS42__U123", None)
+
+
+@pytest.mark.asyncio
+async def test_handler_tldr_archive_fetches_since_the_archived_ts(mock_slack_context, payload, say, tmp_path):
+    """The archive's manifest supplies the starting ts, and only newer messages are appended."""
+    from ossai.archive import JsonlArchive
+
+    archive = JsonlArchive("channel_name", directory=str(tmp_path))
+    archive.append([{"ts": "1.0", "text": "old"}])
+    since = []
+
+    async def iter_channel_history(channel_id, since_ts=None):
+        since.append((channel_id, since_ts))
+        yield [{"ts": "2.0", "text": "new"}, {"ts": "1.0", "text": "old"}]
+
+    mock_slack_context.iter_channel_history = MagicMock(side_effect=iter_channel_history)
+    mock_slack_context.get_rich_parsed_messages = AsyncMock(side_effect=lambda msgs, **kwargs: msgs)
+    mock_slack_context.client.files_upload_v2.return_value = {"files": [{"permalink": "https://files/1"}]}
+
+    with patch("ossai.handlers.get_archive", return_value=archive):
+        await handler_tldr_archive_slash_command_experimental(
+            mock_slack_context, AsyncMock(), payload, say, user_id="foo123"
+        )
+
+    assert since == [("channel_id", 1.0)]
+    assert JsonlArchive("channel_name", directory=str(tmp_path)).count == 2
+    text = mock_slack_context.client.chat_postEphemeral.await_args.kwargs["text"]
+    assert text == "Saved 1 new messages to #channel_name history (total: 2 messages archived)"
+
+
+
+@pytest.mark.asyncio
+async def test_handler_tldr_archive_uploads_an_empty_history_for_an_empty_channel(
+    mock_slack_context, payload, say, tmp_path
+):
+    from ossai.archive import JsonlArchive
+
+    archive = JsonlArchive("channel_name", directory=str(tmp_path))
+
+    async def iter_channel_history(channel_id, since_ts=None):
+        yield []
+
+    mock_slack_context.iter_channel_history = MagicMock(side_effect=iter_channel_history)
+    mock_slack_context.get_rich_parsed_messages = AsyncMock(side_effect=lambda msgs, **kwargs: msgs)
+    mock_slack_context.client.files_upload_v2.return_value = {"files": [{"permalink": "https://files/1"}]}
+
+    with patch("ossai.handlers.get_archive", return_value=archive):
+        await handler_tldr_archive_slash_command_experimental(
+            mock_slack_context, AsyncMock(), payload, say, user_id="foo123"
+        )
+
+    [upload] = mock_slack_context.client.files_upload_v2.await_args.kwargs["file_uploads"]
+    assert upload["file"] == str(archive.path)
+    assert archive.path.exists() and archive.path.stat().st_size == 0
+    text = mock_slack_context.client.chat_postEphemeral.await_args.kwargs["text"]
+    assert text == "Saved 0 new messages to #channel_name history (total: 0 messages archived)"
@@ -2,7 +2,7 @@
 Integration tests that make real API calls. Requires OPENAI_API_KEY to be set.
 Run with: pytest -m integration
 """
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
@@ -12,9 +12,10 @@ from ossai.summarizer import Summarizer
 @pytest.fixture
 def slack_context():
     mock = MagicMock()
-    mock.get_is_private_and_channel_name.return_value = (False, "engineering")
+    mock.get_is_private_and_channel_name = AsyncMock(return_value=(False, "engineering"))
     mock.workspace_name = "test-workspace"
     # Return messages formatted as "username: text", mirroring SlackContext.get_parsed_messages
+    mock.get_parsed_messages = AsyncMock()
     mock.get_parsed_messages.side_effect = lambda messages, **kwargs: [
         f"{m['username']}: {m['text']}" for m in messages
     ]
@@ -22,7 +23,8 @@ def slack_context():
 
 
 @pytest.mark.integration
-def test_summarize_slack_messages_includes_topic(slack_context):
+@pytest.mark.asyncio
+async def test_summarize_slack_messages_includes_topic(slack_context):
     """Verify the summarizer correctly identifies the topic of a conversation.
 
     The conversation is unambiguously about migrating from MongoDB to PostgreSQL.
@@ -42,7 +44,7 @@ def test_summarize_slack_messages_includes_topic(slack_context):
     ]
 
     summarizer = Summarizer(slack_context)
-    result, run_id = summarizer.summarize_slack_messages(
+    result, run_id = await summarizer.summarize_slack_messages(
         messages,
         channel_id="C123",
         feature_name="integration_test",
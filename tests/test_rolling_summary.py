@@ -0,0 +1,112 @@
+from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID, uuid4
+
+import pytest
+
+from ossai.rolling_summary import RollingSummaryStore, summarize_channel_incrementally
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RollingSummaryStore(directory=str(tmp_path))
+
+
+def history_pages(*pages):
+    """Mock `SlackContext.iter_channel_history` yielding `pages` (each newest first, like Slack)."""
+
+    async def iter_channel_history(channel_id, since_ts=None):
+        for page in pages:
+            yield list(page)
+
+    return MagicMock(side_effect=iter_channel_history)
+
+
+def summaries(*results):
+    """Mock `Summarizer.summarize_history_pages`, recording the pages it consumed in `.pages`."""
+
+    async def summarize_history_pages(pages, *args, **kwargs):
+        consumed = [page async for page in pages]
+        mock.pages.append(consumed)
+        text, run_id = next(returns)
+        return text, run_id, sum(len(page) for page in consumed)
+
+    returns = iter(results)
+    mock = AsyncMock(side_effect=summarize_history_pages)
+    mock.pages = []
+    return mock
+
+
+@pytest.fixture
+def summarizer():
+    mock = MagicMock()
+    mock.custom_prompt = None
+    mock.slack_context.iter_channel_history = history_pages()
+    mock.slack_context.get_is_private_and_channel_name = AsyncMock(return_value=(False, "general"))
+    mock.summarize_history_pages = summaries()
+    mock.amerge_summaries = AsyncMock(return_value=("- old and new", "run_merge"))
+    return mock
+
+
+@pytest.mark.asyncio
+async def test_summarize_channel_incrementally_only_summarizes_new_messages(summarizer, store):
+    """The second run fetches messages since the stored ts and merges their summary into the rollup."""
+    summarizer.slack_context.iter_channel_history = history_pages([{"ts": "3.0"}, {"ts": "2.0"}], [{"ts": "1.0"}])
+    summarizer.summarize_history_pages = summaries((["- old"], "run_1"), (["- new"], "run_2"))
+
+    summary, run_id, count = await summarize_channel_incrementally(
+        summarizer, "C123", "unit_test", {}, False, "general", store=store
+    )
+
+    assert (summary, run_id, count) == (["- old"], "run_1", 3)
+    summarizer.amerge_summaries.assert_not_awaited()
+    # Slack's oldest bound is inclusive, so the stored latest message comes back and is filtered out
+    summarizer.slack_context.iter_channel_history = history_pages([{"ts": "5.0"}, {"ts": "4.0"}, {"ts": "3.0"}])
+
+    summary, run_id, count = await summarize_channel_incrementally(
+        summarizer, "C123", "unit_test", {}, False, "general", store=store
+    )
+
+    assert (summary, run_id, count) == (["- old and new"], "run_merge", 5)
+    summarizer.slack_context.iter_channel_history.assert_called_with("C123", since_ts="3.0")
+    assert summarizer.summarize_history_pages.pages[-1] == [[{"ts": "5.0"}, {"ts": "4.0"}]]
+    summarizer.amerge_summaries.assert_awaited_once()
+    assert summarizer.amerge_summaries.await_args.args[0] == ["- old", "- new"]
+    # the caller already looked up the channel, so neither step repeats it
+    summarizer.slack_context.get_is_private_and_channel_name.assert_not_awaited()
+    assert summarizer.summarize_history_pages.await_args.kwargs["channel_name"] == "general"
+
+    state = store.load("C123")
+    assert state["latest_ts"] == "5.0"
+    assert [(c["oldest_ts"], c["latest_ts"]) for c in state["chunks"]] == [("1.0", "3.0"), ("4.0", "5.0")]
+
+
+@pytest.mark.asyncio
+async def test_summarize_channel_incrementally_reuses_rollup_without_new_messages(summarizer, store):
+    """With nothing new in the channel, the stored summary is returned without calling the LLM."""
+    run_id = uuid4()
+    store.save(
+        {"channel_id": "C123", "custom_prompt": None, "latest_ts": "3.0", "message_count": 3,
+         "rollup": "- stored", "run_id": str(run_id), "chunks": []}
+    )
+    summarizer.slack_context.iter_channel_history = history_pages([{"ts": "3.0"}])
+
+    result = await summarize_channel_incrementally(summarizer, "C123", "unit_test", {}, False, "general", store=store)
+
+    # the stored run ID comes back as a UUID, like a fresh summary's
+    assert result == (["- stored"], run_id, 3)
+    assert isinstance(result[1], UUID)
+    summarizer.summarize_history_pages.assert_not_awaited()
+    assert store.load("C123", custom_prompt="Use emoji") is None
+
+
+@pytest.mark.asyncio
+async def test_summarize_channel_incrementally_keeps_private_channels_off_disk(summarizer, store, tmp_path):
+    summarizer.slack_context.iter_channel_history = history_pages([{"ts": "2.0"}, {"ts": "1.0"}])
+    summarizer.summarize_history_pages = summaries((["- private"], "run_1"))
+
+    await summarize_channel_incrementally(summarizer, "C123", "unit_test", {}, True, "secret", store=store)
+
+    assert list(tmp_path.iterdir()) == []
+    assert store.load("C123")["rollup"] == "- private"
+    assert store.clear("C123")
+    assert store.load("C123") is None
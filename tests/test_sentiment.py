@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from ossai.sentiment import get_traditional_sentiment, _get_analyzer
+from ossai.utils.cache import TTLCache
+from ossai.sentiment import get_traditional_sentiment, get_traditional_sentiments, _get_analyzer
 
 
 class TestSentiment:
@@ -75,8 +76,8 @@ class TestSentiment:
         score_sum = result['neg'] + result['neu'] + result['pos']
         assert abs(score_sum - 1.0) < 0.001  # Allow for small floating point errors
 
-    @patch("ossai.sentiment.nltk.download")
-    @patch("ossai.sentiment.SentimentIntensityAnalyzer")
+    @patch("nltk.download")
+    @patch("nltk.sentiment.SentimentIntensityAnalyzer")
     def test_get_analyzer_downloads_vader_on_lookup_error(self, mock_sia_class, mock_download, monkeypatch):
         """The LookupError path triggers an nltk download and retries initialization."""
         monkeypatch.setattr("ossai.sentiment._sia", None)
@@ -97,4 +98,32 @@ class TestSentiment:
 
         result = get_traditional_sentiment("some valid text")
 
-        assert result == {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
\ No newline at end of file
+        assert result == {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
+
+    @patch("ossai.sentiment._get_analyzer")
+    def test_get_traditional_sentiments_scores_each_distinct_text_once(self, mock_get_analyzer, monkeypatch):
+        """Duplicates within a batch and texts seen in earlier batches aren't scored again."""
+        monkeypatch.setattr("ossai.sentiment._memo", TTLCache(maxsize=100, ttl=float("inf")))
+        mock_analyzer = MagicMock()
+        mock_analyzer.polarity_scores.side_effect = lambda text: {'neg': 0.0, 'neu': 0.5, 'pos': 0.5, 'compound': len(text) / 10}
+        mock_get_analyzer.return_value = mock_analyzer
+
+        first = get_traditional_sentiments(["+1", "great work", "+1", "", "+1"])
+        second = get_traditional_sentiments(["great work", "thanks"])
+
+        assert [scores['compound'] for scores in first] == [0.2, 1.0, 0.2, 0.0, 0.2]
+        assert first[0] == first[2] and first[0] is not first[2]
+        assert [scores['compound'] for scores in second] == [1.0, 0.6]
+        assert [c.args[0] for c in mock_analyzer.polarity_scores.call_args_list] == ["+1", "great work", "thanks"]
+
+    @patch("ossai.sentiment._get_analyzer")
+    def test_get_traditional_sentiments_does_not_remember_failures(self, mock_get_analyzer, monkeypatch):
+        """A text that failed to score is neutral this time and retried next time."""
+        monkeypatch.setattr("ossai.sentiment._memo", TTLCache(maxsize=100, ttl=float("inf")))
+        mock_analyzer = MagicMock()
+        mock_analyzer.polarity_scores.side_effect = [RuntimeError("unexpected failure"), {'neg': 0.0, 'neu': 0.0, 'pos': 1.0, 'compound': 0.9}]
+        mock_get_analyzer.return_value = mock_analyzer
+
+        assert get_traditional_sentiments(["yay"]) == [{'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}]
+        assert get_traditional_sentiments(["yay"])[0]['compound'] == 0.9
+
@@ -1,9 +1,25 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from slack_sdk import WebClient
-from ossai.slack_context import SlackContext
+from slack_sdk.web.async_client import AsyncWebClient
+from ossai import slack_context as slack_context_module
+from ossai.slack_context import SlackContext, directory_cache, rate_limiters
+from ossai.utils.rate_limit import RateLimiter
 from slack_sdk.errors import SlackApiError
 
+@pytest.fixture(autouse=True)
+def clear_directory_cache():
+    directory_cache.clear()
+    yield
+    directory_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    monkeypatch.setattr(slack_context_module, "rate_limiters", {})
+
+
 @pytest.fixture
 def mock_web_client():
     with patch("slack_sdk.WebClient") as mock_client:
@@ -56,6 +72,76 @@ async def test_get_channel_history(slack_context):
     assert await slack_context.get_channel_history("C123") == []
 
 
+@pytest.mark.asyncio
+async def test_get_channel_history_follows_cursor(slack_context):
+    """Every page is fetched by following next_cursor until Slack stops returning one."""
+    slack_context.client.conversations_history.side_effect = [
+        {"messages": [{"ts": "3"}, {"ts": "2"}], "response_metadata": {"next_cursor": "abc"}},
+        {"messages": [{"ts": "1"}, {"bot_id": "B123"}], "response_metadata": {"next_cursor": ""}},
+    ]
+    result = await slack_context.get_channel_history("C123")
+    assert result == [{"ts": "3"}, {"ts": "2"}, {"ts": "1"}]
+    assert slack_context.client.conversations_history.call_count == 2
+    assert slack_context.client.conversations_history.call_args.kwargs["cursor"] == "abc"
+
+
+@pytest.mark.asyncio
+async def test_get_channel_history_limit(slack_context):
+    """limit stops pagination as soon as enough messages have been collected."""
+    slack_context.client.conversations_history.side_effect = [
+        {"messages": [{"ts": "3"}, {"ts": "2"}], "response_metadata": {"next_cursor": "abc"}},
+        {"messages": [{"ts": "1"}], "response_metadata": {"next_cursor": "def"}},
+        {"messages": [{"ts": "0"}]},
+    ]
+    assert await slack_context.get_channel_history("C123", limit=1) == [{"ts": "3"}]
+
+
+@pytest.mark.asyncio
+async def test_iter_channel_history_yields_pages(slack_context):
+    """Pages are yielded one at a time rather than materialized as a single list."""
+    slack_context.client.conversations_history.side_effect = [
+        {"messages": [{"ts": "2"}], "response_metadata": {"next_cursor": "abc"}},
+        {"messages": [{"ts": "1"}]},
+    ]
+    pages = [page async for page in slack_context.iter_channel_history("C123", since_ts="0.5")]
+    assert pages == [[{"ts": "2"}], [{"ts": "1"}]]
+    assert slack_context.client.conversations_history.call_args.kwargs["oldest"] == "0.5"
+
+
+@pytest.mark.asyncio
+async def test_async_web_client_calls_are_awaited():
+    """An AsyncWebClient's coroutines are awaited rather than returned to the caller."""
+    client = AsyncMock(spec=AsyncWebClient)
+    client.users_info.return_value = {
+        "ok": True,
+        "user": {"real_name": "Ashley Wang", "profile": {"real_name": "Ashley Wang"}, "is_restricted": False},
+    }
+    slack_context = SlackContext(client)
+    assert await slack_context.get_name_from_id("U123") == ("Ashley Wang", True)
+    client.users_info.assert_awaited_once_with(user="U123")
+
+
+@pytest.mark.asyncio
+async def test_sync_web_client_calls_run_in_a_worker_thread():
+    """A synchronous WebClient is wrapped so its calls can be awaited without blocking the event loop."""
+    import threading
+
+    client = MagicMock(spec=WebClient)
+    threads = []
+
+    def users_info(user):
+        threads.append(threading.current_thread())
+        return {"ok": True, "user": {"real_name": "Ashley Wang", "profile": {"real_name": "Ashley Wang"}}}
+
+    client.users_info.side_effect = users_info
+    slack_context = SlackContext(client)
+
+    assert isinstance(slack_context.client, slack_context_module.SyncWebClientAdapter)
+    assert await slack_context.get_name_from_id("U123") == ("Ashley Wang", False)
+    assert await slack_context.client.users_info(user="U123")  # awaitable for handlers' direct calls too
+    assert threads and threading.current_thread() not in threads
+
+
 @pytest.mark.asyncio
 async def test_get_direct_message_channel_id(slack_context):
     slack_context.client.conversations_open.return_value = {"channel": {"id": "C123"}}
@@ -72,11 +158,13 @@ async def test_get_direct_message_channel_id_with_exception(slack_context):
         assert True
 
 
-def test_get_name_from_id(slack_context):
-    assert slack_context.get_name_from_id("U123")[0] == "Ashley Wang"
+@pytest.mark.asyncio
+async def test_get_name_from_id(slack_context):
+    assert (await slack_context.get_name_from_id("U123"))[0] == "Ashley Wang"
 
 
-def test_get_name_from_id_bot_user(slack_context):
+@pytest.mark.asyncio
+async def test_get_name_from_id_bot_user(slack_context):
     slack_context.client.users_info.side_effect = lambda user: {
         "ok": False,
         "error": "user_not_found",
@@ -86,11 +174,12 @@ def test_get_name_from_id_bot_user(slack_context):
         "bot": {"name": "Bender Bending Rodríguez"},
     }
 
-    assert slack_context.get_name_from_id("B123")[0] == "Bender Bending Rodríguez"
+    assert (await slack_context.get_name_from_id("B123"))[0] == "Bender Bending Rodríguez"
 
 
 
-def test_get_name_from_id_bot_user_error(slack_context):
+@pytest.mark.asyncio
+async def test_get_name_from_id_bot_user_error(slack_context):
     slack_context.client.users_info.side_effect = lambda user: {
         "ok": False,
         "error": "user_not_found",
@@ -100,10 +189,11 @@ def test_get_name_from_id_bot_user_error(slack_context):
         "error": "bot_not_found",
     }
 
-    assert slack_context.get_name_from_id("B456")[0] == "Someone"
+    assert (await slack_context.get_name_from_id("B456"))[0] == "Someone"
 
 
-def test_get_name_from_id_bot_user_exception(slack_context):
+@pytest.mark.asyncio
+async def test_get_name_from_id_bot_user_exception(slack_context):
     slack_context.client.users_info.side_effect = lambda user: {
         "ok": False,
         "error": "user_not_found",
@@ -112,30 +202,33 @@ def test_get_name_from_id_bot_user_exception(slack_context):
         "bot fetch failed", {"error": "bot_not_found"}
     )
 
-    assert slack_context.get_name_from_id("B456")[0] == "Someone"
+    assert (await slack_context.get_name_from_id("B456"))[0] == "Someone"
 
 
-def test_get_parsed_messages(slack_context):
+@pytest.mark.asyncio
+async def test_get_parsed_messages(slack_context):
     messages = [
         {"text": "Hello <@U456>", "user": "U123"},
         {"text": "nohello.net!!", "user": "U456"},
     ]
-    assert slack_context.get_parsed_messages(messages) == [
+    assert await slack_context.get_parsed_messages(messages) == [
         "Ashley Wang: Hello Taylor Garcia",  # prefix with author's name & replace user ID with user's name
         "Taylor Garcia: nohello.net!!",  # prefix with author's name
     ]
 
 
-def test_get_parsed_messages_without_names(slack_context):
+@pytest.mark.asyncio
+async def test_get_parsed_messages_without_names(slack_context):
     messages = [{"text": "Hello <@U456>", "user": "U123"}]
 
     # no author's name prefix & remove @mentions
-    assert slack_context.get_parsed_messages(messages, with_names=False) == [
+    assert await slack_context.get_parsed_messages(messages, with_names=False) == [
         "Hello "
     ]
 
 
-def test_get_parsed_messages_with_bot(slack_context):
+@pytest.mark.asyncio
+async def test_get_parsed_messages_with_bot(slack_context):
     slack_context.client.users_info.side_effect = SlackApiError(
         "user fetch failed", {"error": "user_not_found"}
     )  # simulate user not found
@@ -144,42 +237,65 @@ def test_get_parsed_messages_with_bot(slack_context):
         "bot": {"name": "Bender Bending Rodríguez"},
     }
     messages = [{"text": "I am <@B123>!", "bot_id": "B123"}]
-    assert slack_context.get_parsed_messages(messages) == [
+    assert await slack_context.get_parsed_messages(messages) == [
         "Bender Bending Rodríguez: I am Bender Bending Rodríguez!",
     ]
 
 
-def test_get_workspace_name(slack_context):
+@pytest.mark.asyncio
+async def test_get_workspace_name(slack_context):
     slack_context.client.team_info.return_value = {"ok": True, "team": {"name": "Workspace"}}
-    result = slack_context.get_workspace_name()
+    result = await slack_context.get_workspace_name()
     slack_context.client.team_info.assert_called_once()
     assert result == "Workspace"
 
 
-def test_get_workspace_name_exception(slack_context):
+@pytest.mark.asyncio
+async def test_get_workspace_name_exception(slack_context):
     with patch.dict("os.environ", {"WORKSPACE_NAME_FALLBACK": ""}):
         slack_context.client.team_info.side_effect = SlackApiError("error", {"error": "error"})
-        result = slack_context.get_workspace_name()
+        result = await slack_context.get_workspace_name()
         assert result == ""
 
 
-def test_get_workspace_name_failure(slack_context):
+@pytest.mark.asyncio
+async def test_get_workspace_name_failure(slack_context):
     with patch.dict("os.environ", {"WORKSPACE_NAME_FALLBACK": ""}):
         slack_context.client.team_info.return_value = {"ok": False, "error": "team_info error"}
-        result = slack_context.get_workspace_name()
+        result = await slack_context.get_workspace_name()
         slack_context.client.team_info.assert_called_once()
         assert result == ""
 
 
-def test_get_name_from_id_cache_hit(slack_context):
+@pytest.mark.asyncio
+async def test_get_name_from_id_cache_hit(slack_context):
     """Cache hit should return stored value without calling the Slack API."""
     slack_context._id_name_cache["U123"] = ("Cached Name", False)
-    result = slack_context.get_name_from_id("U123")
+    result = await slack_context.get_name_from_id("U123")
     assert result == ("Cached Name", False)
     slack_context.client.users_info.assert_not_called()
 
 
-def test_get_parsed_messages_with_internal_external(slack_context):
+@pytest.mark.asyncio
+async def test_directory_cache_shared_across_instances(mock_web_client):
+    """A name, bot ID or workspace name resolved by one SlackContext is reused by the next one."""
+    first = SlackContext(mock_web_client)
+    await first.get_name_from_id("U123")
+    await first.get_bot_id()
+    await first.get_workspace_name()
+
+    second = SlackContext(mock_web_client)
+    assert await second.get_name_from_id("U123") == ("Ashley Wang", False)
+    assert await second.get_bot_id() == "B123"
+    assert await second.get_workspace_name() == "Test Workspace"
+    mock_web_client.users_info.assert_called_once()
+    mock_web_client.auth_test.assert_called_once()
+    mock_web_client.team_info.assert_called_once()
+    assert directory_cache.stats()["hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_get_parsed_messages_with_internal_external(slack_context):
     """with_internal_external=True prefixes messages with [internal] or [external]."""
     def users_info_side_effect(user):
         data = {
@@ -193,7 +309,7 @@ def test_get_parsed_messages_with_internal_external(slack_context):
         {"text": "Hello", "user": "U123"},
         {"text": "Hi there", "user": "U456"},
     ]
-    result = slack_context.get_parsed_messages(messages, with_internal_external=True)
+    result = await slack_context.get_parsed_messages(messages, with_internal_external=True)
     assert result[0].startswith("Ashley Wang [internal]:")
     assert result[1].startswith("Taylor Garcia [external]:")
 
@@ -215,7 +331,8 @@ async def test_get_user_context_slack_api_error_returns_empty_dict(slack_context
     assert result == {}
 
 
-def test_get_rich_parsed_messages_include_threads(slack_context):
+@pytest.mark.asyncio
+async def test_get_rich_parsed_messages_include_threads(slack_context):
     """include_threads=True fetches replies and attaches them as reply_messages."""
     slack_context.client.conversations_replies.return_value = {
         "ok": True,
@@ -225,7 +342,7 @@ def test_get_rich_parsed_messages_include_threads(slack_context):
         ],
     }
     messages = [{"text": "parent", "ts": "1000.0", "user": "U123", "thread_ts": "1000.0"}]
-    result = slack_context.get_rich_parsed_messages(messages, channel_id="C123", include_threads=True)
+    result = await slack_context.get_rich_parsed_messages(messages, channel_id="C123", include_threads=True)
     assert len(result) == 1
     assert "reply_messages" in result[0]
     assert len(result[0]["reply_messages"]) == 1
@@ -233,12 +350,151 @@ def test_get_rich_parsed_messages_include_threads(slack_context):
     assert all(k in result[0]["trad_sentiment"] for k in ("neg", "neu", "pos", "compound"))
 
 
-def test_get_rich_parsed_messages_thread_slack_api_error(slack_context):
+@pytest.mark.asyncio
+async def test_get_rich_parsed_messages_thread_slack_api_error(slack_context):
     """SlackApiError fetching thread replies still returns the parent message."""
     slack_context.client.conversations_replies.side_effect = SlackApiError(
         "error", {"error": "channel_not_found", "headers": {}}
     )
     messages = [{"text": "hi", "ts": "1000.0", "user": "U123", "thread_ts": "1000.0"}]
-    result = slack_context.get_rich_parsed_messages(messages, channel_id="C123", include_threads=True)
+    result = await slack_context.get_rich_parsed_messages(messages, channel_id="C123", include_threads=True)
     assert len(result) == 1
     assert "reply_messages" not in result[0]
+    assert result[0]["replies_incomplete"] is True
+
+
+@pytest.mark.asyncio
+async def test_get_thread_replies_raises_when_slack_fails(slack_context):
+    slack_context.client.conversations_replies.return_value = {"ok": False, "error": "ratelimited"}
+    with pytest.raises(SlackApiError):
+        await slack_context.get_thread_replies("C123", "1000.0")
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_paces_calls_to_the_budget():
+    """Concurrent callers are spaced out to `per_minute`, beyond the first `burst`."""
+    now = 0.0
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    limiter = RateLimiter(per_minute=60, burst=2, timer=lambda: now, sleep=sleep)
+    await asyncio.gather(*(limiter.acquire() for _ in range(4)))
+    assert slept == [1.0, 2.0]
+
+    now = 10.0  # the bucket refills while idle
+    await limiter.acquire()
+    assert slept == [1.0, 2.0]
+
+
+@pytest.mark.asyncio
+async def test_slack_calls_go_through_the_method_rate_limiter(slack_context, monkeypatch):
+    limiter = MagicMock(acquire=AsyncMock())
+    monkeypatch.setattr(slack_context_module, "rate_limiters", {"conversations_replies": limiter})
+    slack_context.client.conversations_replies.return_value = {"ok": True, "messages": []}
+
+    await slack_context.get_thread_replies("C123", "1000.0")
+    await slack_context.get_thread_messages("C123", "1000.0")
+    await slack_context.get_bot_id()
+
+    assert limiter.acquire.await_count == 2
+
+
+def test_rate_limiters_allow_a_minutes_budget_up_front_by_default():
+    """Only calls beyond a method's per-minute budget are paced, so concurrent name lookups still run at once."""
+    limiter = rate_limiters["users_info"]
+    assert limiter.burst == 100
+    fresh = RateLimiter(per_minute=100, burst=limiter.burst, timer=lambda: 0.0)
+    assert [fresh.reserve() for _ in range(101)][-2:] == pytest.approx([0.0, 0.6])
+
+
+@pytest.mark.asyncio
+async def test_get_thread_replies_paginates(slack_context):
+    """Long threads are followed across pages and the repeated parent message is dropped."""
+    slack_context.client.conversations_replies.side_effect = [
+        {
+            "ok": True,
+            "messages": [{"ts": "1000.0"}, {"ts": "1001.0"}],
+            "response_metadata": {"next_cursor": "abc"},
+        },
+        {"ok": True, "messages": [{"ts": "1000.0"}, {"ts": "1002.0"}]},
+    ]
+    replies = await slack_context.get_thread_replies("C123", "1000.0")
+    assert replies == [{"ts": "1001.0"}, {"ts": "1002.0"}]
+    assert slack_context.client.conversations_replies.call_args.kwargs["cursor"] == "abc"
+
+
+@pytest.mark.asyncio
+async def test_get_rich_parsed_messages_fetches_threads_concurrently(slack_context):
+    """Thread replies are fetched in parallel, capped at max_concurrency requests in flight."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def conversations_replies(channel, ts, limit, cursor):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"ok": True, "messages": [{"ts": ts}, {"text": f"reply to {ts}", "ts": f"{ts}1", "user": "U456"}]}
+
+    slack_context.client.conversations_replies = conversations_replies
+    messages = [
+        {"text": "parent", "ts": f"{i}.0", "user": "U123", "thread_ts": f"{i}.0"} for i in range(6)
+    ]
+    result = await slack_context.get_rich_parsed_messages(
+        messages, channel_id="C123", include_threads=True, max_concurrency=2
+    )
+    assert max_in_flight == 2
+    assert [msg["reply_messages"][0]["text"] for msg in result] == [f"reply to {i}.0" for i in range(6)]
+
+
+@pytest.mark.asyncio
+async def test_warm_directory_cache(slack_context):
+    """users.list is paged through once and members (plus bot users' bot IDs) resolve without users.info."""
+    slack_context.client.users_list.side_effect = [
+        {
+            "members": [
+                {"id": "U777", "real_name": "Jordan Lee", "profile": {"real_name": "Jordan Lee"}, "is_restricted": False},
+            ],
+            "response_metadata": {"next_cursor": "abc"},
+        },
+        {
+            "members": [
+                {
+                    "id": "U888",
+                    "real_name": "Deploy Bot",
+                    "is_bot": True,
+                    "profile": {"real_name": "Deploy Bot", "bot_id": "B888"},
+                },
+            ],
+        },
+    ]
+    assert await slack_context.warm_directory_cache() == 3
+    assert slack_context.client.users_list.call_count == 2
+    assert await slack_context.get_name_from_id("U777") == ("Jordan Lee", True)
+    assert await slack_context.get_name_from_id("B888") == ("Deploy Bot", True)
+    slack_context.client.users_info.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_parsed_messages_resolves_each_id_once(slack_context):
+    """Authors and mentions across the whole batch are looked up once per unique ID before parsing."""
+    messages = [
+        {"text": "Hello <@U456>", "user": "U123"},
+        {"text": "<@U123> <@U456> hi again", "user": "U456"},
+        {"text": "ping <@U456>", "user": "U123"},
+    ]
+    result = await slack_context.get_parsed_messages(messages)
+    assert result[1] == "Taylor Garcia: Ashley Wang Taylor Garcia hi again"
+    assert slack_context.client.users_info.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_resolve_names_uses_cache(slack_context):
+    """Cached IDs never reach the Slack API."""
+    directory_cache["U123"] = ("Cached Name", True)
+    names = await slack_context.resolve_names(["U123", "U456", "U456", None])
+    assert names == {"U123": ("Cached Name", True), "U456": ("Taylor Garcia", False)}
+    slack_context.client.users_info.assert_called_once_with(user="U456")
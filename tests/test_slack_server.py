@@ -1,5 +1,7 @@
 import os
 import runpy
+import subprocess
+import sys
 from unittest.mock import ANY, patch, MagicMock, create_autospec, AsyncMock
 
 import pytest
@@ -46,6 +48,36 @@ def test_pulse(mock_app, mock_os_environ):
     assert result == {"status": 200, "message": "ok"}
 
 
+def stats_request(host="127.0.0.1", authorization=None):
+    request = MagicMock()
+    request.client.host = host
+    request.headers = {"authorization": authorization} if authorization else {}
+    return request
+
+
+def test_stats_is_local_only_without_a_token(mock_os_environ):
+    from fastapi import HTTPException
+    from ossai import slack_server
+
+    with patch.object(slack_server, "STATS_TOKEN", ""):
+        assert "llm_cache" in slack_server.stats(stats_request())
+        with pytest.raises(HTTPException) as e:
+            slack_server.stats(stats_request(host="203.0.113.7"))
+    assert e.value.status_code == 403
+
+
+def test_stats_requires_the_token_when_set(mock_os_environ):
+    from fastapi import HTTPException
+    from ossai import slack_server
+
+    with patch.object(slack_server, "STATS_TOKEN", "s3cret"):
+        assert "startup" in slack_server.stats(stats_request(host="203.0.113.7", authorization="Bearer s3cret"))
+        for request in (stats_request(), stats_request(authorization="Bearer wrong")):
+            with pytest.raises(HTTPException) as e:
+                slack_server.stats(request)
+            assert e.value.status_code == 403
+
+
 @pytest.mark.asyncio
 async def test_slack_events_url_verification():
     """The url_verification challenge-response must return the challenge token unchanged."""
@@ -84,3 +116,56 @@ async def test_handle_slash_command_sandbox(
         ANY, mock_ack, mock_payload, mock_say, user_id=mock_user_id
     )
     assert isinstance(mock_handler_sandbox_slash_command.call_args[0][0], SlackContext)
+
+
+@pytest.mark.asyncio
+async def test_handle_user_change_invalidates_directory_cache():
+    """A user_change event drops the user's (and their bot's) cached name."""
+    from ossai.slack_context import directory_cache
+    from ossai.slack_server import handle_user_change
+
+    directory_cache["U123"] = ("Old Name", True)
+    directory_cache["B123"] = ("Old Bot", True)
+    await handle_user_change({"user": {"id": "U123", "profile": {"bot_id": "B123"}}})
+    assert "U123" not in directory_cache
+    assert "B123" not in directory_cache
+
+
+def test_import_does_not_load_heavy_analysis_libraries():
+    """The analysis and LLM libraries load lazily, on first use, so the server starts (and answers /pulse) quickly."""
+    heavy = ("nltk", "scipy", "sklearn", "spacy", "gensim", "openai", "langchain_core", "langsmith.client")
+    code = (
+        "import sys, ossai.slack_server; "
+        f"print('loaded:' + ','.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    env = {**os.environ, "SLACK_BOT_TOKEN": "xoxb-123", "SLACK_APP_TOKEN": "xapp-123", "OPENAI_API_KEY": "sk-123"}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    assert "loaded:\n" in result.stdout
+
+
+@pytest.mark.asyncio
+async def test_lifespan_keeps_and_cancels_background_tasks():
+    """Startup tasks are held strongly while the app runs and cancelled on shutdown."""
+    import asyncio
+    from ossai import slack_server
+
+    started = asyncio.Event()
+
+    async def run_forever():
+        started.set()
+        await asyncio.Event().wait()
+
+    socket_handler = MagicMock(connect_async=AsyncMock(), disconnect_async=AsyncMock(), spec=["connect_async", "disconnect_async"])
+    with patch.object(slack_server, "create_socket_handler", AsyncMock(return_value=socket_handler)), patch.object(
+        slack_server, "recover_archives", return_value=[]
+    ), patch.object(slack_server, "TOPIC_WARM_UP", True), patch.object(
+        slack_server, "DIRECTORY_PREFETCH", True
+    ), patch.object(slack_server, "ARCHIVE_CHANNELS", []), patch.object(
+        slack_server, "warm_up_topic_analysis", run_forever
+    ), patch.object(slack_server, "refresh_directory_cache_periodically", run_forever):
+        async with slack_server.lifespan(slack_server.app):
+            await started.wait()
+            tasks = set(slack_server.background_tasks)
+            assert len(tasks) == 2
+        assert all(task.cancelled() for task in tasks)
+        assert not slack_server.background_tasks
@@ -1,3 +1,4 @@
+import asyncio
 import re
 import runpy
 from unittest.mock import patch, MagicMock, AsyncMock
@@ -7,6 +8,14 @@ from openai import RateLimitError
 
 from ossai.summarizer import Summarizer, main as summarizer_main
 from ossai.utils import get_llm_config
+from ossai.utils.llm_cache import llm_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_llm_cache():
+    llm_cache.clear()
+    yield
+    llm_cache.clear()
 
 
 @pytest.fixture
@@ -15,11 +24,11 @@ def mock_slack_context():
     mock.get_bot_id = AsyncMock(return_value="B12345")
     mock.get_channel_history = AsyncMock(return_value=[])
     mock.get_direct_message_channel_id = AsyncMock(return_value="D12345")
-    mock.get_is_private_and_channel_name = MagicMock(return_value=(False, "general"))
-    mock.get_name_from_id = MagicMock(return_value="John Doe")
-    mock.get_parsed_messages = MagicMock(return_value=["John: Hello", "Jane: Hi"])
+    mock.get_is_private_and_channel_name = AsyncMock(return_value=(False, "general"))
+    mock.get_name_from_id = AsyncMock(return_value="John Doe")
+    mock.get_parsed_messages = AsyncMock(return_value=["John: Hello", "Jane: Hi"])
     mock.get_user_context = AsyncMock(return_value={"name": "John", "title": "Developer"})
-    mock.get_workspace_name = MagicMock(return_value="My Workspace")
+    mock.get_workspace_name = AsyncMock(return_value="My Workspace")
     return mock
 
 def test_summarize_langchain(mock_slack_context):
@@ -52,8 +61,9 @@ def test_estimate_openai_chat_token_count(mock_slack_context):
     assert result == 7
 
 
-def test_split_messages_by_token_count(mock_slack_context):
-    with patch.dict("os.environ", {"MAX_BODY_TOKENS": "3"}):
+@pytest.mark.asyncio
+async def test_split_messages_by_token_count(mock_slack_context):
+    with patch.dict("os.environ", {"MAX_BODY_TOKENS": "3", "TOKEN_COUNTER": "heuristic"}):
         mock_slack_context.get_parsed_messages.return_value = ["Hello", "how", "are", "you"]
         messages = [
             {"text": "Hello"},
@@ -62,7 +72,7 @@ def test_split_messages_by_token_count(mock_slack_context):
             {"text": "you"},
         ]
         summarizer = Summarizer(mock_slack_context)
-        result = summarizer.split_messages_by_token_count(messages)
+        result = await summarizer.split_messages_by_token_count(messages)
         assert result == [["Hello", "how"], ["are", "you"]]
 
 
@@ -77,7 +87,8 @@ def test_missing_openai_api_key():
         assert str(e.value) == "OPENAI_API_KEY is not set in .env file"
 
 
-def test_summarize_slack_messages(mock_slack_context):
+@pytest.mark.asyncio
+async def test_summarize_slack_messages(mock_slack_context):
     # Mock the client and messages
     mock_messages = [
         {"text": "Hello"},
@@ -99,15 +110,17 @@ def test_summarize_slack_messages(mock_slack_context):
     with patch.object(
         summarizer,
         'split_messages_by_token_count',
+        new_callable=AsyncMock,
         return_value=[["Hello", "how", "are", "you"]]
     ) as mock_split:
         # Mock the summarize method
         with patch.object(
             summarizer,
-            'summarize',
+            'asummarize',
+            new_callable=AsyncMock,
             return_value=("Summarized text", "run_id")
         ) as mock_summarize:
-            result, run_id = summarizer.summarize_slack_messages(
+            result, run_id = await summarizer.summarize_slack_messages(
                 mock_messages,
                 channel_id="C1234567890",
                 feature_name="unit_test",
@@ -122,12 +135,14 @@ def test_summarize_slack_messages(mock_slack_context):
                 user="test_user",
                 channel="foo",
                 is_private=False,
+                on_update=None,
             )
             # Check that the result is as expected
             assert result == ["Summarized text"]
 
 
-def test_summarize_slack_messages_private_channel(mock_slack_context):
+@pytest.mark.asyncio
+async def test_summarize_slack_messages_private_channel(mock_slack_context):
     # Mock the client and messages
     
     mock_messages = [
@@ -150,15 +165,17 @@ def test_summarize_slack_messages_private_channel(mock_slack_context):
     with patch.object(
         summarizer,
         'split_messages_by_token_count',
+        new_callable=AsyncMock,
         return_value=[["Hello", "how", "are", "you"]]
     ) as mock_split:
         # Mock the summarize method
         with patch.object(
             summarizer,
-            'summarize',
+            'asummarize',
+            new_callable=AsyncMock,
             return_value=("Summarized text", "run_id")
         ) as mock_summarize:
-            result, run_id = summarizer.summarize_slack_messages(
+            result, run_id = await summarizer.summarize_slack_messages(
                 mock_messages,
                 channel_id="C1234567890",
                 feature_name="unit_test",
@@ -173,12 +190,14 @@ def test_summarize_slack_messages_private_channel(mock_slack_context):
                 user="test_user",
                 channel="foo",
                 is_private=True,
+                on_update=None,
             )
             # Check that the result is as expected
             assert result == ["Summarized text"]
 
 
-def test_summarize_slack_messages_rate_limit_error(mock_slack_context):
+@pytest.mark.asyncio
+async def test_summarize_slack_messages_rate_limit_error(mock_slack_context):
     # Mock the messages
     mock_messages = [
         {"text": "Hello"},
@@ -194,17 +213,19 @@ def test_summarize_slack_messages_rate_limit_error(mock_slack_context):
     with patch.object(
         summarizer,
         'split_messages_by_token_count',
+        new_callable=AsyncMock,
         return_value=[["Hello", "how", "are", "you"]]
     ) as mock_split:
         # Mock the summarize method to raise a RateLimitError
         with patch.object(
             summarizer,
-            'summarize',
+            'asummarize',
+            new_callable=AsyncMock,
             side_effect=RateLimitError(
                 "Rate limit exceeded", response=MagicMock(), body={}
             )
         ) as mock_summarize:
-            result, run_id = summarizer.summarize_slack_messages(
+            result, run_id = await summarizer.summarize_slack_messages(
                 mock_messages,
                 channel_id="C1234567890",
                 feature_name="unit_test",
@@ -216,3 +237,193 @@ def test_summarize_slack_messages_rate_limit_error(mock_slack_context):
 
 def test_main_as_script():
     summarizer_main()
+
+
+@pytest.mark.asyncio
+async def test_summarize_slack_messages_runs_splits_concurrently(mock_slack_context):
+    """Splits are summarized in parallel up to max_concurrency and reassembled in their original order."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def asummarize(text, **kwargs):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.05 if text == "first" else 0.01)  # the first split finishes last
+        in_flight -= 1
+        return f"summary of {text}", f"run_{text}"
+
+    with patch.dict("os.environ", {"SUMMARY_CONCURRENCY": "2"}):
+        summarizer = Summarizer(mock_slack_context)
+    with patch.object(
+        summarizer,
+        "split_messages_by_token_count",
+        new_callable=AsyncMock,
+        return_value=[["first"], ["second"], ["third"]],
+    ), patch.object(summarizer, "asummarize", side_effect=asummarize):
+        result, run_id = await summarizer.summarize_slack_messages(
+            [], channel_id="C123", feature_name="unit_test", user="test_user", map_reduce=False
+        )
+
+    assert result == ["summary of first", "summary of second", "summary of third"]
+    assert run_id == "run_third"
+    assert max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_summarize_slack_messages_map_reduce(mock_slack_context):
+    """In map-reduce mode the chunk summaries are merged into a single summary."""
+    summarizer = Summarizer(mock_slack_context)
+    with patch.object(
+        summarizer,
+        "split_messages_by_token_count",
+        new_callable=AsyncMock,
+        return_value=[["first"], ["second"]],
+    ), patch.object(
+        summarizer, "asummarize", new_callable=AsyncMock, side_effect=[("a", "run_a"), ("b", "run_b")]
+    ), patch.object(
+        summarizer, "amerge_summaries", new_callable=AsyncMock, return_value=("merged", "run_merge")
+    ) as mock_merge:
+        result, run_id = await summarizer.summarize_slack_messages(
+            [], channel_id="C123", feature_name="unit_test", user="test_user", map_reduce=True
+        )
+
+    assert result == ["merged"]
+    assert run_id == "run_merge"
+    mock_merge.assert_called_once_with(
+        ["a", "b"], feature_name="unit_test", user="test_user", channel="general", is_private=False, on_update=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_reduce_summaries_merges_in_a_tree(mock_slack_context):
+    """Summaries are merged fan_in at a time, level by level, until one remains."""
+    with patch.dict("os.environ", {"REDUCE_FAN_IN": "2", "REDUCE_MAX_DEPTH": "5", "MAX_BODY_TOKENS": "1"}):
+        summarizer = Summarizer(mock_slack_context)
+
+    merged_groups = []
+
+    async def amerge_summaries(summaries, **kwargs):
+        merged_groups.append(list(summaries))
+        return "+".join(summaries), f"run_{len(merged_groups)}"
+
+    with patch.object(summarizer, "amerge_summaries", side_effect=amerge_summaries):
+        result, run_id = await summarizer.reduce_summaries(
+            ["a", "b", "c", "d", "e"], feature_name="unit_test", user="test_user", channel="general"
+        )
+
+    assert result == "a+b+c+d+e"
+    assert merged_groups == [["a", "b"], ["c", "d"], ["a+b", "c+d"], ["a+b+c+d", "e"]]
+    assert run_id == "run_4"
+
+
+@pytest.mark.asyncio
+async def test_reduce_summaries_with_zero_max_depth_still_merges_everything(mock_slack_context):
+    with patch.dict("os.environ", {"REDUCE_FAN_IN": "2", "REDUCE_MAX_DEPTH": "0", "MAX_BODY_TOKENS": "1"}):
+        summarizer = Summarizer(mock_slack_context)
+
+    with patch.object(summarizer, "amerge_summaries", AsyncMock(return_value=("a+b+c", "run_1"))) as mock_merge:
+        result = await summarizer.reduce_summaries(
+            ["a", "b", "c"], feature_name="unit_test", user="test_user", channel="general"
+        )
+
+    assert result == ("a+b+c", "run_1")
+    assert mock_merge.await_args.args[0] == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_asummarize_serves_repeated_prompts_from_cache(mock_slack_context):
+    """The same text (with the same settings and custom prompt) only reaches the model once."""
+    chain = MagicMock()
+    chain.ainvoke = AsyncMock(return_value="- Alice said hi")
+    summarizer = Summarizer(mock_slack_context)
+
+    with patch.object(summarizer, "_get_summary_chain", return_value=(chain, {"run_id": "run_1"})):
+        first = await summarizer.asummarize("Alice: hi", "unit_test", "test_user", "general")
+        second = await summarizer.asummarize("Alice: hi", "unit_test", "test_user", "general")
+        summarizer.custom_prompt = "Use emoji"
+        await summarizer.asummarize("Alice: hi", "unit_test", "test_user", "general")
+
+    assert first == second == ("- Alice said hi", "run_1")
+    assert chain.ainvoke.await_count == 2
+
+
+def test_cache_key_changes_with_the_prompt_templates(mock_slack_context):
+    """Editing a prompt template must not serve answers cached for the old prompt."""
+    summarizer = Summarizer(mock_slack_context)
+    key = summarizer._get_cache_key("summary", "Alice: hi")
+    assert key != summarizer._get_cache_key("merge", "Alice: hi")
+
+    with patch.object(Summarizer, "_get_summary_prompts", return_value=("Be brief.", "{text}")):
+        assert summarizer._get_cache_key("summary", "Alice: hi") != key
+
+
+@pytest.mark.asyncio
+async def test_summarize_slack_messages_streams_single_chunk(mock_slack_context):
+    """With one chunk, the summary is streamed token by token to on_update."""
+
+    async def astream(inputs, config):
+        for token in ["- Alice", " said", " hi"]:
+            yield token
+
+    chain = MagicMock()
+    chain.astream = astream
+    summarizer = Summarizer(mock_slack_context)
+    updates = []
+
+    async def on_update(text):
+        updates.append(text)
+
+    with patch.object(
+        summarizer, "split_messages_by_token_count", new_callable=AsyncMock, return_value=[["Alice: hi"]]
+    ), patch.object(summarizer, "_get_summary_chain", return_value=(chain, {"run_id": "run_1"})):
+        result, run_id = await summarizer.summarize_slack_messages(
+            [], channel_id="C123", feature_name="unit_test", user="test_user", on_update=on_update
+        )
+
+    assert result == ["- Alice said hi"]
+    assert run_id == "run_1"
+    assert updates == ["- Alice", "- Alice said", "- Alice said hi"]
+
+
+def test_summarizers_share_model_and_chains(mock_slack_context):
+    """The chat model and compiled chains are built once per process, not once per request."""
+    first = Summarizer(mock_slack_context)
+    second = Summarizer(mock_slack_context, custom_prompt="Use emoji")
+
+    first_chain, first_config = first._get_summary_chain("unit_test", {}, "general")
+    second_chain, second_config = second._get_summary_chain("unit_test", {}, "general")
+
+    assert first.model is second.model
+    assert first_chain is second_chain
+    assert first_config["run_id"] != second_config["run_id"]
+    assert first._get_merge_chain("unit_test", {}, "general")[0] is not first_chain
+
+
+@pytest.mark.asyncio
+async def test_summarize_history_pages_summarizes_splits_while_pages_are_fetched(mock_slack_context):
+    """Full splits are summarized before later pages arrive, and the summaries come back oldest first."""
+    mock_slack_context.get_parsed_messages = AsyncMock(side_effect=lambda msgs, **kwargs: [m["text"] for m in msgs])
+    with patch.dict("os.environ", {"MAX_BODY_TOKENS": "3"}):
+        summarizer = Summarizer(mock_slack_context)
+    summarizer.token_counter = MagicMock(count=lambda text: 2)  # one message per split
+    events = []
+
+    async def pages():
+        for page in (["f", "e"], ["d", "c"], ["b", "a"]):
+            events.append(f"page {page}")
+            yield [{"text": text} for text in page]
+            await asyncio.sleep(0.01)
+
+    async def asummarize(text, **kwargs):
+        events.append(f"summarize {text}")
+        return f"summary of {text}", f"run_{text}"
+
+    with patch.object(summarizer, "asummarize", side_effect=asummarize):
+        result, run_id, count = await summarizer.summarize_history_pages(
+            pages(), channel_id="C123", feature_name="unit_test", user="test_user", map_reduce=False
+        )
+
+    assert result == [f"summary of {text}" for text in "abcdef"]
+    assert (run_id, count) == ("run_f", 6)
+    assert events.index("summarize f") < events.index("page ['b', 'a']")
@@ -1,12 +1,32 @@
+import asyncio
 import pytest
 import re
 
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
 
 from ossai import topic_analysis
+from ossai.utils.llm import get_chain, get_chat_model
+from ossai.utils.llm_cache import llm_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_llm_cache():
+    llm_cache.clear()
+    yield
+    llm_cache.clear()
 
 
 # Fixtures
+@pytest.fixture
+def fresh_llm_chains():
+    """Build chat models and chains anew, e.g. while their classes are patched, and forget them afterwards."""
+    get_chain.cache_clear()
+    get_chat_model.cache_clear()
+    yield
+    get_chain.cache_clear()
+    get_chat_model.cache_clear()
+
+
 @pytest.fixture
 def messages():
     corpus = """    
@@ -68,7 +88,7 @@ async def test_lda_topics(messages, num_topics, stop_words):
 
 
 @pytest.mark.asyncio
-async def test_synthesize_topics(monkeypatch):
+async def test_synthesize_topics(monkeypatch, fresh_llm_chains):
     # Setup test data
     topics_str = (
         "KMeans Results:\n - term1, term2, term3\nLSA Results:\n - term4, term5, term1"
@@ -89,9 +109,9 @@ async def test_synthesize_topics(monkeypatch):
         def __call__(self, *args, **kwargs):
             return "- term1, term2, term3\n- term4, term5, term1"
 
-    # Patching the dependencies
-    monkeypatch.setattr(topic_analysis, "ChatOpenAI", MockChatOpenAI)
-    monkeypatch.setattr(topic_analysis, "StrOutputParser", MockStrOutputParser)
+    # Patching the dependencies (imported when the chain is built, which fresh_llm_chains makes happen here)
+    monkeypatch.setattr("langchain_openai.ChatOpenAI", MockChatOpenAI)
+    monkeypatch.setattr("langchain_core.output_parsers.StrOutputParser", MockStrOutputParser)
 
     # Call the function
     (result, run_id) = await topic_analysis._synthesize_topics(
@@ -126,3 +146,216 @@ async def test_analyze_topics_of_history(
         "channel_name", messages, num_topics
     )
     assert isinstance(result, str)
+
+
+def test_nlp_resources_load_lazily_once(monkeypatch):
+    """spaCy and the stop words are loaded on first use only, then reused."""
+    monkeypatch.setattr(topic_analysis, "_nlp", None)
+    monkeypatch.setattr(topic_analysis, "_stop_words", None)
+    fake_nlp = MagicMock(name="nlp")
+    stopwords = MagicMock()
+    stopwords.words.return_value = ["the", "a"]
+
+    with patch("spacy.load", return_value=fake_nlp) as mock_load, patch("nltk.corpus.stopwords", stopwords):
+        assert topic_analysis._get_nlp() is fake_nlp
+        assert topic_analysis._get_nlp() is fake_nlp
+        assert topic_analysis._get_stop_words() == frozenset({"the", "a"})
+        assert topic_analysis._get_stop_words() == frozenset({"the", "a"})
+
+    mock_load.assert_called_once_with(topic_analysis.SPACY_MODEL, exclude=topic_analysis.SPACY_EXCLUDE)
+    stopwords.words.assert_called_once_with("english")
+
+
+def test_lemmatize_batches_through_nlp_pipe(monkeypatch):
+    """Messages are lemmatized in one batched nlp.pipe call rather than one nlp() call each."""
+    token = lambda lemma: MagicMock(lemma_=lemma)
+    fake_nlp = MagicMock(name="nlp")
+    fake_nlp.pipe.return_value = iter([[token("run"), token("fast")], [token("be"), token("good")]])
+    monkeypatch.setattr(topic_analysis, "_nlp", fake_nlp)
+
+    result = topic_analysis._lemmatize(["running fast", "was good"], batch_size=64, n_process=1)
+
+    assert result == ["run fast", "be good"]
+    fake_nlp.pipe.assert_called_once_with(["running fast", "was good"], batch_size=64, n_process=1)
+    fake_nlp.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_analyze_topics_of_history_rejects_when_queue_is_full(monkeypatch, messages):
+    """Requests beyond TOPIC_MAX_PENDING are turned away instead of piling up behind the workers."""
+    monkeypatch.setattr(topic_analysis, "_pending", topic_analysis.TOPIC_MAX_PENDING)
+    with patch("ossai.topic_analysis._run_in_pool") as mock_run_in_pool:
+        with pytest.raises(topic_analysis.TopicAnalysisBusyError):
+            await topic_analysis.analyze_topics_of_history("channel_name", messages, "user")
+    mock_run_in_pool.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_analyze_topics_of_history_runs_algorithms_in_parallel(monkeypatch, messages):
+    """KMeans, LSA and LDA are started together rather than one after another."""
+    running, peak = 0, 0
+
+    async def algorithm(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {0: ["term"]}
+
+    prepared = (messages, "tfidf_matrix", ["term"], {"the"})
+    with patch("ossai.topic_analysis._run_in_pool", AsyncMock(return_value=prepared)), patch(
+        "ossai.topic_analysis._kmeans_topics", side_effect=algorithm
+    ), patch("ossai.topic_analysis._lsa_topics", side_effect=algorithm), patch(
+        "ossai.topic_analysis._lda_topics", side_effect=algorithm
+    ), patch(
+        "ossai.topic_analysis._synthesize_topics", AsyncMock(return_value=("overview", "run_id"))
+    ):
+        result = await topic_analysis.analyze_topics_of_history("channel_name", messages, "user")
+
+    assert result == ("overview", "run_id")
+    assert peak == 3
+    assert topic_analysis._pending == 0
+
+
+def test_choose_backend_by_corpus_size(monkeypatch):
+    monkeypatch.setattr(topic_analysis, "TOPIC_BACKEND", "auto")
+    monkeypatch.setattr(topic_analysis, "TOPIC_SCALABLE_THRESHOLD", 100)
+    assert topic_analysis._choose_backend(99) == "exact"
+    assert topic_analysis._choose_backend(100) == "scalable"
+    assert topic_analysis._choose_backend(10, backend="scalable") == "scalable"
+
+
+def test_scalable_backends_find_topics(messages, num_topics, stop_words):
+    """Mini-batch k-means, sampled randomized SVD and online LDA return the same shape of results."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer()
+    tfidf_matrix = vectorizer.fit_transform(messages)
+    terms = vectorizer.get_feature_names_out()
+
+    for result in [
+        topic_analysis._compute_kmeans_topics(tfidf_matrix, num_topics, terms, backend="scalable"),
+        topic_analysis._compute_lsa_topics(tfidf_matrix, num_topics, terms, backend="scalable"),
+        topic_analysis._compute_lda_topics(messages, num_topics, stop_words, backend="scalable"),
+    ]:
+        assert len(result) == num_topics
+
+
+@pytest.mark.asyncio
+async def test_analyze_topics_of_history_only_lemmatizes_new_or_edited_messages(monkeypatch, tmp_path):
+    """The second run reuses cached lemmas and only sends the new and edited messages through spaCy."""
+    from ossai.topic_corpus import TopicCorpusStore
+
+    monkeypatch.setattr(topic_analysis, "topic_corpus_store", TopicCorpusStore(directory=str(tmp_path)))
+    lemmatized = []
+
+    def fake_lemmatize(messages):
+        lemmatized.append(list(messages))
+        return [message.lower() for message in messages]
+
+    async def run_inline(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(topic_analysis, "_lemmatize", fake_lemmatize)
+    monkeypatch.setattr(topic_analysis, "_get_stop_words", lambda: frozenset({"the"}))
+    algorithm = AsyncMock(return_value={0: ["term"]})
+    with patch("ossai.topic_analysis._run_in_pool", side_effect=run_inline), patch(
+        "ossai.topic_analysis._kmeans_topics", algorithm
+    ), patch("ossai.topic_analysis._lsa_topics", algorithm), patch(
+        "ossai.topic_analysis._lda_topics", algorithm
+    ), patch(
+        "ossai.topic_analysis._synthesize_topics", AsyncMock(return_value=("overview", "run_id"))
+    ):
+        await topic_analysis.analyze_topics_of_history(
+            "general", ["Deploy Friday", "Rollback Monday"], "user",
+            channel_id="C123", message_keys=["1.0:", "2.0:"],
+        )
+        await topic_analysis.analyze_topics_of_history(
+            "general", ["Deploy Friday", "Rollback Tuesday", "Release Wednesday"], "user",
+            channel_id="C123", message_keys=["1.0:", "2.0:3.0", "4.0:"],
+        )
+
+    assert lemmatized == [["Deploy Friday", "Rollback Monday"], ["Rollback Tuesday", "Release Wednesday"]]
+    assert algorithm.await_args_list[-1].args[0] == [
+        "deploy friday", "rollback tuesday", "release wednesday"
+    ]
+
+
+def test_channel_lda_model_is_updated_online_then_retrained(monkeypatch, tmp_path, messages, num_topics, stop_words):
+    """The first run trains and stores a model, later runs only feed it the new messages until a retrain is due."""
+    from ossai.topic_corpus import LdaModelStore
+
+    store = LdaModelStore(directory=str(tmp_path))
+    monkeypatch.setattr(topic_analysis, "lda_model_store", store)
+    monkeypatch.setattr(topic_analysis, "LDA_RETRAIN_UPDATE_RATIO", 0.5)
+    messages = messages * 3  # enough repetition for words to survive the dictionary's `no_below=2`
+    keys = [f"{i}.0:" for i in range(1, len(messages) + 1)]
+
+    topics, retrain_due = topic_analysis._compute_channel_lda_topics(
+        "C123", messages[:-2], keys[:-2], num_topics, stop_words
+    )
+    assert len(topics) == num_topics and not retrain_due
+    assert store.load("C123")["meta"]["trained_count"] == len(messages) - 2
+
+    with patch("ossai.topic_analysis._train_lda") as mock_train:
+        topics, retrain_due = topic_analysis._compute_channel_lda_topics(
+            "C123", messages, keys, num_topics, stop_words
+        )
+    mock_train.assert_not_called()
+    assert len(topics) == num_topics
+    meta = store.load("C123")["meta"]
+    assert (meta["updated_count"], meta["latest_ts"]) == (2, float(len(messages)))
+    assert retrain_due == (2 > 0.5 * (len(messages) - 2))
+
+    topic_analysis._compute_channel_lda_topics("C123", messages, keys, num_topics, stop_words, retrain=True)
+    meta = store.load("C123")["meta"]
+    assert (meta["trained_count"], meta["updated_count"]) == (len(messages), 0)
+    assert len(list((tmp_path / "C123").iterdir())) <= 3  # current.json plus at most two versions
+
+
+@pytest.mark.asyncio
+async def test_channel_lda_model_is_only_read_while_another_worker_writes_it(messages, num_topics, stop_words):
+    """A /tldr during a background retrain reads the stored model instead of updating it concurrently."""
+    run_in_pool = AsyncMock(return_value=({"topic": ["term"]}, False))
+    lock = topic_analysis._lda_write_locks.setdefault("C123", asyncio.Lock())
+    with patch("ossai.topic_analysis._run_in_pool", run_in_pool):
+        async with lock:
+            assert await topic_analysis._lda_topics(messages, num_topics, stop_words, "C123", ["1.0:"]) == {
+                "topic": ["term"]
+            }
+        assert run_in_pool.await_args.args[-2:] == (False, False)
+
+        await topic_analysis._lda_topics(messages, num_topics, stop_words, "C123", ["1.0:"])
+        assert run_in_pool.await_args.args[-1] == stop_words  # an updating run, with the default flags
+
+
+@pytest.mark.asyncio
+async def test_only_the_single_corpus_worker_loads_spacy(monkeypatch):
+    """Lemmatizing runs in a one-worker pool whose initializer loads spaCy; the algorithm workers never do."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    created = {}
+
+    def pool_factory(max_workers, mp_context, initializer):
+        pool = ThreadPoolExecutor(max_workers)
+        created[initializer.__name__] = (max_workers, pool)
+        return pool
+
+    monkeypatch.setattr(topic_analysis, "ProcessPoolExecutor", pool_factory)
+    monkeypatch.setattr(topic_analysis, "_pools", {})
+    prepare_corpus = MagicMock(return_value="prepared")
+    monkeypatch.setattr(topic_analysis, "_prepare_corpus", prepare_corpus)
+    try:
+        assert await topic_analysis._run_in_pool(prepare_corpus, ["message"], "general") == "prepared"
+        assert list(created) == ["_init_corpus_worker"]
+        await topic_analysis._run_in_pool(len, "kmeans")
+        assert created["_init_corpus_worker"][0] == 1
+        assert created["_init_models_worker"][0] == topic_analysis.TOPIC_POOL_WORKERS
+    finally:
+        topic_analysis.shutdown_pool()
+
+    nlp = MagicMock()
+    monkeypatch.setattr(topic_analysis, "_get_nlp", nlp)
+    topic_analysis._init_models_worker()
+    nlp.assert_not_called()
@@ -0,0 +1,34 @@
+from unittest.mock import MagicMock
+
+from ossai.topic_corpus import LdaModelStore, TopicCorpusStore, get_message_key
+
+
+def test_get_message_key_changes_when_a_message_is_edited():
+    assert get_message_key({"ts": "1.0", "text": "hi"}) == "1.0:"
+    assert get_message_key({"ts": "1.0", "text": "hello", "edited": {"ts": "2.0"}}) == "1.0:2.0"
+
+
+def test_topic_corpus_store_persists_public_channels_only(tmp_path):
+    store = TopicCorpusStore(directory=str(tmp_path))
+    store.save("C123", {"1.0:": "run fast"}, "model-a")
+    store.save("G456", {"1.0:": "secret"}, "model-a", persist=False)
+
+    reloaded = TopicCorpusStore(directory=str(tmp_path))
+    assert reloaded.load("C123", "model-a") == {"1.0:": "run fast"}
+    assert reloaded.load("C123", "model-b") == {}  # built by another pipeline
+    assert reloaded.load("G456", "model-a") == {}
+    assert store.load("G456", "model-a") == {"1.0:": "secret"}
+    assert store.clear("C123") and reloaded.load("C123", "model-a") != {}
+    assert TopicCorpusStore(directory=str(tmp_path)).load("C123", "model-a") == {}
+
+
+def test_lda_model_store_never_removes_the_current_version(tmp_path, monkeypatch):
+    """If another writer made its version current while we saved, cleanup leaves that version alone."""
+    store = LdaModelStore(directory=str(tmp_path))
+    first = store.save("C123", MagicMock(), MagicMock(), MagicMock(), MagicMock(), {})["version"]
+    (tmp_path / "C123" / "other").mkdir()
+    monkeypatch.setattr(store, "_current_version", MagicMock(side_effect=[first, "other"]))
+
+    second = store.save("C123", MagicMock(), MagicMock(), MagicMock(), MagicMock(), {})["version"]
+
+    assert {path.name for path in (tmp_path / "C123").iterdir() if path.is_dir()} == {first, second, "other"}
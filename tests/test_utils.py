@@ -1,11 +1,14 @@
 import runpy
-from unittest.mock import ANY, patch, MagicMock
+import threading
+from unittest.mock import ANY, AsyncMock, patch, MagicMock
 import time
 import uuid
 import pytest
 
 from ossai import utils
 from ossai.utils.langsmith import CustomLangChainTracer, get_langsmith_config
+from ossai.utils.llm_cache import LLMResponseCache
+from ossai.utils.tokens import CachedTokenCounter, HeuristicTokenCounter, get_token_counter
 
 
 @pytest.fixture
@@ -195,3 +198,157 @@ def test_get_text_and_blocks_for_say_block_size():
     # Check that the last block contains the buttons
     assert blocks[-1]["type"] == "actions"
     assert len(blocks[-1]["elements"]) == 3  # Three buttons
+
+
+def test_ttl_cache_expires_entries():
+    """Entries stop being served once their TTL has elapsed."""
+    now = [0.0]
+    cache = utils.TTLCache(maxsize=10, ttl=5, timer=lambda: now[0])
+    cache["U123"] = ("Ashley Wang", True)
+    assert cache.get("U123") == ("Ashley Wang", True)
+    now[0] = 6.0
+    assert cache.get("U123") is None
+    assert "U123" not in cache
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """When full, the least recently read entry is evicted first."""
+    cache = utils.TTLCache(maxsize=2, ttl=60)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache.get("a")
+    cache["c"] = 3
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_invalidation():
+    """invalidate and invalidate_where drop entries on demand."""
+    cache = utils.TTLCache(maxsize=10, ttl=60)
+    cache["U1"] = 1
+    cache["U2"] = 2
+    cache["B1"] = 3
+    assert cache.invalidate("U1") is True
+    assert cache.invalidate("U1") is False
+    assert cache.invalidate_where(lambda key: key.startswith("B")) == 1
+    assert len(cache) == 1
+    with pytest.raises(KeyError):
+        cache["B1"]
+
+
+def test_cached_token_counter_counts_each_message_once():
+    """Repeated messages are served from the memo instead of being re-tokenized."""
+    inner = MagicMock(name="counter")
+    inner.name = "stub"
+    inner.count.side_effect = lambda text: len(text.split())
+    counter = CachedTokenCounter(inner, maxsize=10)
+
+    assert counter.count("hello there friend") == 3
+    assert counter.count("hello there friend") == 3
+    assert counter.count("bye") == 1
+    assert inner.count.call_count == 2
+    assert counter.stats()["hits"] == 1
+
+
+def test_get_token_counter_falls_back_to_heuristic():
+    """If the tokenizer vocabulary can't be loaded, token counts are estimated instead."""
+    get_token_counter.cache_clear()
+    with patch("ossai.utils.tokens.TiktokenTokenCounter", side_effect=OSError("offline")):
+        counter = get_token_counter("tiktoken", "gpt-4.1", 0)
+    get_token_counter.cache_clear()
+
+    assert isinstance(counter, HeuristicTokenCounter)
+    assert counter.count("Hello, how are you?") == 7
+
+
+def test_llm_response_cache_persists_to_sqlite(tmp_path):
+    """Entries written to the on-disk tier are served by a fresh cache, unless they were memory-only."""
+    db_path = str(tmp_path / "llm_cache.sqlite3")
+    key = LLMResponseCache.make_key(model="gpt-4.1", temperature=0.2, text="Alice: hi")
+    private_key = LLMResponseCache.make_key(model="gpt-4.1", temperature=0.2, text="Bob: secret")
+
+    cache = LLMResponseCache(db_path=db_path)
+    assert cache.set(key, "- Alice said hi", "run_1")
+    assert cache.set(private_key, "- Bob shared a secret", "run_2", persist=False)
+
+    restarted = LLMResponseCache(db_path=db_path)
+    assert restarted.get(key) == ("- Alice said hi", "run_1")
+    assert restarted.get(private_key) is None
+
+
+def test_llm_response_cache_limits():
+    """Oversized responses are not cached, and a disabled cache never stores anything."""
+    cache = LLMResponseCache(max_entry_bytes=10)
+    assert not cache.set("key", "x" * 11)
+    assert cache.get("key") is None
+
+    disabled = LLMResponseCache(enabled=False)
+    assert not disabled.set("key", "short")
+    assert disabled.get("key") is None
+    assert LLMResponseCache.make_key(a=1, b=2) == LLMResponseCache.make_key(b=2, a=1)
+
+
+@pytest.mark.asyncio
+async def test_llm_response_cache_async_access_runs_sqlite_off_the_event_loop(tmp_path):
+    """aget/aset do their SQLite work in a worker thread, never on the thread running the event loop."""
+    cache = LLMResponseCache(db_path=str(tmp_path / "llm_cache.sqlite3"))
+    threads = []
+    get, set_ = cache.get, cache.set
+    cache.get = lambda *a: threads.append(threading.current_thread()) or get(*a)
+    cache.set = lambda *a, **kw: threads.append(threading.current_thread()) or set_(*a, **kw)
+
+    assert await cache.aset("key", "- Alice said hi", "run_1")
+    cache._memory.clear()
+    assert await cache.aget("key") == ("- Alice said hi", "run_1")
+
+    assert len(threads) == 2
+    assert threading.current_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_throttled_message_updater_limits_edits():
+    """Edits closer together than min_interval are skipped; finish always replaces the message."""
+    now = [0.0]
+    client = MagicMock()
+    client.chat_update = AsyncMock()
+    updater = utils.ThrottledMessageUpdater(
+        client, "D123", "111.222", title="*Summary*\n", min_interval=1.0, timer=lambda: now[0]
+    )
+
+    await updater.update("- one")
+    now[0] = 0.5
+    await updater.update("- one\n- two")
+    now[0] = 1.2
+    await updater.update("- one\n- two\n- three")
+    await updater.finish("final", [{"type": "section"}])
+
+    assert [c.kwargs["text"] for c in client.chat_update.await_args_list] == [
+        "*Summary*\n- one ...",
+        "*Summary*\n- one\n- two\n- three ...",
+        "final",
+    ]
+    assert client.chat_update.await_args.kwargs == {
+        "channel": "D123", "ts": "111.222", "text": "final", "blocks": [{"type": "section"}]
+    }
+
+
+@pytest.mark.asyncio
+async def test_throttled_message_updater_survives_transport_errors():
+    """A timeout or dropped connection while streaming skips that edit instead of aborting the summary."""
+    import asyncio
+
+    from aiohttp import ClientConnectionError
+
+    now = [0.0]
+    client = MagicMock()
+    client.chat_update = AsyncMock(side_effect=[asyncio.TimeoutError(), ClientConnectionError("reset"), None])
+    updater = utils.ThrottledMessageUpdater(client, "D123", "111.222", min_interval=1.0, timer=lambda: now[0])
+
+    for now[0] in (0.0, 1.0, 2.0):
+        await updater.update("- partial")
+
+    assert client.chat_update.await_count == 3
+    assert updater.updates == 1